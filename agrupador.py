@@ -0,0 +1,205 @@
+# agrupador.py
+"""Agrupación de subtareas chicas en lotes hacia los servidores de operación.
+
+Con muchos clientes a la vez, cada hilo del servidor de cálculo abría una
+conexión por subtarea, aunque fuera una suma de dos números. El agrupador junta
+las subtareas chicas que van al mismo servidor y las envía en un solo mensaje
+``lote_subtareas``. El servidor de operación las calcula en una pasada y cada
+hilo recibe la respuesta de la suya.
+
+La ventana se adapta a la carga. Si el servidor no tiene nada en curso, la
+subtarea sale enseguida, sola, y no se agrega latencia. Si hay subtareas en
+curso, la primera que llega abre un lote y espera hasta
+``VENTANA * en_curso / MAX_LOTE`` segundos (como mucho ``VENTANA``). Las que
+llegan mientras tanto se suman al lote, que sale antes si junta ``MAX_LOTE``
+subtareas. Solo se agrupan las subtareas de operaciones livianas con pocos
+operandos escalares, ya sea en una lista o en un bloque binario como los que
+envía el cliente. Las vectoriales, las matrices y las llamadas que pueden ser
+pesadas van siempre solas. Los servidores de operación calculan los lotes con
+``realizar_lote``.
+"""
+import os
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+import metricas
+import operaciones
+import transporte
+import trazas
+from protocolo import BloqueOperandos, enviar_mensaje, recibir_mensaje
+
+# Espera máxima para juntar un lote (en milisegundos); 0 desactiva la agrupación
+VENTANA = float(os.environ.get('CALCULO_VENTANA_LOTE_MS', 2)) / 1000
+# Subtareas por lote como máximo
+MAX_LOTE = int(os.environ.get('CALCULO_MAX_LOTE', 32))
+# Operandos de una subtarea agrupable como máximo
+MAX_OPERANDOS = 64
+
+
+def intercambiar(destino, mensaje, timeout):
+    """Envía un mensaje a un servidor de operación y devuelve su respuesta sin decodificar los bloques."""
+    with transporte.conectar(destino.host, destino.puerto, timeout=timeout) as s:
+        enviar_mensaje(s, mensaje)
+        return recibir_mensaje(s, decodificar_operandos=False)
+
+
+class _Lote:
+    """Subtareas que viajan juntas; los hilos que las agregaron esperan ``listo``."""
+
+    __slots__ = ('subtareas', 'timeout', 'lleno', 'listo', 'respuestas', 'error')
+
+    def __init__(self, subtarea, timeout):
+        self.subtareas = [subtarea]
+        # El mayor de los tiempos de espera de sus subtareas
+        self.timeout = timeout
+        # El líder deja de esperar la ventana cuando el lote se llena
+        self.lleno = threading.Event()
+        self.listo = threading.Event()
+        self.respuestas = None
+        self.error = None
+
+    def esperar(self, indice):
+        self.listo.wait()
+        if self.error is not None:
+            raise self.error
+        return self.respuestas[indice]
+
+
+class AgrupadorSubtareas:
+    """Envía subtareas a los servidores de operación, agrupando las chicas en lotes."""
+
+    def __init__(self, ventana=VENTANA, max_lote=MAX_LOTE):
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self._lock = threading.Lock()
+        # Lote que está juntando subtareas para cada servidor (host, puerto)
+        self._abiertos = {}
+        # Subtareas enviadas a cada servidor que todavía no tienen respuesta
+        self._en_curso = defaultdict(int)
+        self.contadores = metricas.Contadores('directas', 'agrupadas', 'lotes')
+        metricas.registrar_fuente('lotes', self.resumen)
+
+    def agrupable(self, subtarea):
+        """Si la subtarea es lo bastante chica para viajar en un lote."""
+        if self.ventana <= 0 or self.max_lote <= 1:
+            return False
+        operacion = operaciones.obtener(subtarea.operacion)
+        operandos = subtarea.operandos
+        if operacion is None or operacion.pesada is not None:
+            return False
+        if isinstance(operandos, (array, BloqueOperandos)):
+            # Un bloque binario solo tiene números
+            return len(operandos) <= MAX_OPERANDOS
+        return (isinstance(operandos, list) and len(operandos) <= MAX_OPERANDOS and
+                all(isinstance(v, (int, float)) for v in operandos))
+
+    def enviar(self, subtarea, destino, timeout):
+        """Envía la subtarea a ``destino``, sola o en un lote, y devuelve el mensaje de respuesta.
+
+        Los errores de conexión se lanzan en todos los hilos del lote, que los
+        manejan como si hubieran enviado su subtarea solos.
+        """
+        clave = (destino.host, destino.puerto)
+        agrupable = self.agrupable(subtarea)
+        lider = False
+        with self._lock:
+            lote = self._abiertos.get(clave) if agrupable else None
+            if lote is not None:
+                indice = len(lote.subtareas)
+                lote.subtareas.append(subtarea)
+                lote.timeout = max(lote.timeout, timeout)
+                if len(lote.subtareas) >= self.max_lote:
+                    del self._abiertos[clave]
+                    lote.lleno.set()
+            elif agrupable and self._en_curso[clave] > 0:
+                # El servidor ya está ocupado: abrir un lote con una ventana proporcional a la carga
+                lote = _Lote(subtarea, timeout)
+                self._abiertos[clave] = lote
+                lider = True
+                espera = self.ventana * min(1.0, self._en_curso[clave] / self.max_lote)
+            self._en_curso[clave] += 1
+        try:
+            if lote is None:
+                self.contadores.sumar('directas')
+                return intercambiar(destino, subtarea.a_mensaje(), timeout)
+            if not lider:
+                return lote.esperar(indice)
+            lote.lleno.wait(espera)
+            with self._lock:
+                if self._abiertos.get(clave) is lote:
+                    del self._abiertos[clave]
+            self.enviar_lote(lote, destino)
+            return lote.esperar(0)
+        finally:
+            with self._lock:
+                self._en_curso[clave] -= 1
+
+    def enviar_lote(self, lote, destino):
+        """Envía las subtareas del lote y reparte las respuestas (o el error) a sus hilos."""
+        try:
+            if len(lote.subtareas) == 1:
+                # Nadie se sumó durante la ventana: se envía como una subtarea común
+                self.contadores.sumar('directas')
+                lote.respuestas = [intercambiar(destino, lote.subtareas[0].a_mensaje(), lote.timeout)]
+                return
+            self.contadores.sumar('lotes')
+            self.contadores.sumar('agrupadas', len(lote.subtareas))
+            mensaje = {'operacion': 'lote_subtareas', 'subtareas': [s.a_mensaje() for s in lote.subtareas]}
+            respuesta = intercambiar(destino, mensaje, lote.timeout)
+            respuestas = respuesta.get('resultados')
+            if not isinstance(respuestas, list) or len(respuestas) != len(lote.subtareas):
+                raise Exception(respuesta.get('error', "Respuesta de lote inválida"))
+            lote.respuestas = respuestas
+        except Exception as e:
+            lote.error = e
+        finally:
+            lote.listo.set()
+
+    def resumen(self):
+        """Subtareas enviadas solas y en lotes, y tamaño medio de los lotes."""
+        valores = self.contadores.valores()
+        return {
+            'directas': valores['directas'],
+            'agrupadas': valores['agrupadas'],
+            'lotes': valores['lotes'],
+            'tamano_medio': valores['agrupadas'] / valores['lotes'] if valores['lotes'] else 0,
+            'ventana_ms': self.ventana * 1000,
+            'max_lote': self.max_lote
+        }
+
+
+def realizar_lote(servidor, lote, componente, error_invalida):
+    """Calcula en una pasada las subtareas de un lote y devuelve sus resultados en el mismo orden.
+
+    Lo usan todos los servidores de operación: ``servidor`` aporta su
+    ``validar_solicitud``, su ``realizar_calculo``, su tabla de idempotencia y
+    sus contadores. ``componente`` nombra los tramos de traza y
+    ``error_invalida`` es la respuesta a una subtarea que no valida.
+    """
+    inicio_lote = time.time()
+    resultados = []
+    for subtarea in lote.get('subtareas', []):
+        traza = trazas.Traza(subtarea.get('traza'), componente)
+        try:
+            if not servidor.validar_solicitud(subtarea):
+                resultado = {"error": error_invalida}
+            else:
+                tiempo_inicio = time.time()
+                resultado = servidor.idempotencia.ejecutar(subtarea.get('clave'),
+                                                           lambda: servidor.realizar_calculo(subtarea))
+                traza.registrar('calculo', tiempo_inicio, time.time(), operacion=subtarea['operacion'])
+                tramos = traza.para_respuesta()
+                if tramos:
+                    resultado['traza'] = tramos
+        except Exception as e:
+            resultado = {"error": f"Error en el cálculo: {str(e)}"}
+        finally:
+            traza.finalizar()
+        if 'error' in resultado:
+            servidor.contadores.sumar('errores')
+        resultados.append(resultado)
+    servidor.contadores.sumar('solicitudes', len(resultados))
+    print(f"\nLote de {len(resultados)} subtareas calculado en {time.time() - inicio_lote:.6f} segundos")
+    return {'resultados': resultados}
@@ -0,0 +1,128 @@
+# algebra_lineal.py
+"""Kernels de álgebra lineal sobre matrices densas en formato plano.
+
+Una matriz se representa como ``{'forma': [filas, columnas], 'datos': array('d')}``
+con los datos por filas. Si NumPy está instalado los kernels usan NumPy/BLAS;
+si no, se usan implementaciones en Python puro para que el servidor auxiliar
+pueda reemplazar al servidor de álgebra lineal en cualquier máquina.
+"""
+import math
+from array import array
+from operator import mul
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usan kernels en Python puro
+    np = None
+
+REDUCCIONES = ('suma', 'media', 'maximo', 'minimo', 'norma')
+
+
+def matriz(filas):
+    """Construye una matriz en formato plano a partir de una lista de filas."""
+    columnas = len(filas[0]) if filas else 0
+    datos = array('d')
+    for fila in filas:
+        if len(fila) != columnas:
+            raise ValueError("Todas las filas deben tener la misma longitud")
+        datos.extend(float(x) for x in fila)
+    return {'forma': [len(filas), columnas], 'datos': datos}
+
+
+def es_matriz(valor):
+    """Indica si el valor tiene el formato de matriz plana y es consistente."""
+    if not isinstance(valor, dict) or 'forma' not in valor or 'datos' not in valor:
+        return False
+    filas, columnas = valor['forma']
+    return len(valor['datos']) == filas * columnas
+
+
+def _a_numpy(datos):
+    if isinstance(datos, array):
+        return np.frombuffer(datos, dtype=np.float64)
+    return np.asarray(datos, dtype=np.float64)
+
+
+def _desde_numpy(valores):
+    return array('d', np.ascontiguousarray(valores, dtype=np.float64).tobytes())
+
+
+def producto_matricial(a, b):
+    """Multiplica dos matrices."""
+    m, n = a['forma']
+    _, p = b['forma']
+    if np is not None:
+        resultado = _a_numpy(a['datos']).reshape(m, n) @ _a_numpy(b['datos']).reshape(n, p)
+        return {'forma': [m, p], 'datos': _desde_numpy(resultado)}
+
+    datos_b = b['datos']
+    columnas_b = [datos_b[j::p] for j in range(p)]
+    datos = array('d')
+    datos_a = a['datos']
+    for i in range(m):
+        fila = datos_a[i * n:(i + 1) * n]
+        datos.extend(sum(map(mul, fila, columna)) for columna in columnas_b)
+    return {'forma': [m, p], 'datos': datos}
+
+
+def resolver_sistema(a, b):
+    """Resuelve el sistema lineal A·x = b."""
+    n = a['forma'][0]
+    if np is not None:
+        try:
+            x = np.linalg.solve(_a_numpy(a['datos']).reshape(n, n), _a_numpy(b))
+        except np.linalg.LinAlgError:
+            raise ValueError("La matriz del sistema es singular")
+        return _desde_numpy(x)
+
+    # Eliminación gaussiana con pivoteo parcial
+    filas = [list(a['datos'][i * n:(i + 1) * n]) + [b[i]] for i in range(n)]
+    for k in range(n):
+        pivote = max(range(k, n), key=lambda i: abs(filas[i][k]))
+        if filas[pivote][k] == 0:
+            raise ValueError("La matriz del sistema es singular")
+        filas[k], filas[pivote] = filas[pivote], filas[k]
+        fila_k = filas[k]
+        for i in range(k + 1, n):
+            factor = filas[i][k] / fila_k[k]
+            if factor:
+                fila_i = filas[i]
+                for j in range(k, n + 1):
+                    fila_i[j] -= factor * fila_k[j]
+    x = [0.0] * n
+    for i in range(n - 1, -1, -1):
+        fila = filas[i]
+        x[i] = (fila[n] - sum(fila[j] * x[j] for j in range(i + 1, n))) / fila[i]
+    return array('d', x)
+
+
+def producto_punto(x, y):
+    """Producto escalar de dos vectores."""
+    if np is not None:
+        return float(np.dot(_a_numpy(x), _a_numpy(y)))
+    return math.fsum(map(mul, x, y))
+
+
+def reduccion(datos, tipo):
+    """Reduce un vector a un escalar (suma, media, maximo, minimo o norma)."""
+    if np is not None:
+        valores = _a_numpy(datos)
+        if tipo == 'suma':
+            return float(valores.sum())
+        if tipo == 'media':
+            return float(valores.mean())
+        if tipo == 'maximo':
+            return float(valores.max())
+        if tipo == 'minimo':
+            return float(valores.min())
+        return float(np.linalg.norm(valores))
+
+    if tipo == 'suma':
+        return math.fsum(datos)
+    if tipo == 'media':
+        return math.fsum(datos) / len(datos)
+    if tipo == 'maximo':
+        return max(datos)
+    if tipo == 'minimo':
+        return min(datos)
+    return math.sqrt(math.fsum(x * x for x in datos))
@@ -0,0 +1,412 @@
+# benchmark_failover.py
+"""Benchmark de la tolerancia a fallos con inyección de fallas.
+
+Levanta la pila completa en esta máquina, genera carga constante con varios
+clientes e inyecta una falla en un servidor de operación: matarlo, congelarlo
+(SIGSTOP) o, a través de un proxy local, agregar latencia o descartar sus
+conexiones. Mide cuánto tarda el servidor de cálculo en detectar la falla y en
+redirigir al servidor auxiliar, los errores y la latencia que ven los clientes
+durante el evento y cuánto tarda en restaurarse el enrutamiento normal.
+
+Uso:
+    python benchmark_failover.py --falla matar
+    python benchmark_failover.py --falla congelar --servidor avanzado --duracion 15
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import transporte
+from captura import percentiles
+from cliente import Cliente
+from protocolo import enviar_mensaje, recibir_mensaje
+
+PUERTO_CALCULO = 5000
+PUERTO_AUXILIAR = 5003
+# El servidor bajo prueba escucha en su puerto + este desplazamiento, detrás del proxy
+DESPLAZAMIENTO_PUERTO_OCULTO = 10000
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+SERVIDORES = {
+    'aritmetico': {'modulo': 'servidor_operacion1', 'clase': 'ServidorOperacionAritmetico',
+                   'componente': 'servidor_op1', 'puerto': 5001,
+                   'operacion': 'suma', 'operandos': [1.0, 2.0, 3.0]},
+    'avanzado': {'modulo': 'servidor_operacion2', 'clase': 'ServidorOperacionAvanzado',
+                 'componente': 'servidor_op2', 'puerto': 5002,
+                 'operacion': 'potencia', 'operandos': [2.0, 10.0]},
+}
+FALLAS = ('matar', 'congelar', 'latencia', 'descartar')
+
+
+class ProxyFallas:
+    """Proxy TCP entre el puerto público del servidor y su puerto oculto.
+
+    Con ``retraso`` cada fragmento reenviado espera esos segundos; con
+    ``descartar`` las conexiones nuevas se cierran apenas se aceptan.
+    """
+
+    def __init__(self, puerto, puerto_destino):
+        self.puerto = puerto
+        self.puerto_destino = puerto_destino
+        self.retraso = 0.0
+        self.descartar = False
+        self._servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._servidor.bind(('localhost', puerto))
+        self._servidor.listen(64)
+
+    def iniciar(self):
+        hilo = threading.Thread(target=self._aceptar)
+        hilo.daemon = True
+        hilo.start()
+
+    def cerrar(self):
+        self._servidor.close()
+
+    def _aceptar(self):
+        while True:
+            try:
+                cliente, _ = self._servidor.accept()
+            except OSError:
+                return
+            if self.descartar:
+                cliente.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, b'\x01\x00\x00\x00\x00\x00\x00\x00')
+                cliente.close()
+                continue
+            try:
+                destino = socket.create_connection(('localhost', self.puerto_destino))
+            except OSError:
+                cliente.close()
+                continue
+            for origen, hacia in ((cliente, destino), (destino, cliente)):
+                hilo = threading.Thread(target=self._reenviar, args=(origen, hacia))
+                hilo.daemon = True
+                hilo.start()
+
+    def _reenviar(self, origen, destino):
+        try:
+            while True:
+                datos = origen.recv(65536)
+                if not datos:
+                    break
+                if self.retraso:
+                    time.sleep(self.retraso)
+                destino.sendall(datos)
+        except OSError:
+            pass
+        finally:
+            for s in (origen, destino):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                s.close()
+
+
+class Pila:
+    """Procesos de la pila local; el servidor bajo prueba queda detrás del proxy."""
+
+    def __init__(self, objetivo):
+        self.objetivo = objetivo
+        self.info = SERVIDORES[objetivo]
+        self.procesos = {}
+        self.proxy = None
+
+    def _lanzar(self, nombre, argumentos):
+        registro = open(os.path.join(tempfile.gettempdir(), f"benchmark_failover_{nombre}.log"), 'ab')
+        # Sin retraso de baja al drenar, para que la pila se detenga enseguida con SIGTERM, y sin
+        # planificador: las operaciones de prueba son tan chicas que se calcularían en el servidor de cálculo
+        self.procesos[nombre] = subprocess.Popen(
+            [sys.executable, '-u'] + argumentos, cwd=DIRECTORIO, stdout=registro, stderr=subprocess.STDOUT,
+            env=dict(os.environ, CALCULO_RETRASO_BAJA='0', CALCULO_PLANIFICADOR='0'))
+        registro.close()
+
+    def lanzar_objetivo(self):
+        codigo = (f"from {self.info['modulo']} import {self.info['clase']}; "
+                  f"{self.info['clase']}(puerto={self.info['puerto'] + DESPLAZAMIENTO_PUERTO_OCULTO}).iniciar()")
+        self._lanzar(self.objetivo, ['-c', codigo])
+
+    def iniciar(self):
+        # Un socket Unix abandonado haría que el servidor de cálculo salteara el proxy
+        try:
+            os.unlink(transporte.ruta_socket_unix(self.info['puerto']))
+        except OSError:
+            pass
+        self.proxy = ProxyFallas(self.info['puerto'], self.info['puerto'] + DESPLAZAMIENTO_PUERTO_OCULTO)
+        self.proxy.iniciar()
+        self.lanzar_objetivo()
+        for tipo, info in SERVIDORES.items():
+            if tipo != self.objetivo:
+                self._lanzar(tipo, ['main.py', info['componente']])
+        self._lanzar('auxiliar', ['main.py', 'servidor_auxiliar'])
+        self._lanzar('calculo', ['main.py', 'servidor_calculo'])
+
+    def detener(self):
+        for proceso in self.procesos.values():
+            if proceso.poll() is None:
+                proceso.send_signal(signal.SIGCONT)
+                proceso.terminate()
+        for proceso in self.procesos.values():
+            try:
+                proceso.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+        if self.proxy is not None:
+            self.proxy.cerrar()
+
+    def inyectar(self, falla, retraso):
+        proceso = self.procesos[self.objetivo]
+        if falla == 'matar':
+            proceso.kill()
+            proceso.wait()
+        elif falla == 'congelar':
+            proceso.send_signal(signal.SIGSTOP)
+        elif falla == 'latencia':
+            self.proxy.retraso = retraso
+        elif falla == 'descartar':
+            self.proxy.descartar = True
+
+    def restaurar(self, falla):
+        if falla == 'matar':
+            self.lanzar_objetivo()
+        elif falla == 'congelar':
+            self.procesos[self.objetivo].send_signal(signal.SIGCONT)
+        elif falla == 'latencia':
+            self.proxy.retraso = 0.0
+        elif falla == 'descartar':
+            self.proxy.descartar = False
+
+
+def consultar(puerto, operacion, timeout=1):
+    """Envía una operación de control a un servidor local; devuelve None si no responde."""
+    try:
+        with transporte.conectar('localhost', puerto, timeout=timeout) as s:
+            enviar_mensaje(s, {'operacion': operacion, 'operandos': []})
+            return recibir_mensaje(s)
+    except (OSError, ValueError):
+        return None
+
+
+def estado_objetivo(objetivo):
+    """Estado del servidor bajo prueba según el servidor de cálculo (None si no responde)."""
+    respuesta = consultar(PUERTO_CALCULO, 'obtener_metricas')
+    if not respuesta or 'servidores' not in respuesta:
+        return None
+    return respuesta['servidores'].get(objetivo)
+
+
+def esperar_pila(objetivo, timeout=30):
+    """Espera a que el servidor de cálculo vea activos al servidor bajo prueba y al auxiliar."""
+    limite = time.time() + timeout
+    while time.time() < limite:
+        respuesta = consultar(PUERTO_CALCULO, 'obtener_metricas')
+        if respuesta and respuesta.get('servidores', {}).get(objetivo) and respuesta['servidores'].get('auxiliar'):
+            return True
+        time.sleep(0.2)
+    return False
+
+
+class GeneradorCarga:
+    """Clientes que envían solicitudes continuamente y registran cada respuesta."""
+
+    def __init__(self, objetivo, clientes, intervalo):
+        self.info = SERVIDORES[objetivo]
+        self.clientes = clientes
+        self.intervalo = intervalo
+        self.muestras = []  # (envio, fin, ok, servidor)
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilos = []
+
+    def iniciar(self):
+        for _ in range(self.clientes):
+            hilo = threading.Thread(target=self._ciclo)
+            hilo.daemon = True
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def detener(self):
+        self._detener.set()
+        for hilo in self._hilos:
+            hilo.join()
+
+    def _ciclo(self):
+        cliente = Cliente('localhost', PUERTO_CALCULO)
+        while not self._detener.is_set():
+            envio = time.time()
+            respuesta = cliente.enviar_solicitud(self.info['operacion'], self.info['operandos'])
+            fin = time.time()
+            with self._lock:
+                self.muestras.append((envio, fin, 'error' not in respuesta, respuesta.get('servidor')))
+            self._detener.wait(self.intervalo)
+
+
+class Observador:
+    """Consulta periódicamente cómo ve el servidor de cálculo al servidor bajo prueba."""
+
+    def __init__(self, objetivo, periodo=0.1):
+        self.objetivo = objetivo
+        self.periodo = periodo
+        self.observaciones = []  # (hora, activo)
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._ciclo)
+        self._hilo.daemon = True
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+    def _ciclo(self):
+        while not self._detener.is_set():
+            activo = estado_objetivo(self.objetivo)
+            if activo is not None:
+                self.observaciones.append((time.time(), activo))
+            self._detener.wait(self.periodo)
+
+
+def analizar(muestras, observaciones, hora_falla, hora_restauracion):
+    """Calcula los tiempos de detección, redirección y restauración y la latencia del evento."""
+    deteccion = next((hora for hora, activo in observaciones if hora >= hora_falla and not activo), None)
+    redireccion = min((fin for envio, fin, ok, servidor in muestras
+                       if fin >= hora_falla and ok and servidor == 'auxiliar'), default=None)
+    visto_activo = next((hora for hora, activo in observaciones
+                         if hora >= hora_restauracion and activo), None)
+    primera_normal = min((fin for envio, fin, ok, servidor in muestras
+                          if envio >= hora_restauracion and ok and servidor is None), default=None)
+    restauracion = None
+    if visto_activo is not None and primera_normal is not None:
+        restauracion = max(visto_activo, primera_normal)
+
+    fin_evento = restauracion if restauracion is not None else max(fin for _, fin, _, _ in muestras)
+    base = [fin - envio for envio, fin, ok, _ in muestras if envio < hora_falla and ok]
+    evento = [(envio, fin, ok) for envio, fin, ok, _ in muestras if hora_falla <= envio <= fin_evento]
+    return {
+        'tiempo_deteccion': deteccion - hora_falla if deteccion is not None else None,
+        'tiempo_redireccion': redireccion - hora_falla if redireccion is not None else None,
+        'tiempo_restauracion': restauracion - hora_restauracion if restauracion is not None else None,
+        'solicitudes_evento': len(evento),
+        'errores_evento': sum(1 for _, _, ok in evento if not ok),
+        'latencia_base': percentiles(base),
+        'latencia_evento': percentiles([fin - envio for envio, fin, _ in evento]),
+        'solicitudes_totales': len(muestras),
+    }
+
+
+def evaluar(resultado, umbrales):
+    """Compara el resultado con los umbrales; devuelve {criterio: (valor, umbral, aprobado)}."""
+    valores = {
+        'errores_evento': resultado['errores_evento'],
+        'tiempo_redireccion': resultado['tiempo_redireccion'],
+        'p99_evento': resultado['latencia_evento'].get('p99'),
+        'tiempo_restauracion': resultado['tiempo_restauracion'],
+    }
+    return {criterio: (valores[criterio], umbral, valores[criterio] is not None and valores[criterio] <= umbral)
+            for criterio, umbral in umbrales.items() if umbral is not None}
+
+
+def mostrar_reporte(falla, objetivo, resultado, evaluacion):
+    ancho = 80
+
+    def segundos(valor):
+        return f"{valor:.3f} s" if valor is not None else "no ocurrió"
+
+    print("=" * ancho)
+    print(f"{'BENCHMARK DE TOLERANCIA A FALLOS':^{ancho}}")
+    print(f"{'Falla: ' + falla + ' | Servidor: ' + objetivo:^{ancho}}")
+    print("=" * ancho)
+    print(f"Tiempo de detección:     {segundos(resultado['tiempo_deteccion'])}")
+    print(f"Tiempo de redirección:   {segundos(resultado['tiempo_redireccion'])}")
+    print(f"Tiempo de restauración:  {segundos(resultado['tiempo_restauracion'])}")
+    print(f"Solicitudes en el evento: {resultado['solicitudes_evento']} "
+          f"(errores: {resultado['errores_evento']}) de {resultado['solicitudes_totales']} totales")
+    print("-" * ancho)
+    print(f"{'Latencia (ms)':<16}" + ''.join(f"{clave:>12}" for clave in ('p50', 'p90', 'p99', 'media', 'maximo')))
+    for nombre, clave in (('Base', 'latencia_base'), ('Evento', 'latencia_evento')):
+        valores = resultado[clave]
+        print(f"{nombre:<16}" + ''.join(f"{valores[c] * 1000:>12.3f}" if c in valores else f"{'-':>12}"
+                                        for c in ('p50', 'p90', 'p99', 'media', 'maximo')))
+    print("-" * ancho)
+    for criterio, (valor, umbral, aprobado) in evaluacion.items():
+        estado = "✅ APROBADO" if aprobado else "❌ FALLIDO"
+        print(f"{criterio:<22} {str(round(valor, 3)) if valor is not None else '-':>10} <= {umbral:<8} {estado}")
+    print("=" * ancho)
+
+
+def ejecutar(falla, objetivo, clientes=4, intervalo=0.02, calentamiento=3.0, duracion=10.0,
+             observacion=15.0, retraso=0.5, umbrales=None):
+    """Ejecuta un escenario completo y devuelve (resultado, evaluación)."""
+    pila = Pila(objetivo)
+    pila.iniciar()
+    try:
+        if not esperar_pila(objetivo):
+            raise RuntimeError("La pila no quedó lista a tiempo; revise los registros benchmark_failover_*.log")
+        carga = GeneradorCarga(objetivo, clientes, intervalo)
+        observador = Observador(objetivo)
+        carga.iniciar()
+        observador.iniciar()
+        time.sleep(calentamiento)
+
+        hora_falla = time.time()
+        pila.inyectar(falla, retraso)
+        time.sleep(duracion)
+        hora_restauracion = time.time()
+        pila.restaurar(falla)
+        time.sleep(observacion)
+
+        carga.detener()
+        observador.detener()
+    finally:
+        pila.detener()
+
+    resultado = analizar(carga.muestras, observador.observaciones, hora_falla, hora_restauracion)
+    resultado.update({'falla': falla, 'servidor': objetivo})
+    return resultado, evaluar(resultado, umbrales or {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de tolerancia a fallos con inyección de fallas')
+    parser.add_argument('--falla', choices=FALLAS, default='matar')
+    parser.add_argument('--servidor', choices=list(SERVIDORES), default='aritmetico')
+    parser.add_argument('--clientes', type=int, default=4)
+    parser.add_argument('--intervalo', type=float, default=0.02, help='pausa entre solicitudes de cada cliente (s)')
+    parser.add_argument('--calentamiento', type=float, default=3.0)
+    parser.add_argument('--duracion', type=float, default=10.0, help='duración de la falla (s)')
+    parser.add_argument('--observacion', type=float, default=15.0, help='tiempo observado tras restaurar (s)')
+    parser.add_argument('--retraso', type=float, default=0.5, help='latencia agregada por el proxy (s)')
+    parser.add_argument('--max-errores', type=int, default=0)
+    parser.add_argument('--max-redireccion', type=float, default=6.0)
+    parser.add_argument('--max-p99', type=float, default=6.0)
+    parser.add_argument('--max-restauracion', type=float, default=10.0)
+    parser.add_argument('--json', metavar='ARCHIVO', help='guarda el resultado en un archivo JSON')
+    args = parser.parse_args()
+
+    umbrales = {
+        'errores_evento': args.max_errores,
+        # Con latencia agregada el servidor puede seguir respondiendo y no hay redirección
+        'tiempo_redireccion': args.max_redireccion if args.falla != 'latencia' else None,
+        'p99_evento': args.max_p99,
+        'tiempo_restauracion': args.max_restauracion,
+    }
+    resultado, evaluacion = ejecutar(args.falla, args.servidor, args.clientes, args.intervalo,
+                                     args.calentamiento, args.duracion, args.observacion,
+                                     args.retraso, umbrales)
+    mostrar_reporte(args.falla, args.servidor, resultado, evaluacion)
+    if args.json:
+        resultado['evaluacion'] = {criterio: aprobado for criterio, (_, _, aprobado) in evaluacion.items()}
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2)
+    sys.exit(0 if all(aprobado for _, _, aprobado in evaluacion.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+# benchmark_micro.py
+"""Micro-benchmarks de los caminos críticos de cálculo y serialización.
+
+Mide ``realizar_calculo`` de cada servidor para cada operación y tamaño de
+operandos, ``sum()`` frente a la suma compensada, la codificación y decodificación de solicitudes y respuestas
+típicas, ``dividir_tarea``/``ensamblar_resultado`` del servidor de cálculo y
+un viaje completo de ida y vuelta por loopback contra cada servidor. Los
+resultados se guardan como línea base en JSON y el modo de comparación marca
+las regresiones que superan el umbral de ruido.
+
+Uso:
+    python benchmark_micro.py --guardar linea_base.json
+    python benchmark_micro.py --comparar linea_base.json --umbral 0.10
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+from array import array
+
+import algebra_lineal
+import operaciones
+import sumas
+import transporte
+from protocolo import a_arreglo, enviar_mensaje, escribir_mensaje, leer_mensaje, recibir_mensaje
+
+# Duración mínima de cada repetición; el número de iteraciones se ajusta para alcanzarla
+DURACION_MINIMA = 0.05
+REPETICIONES = 5
+UMBRAL_RUIDO = 0.10
+# Los servidores del viaje de ida y vuelta escuchan en su puerto + este desplazamiento
+DESPLAZAMIENTO_PUERTO = 20000
+SEMILLA = 1234
+TAMANOS = (2, 1000, 100000)
+SERVIDORES_IDA_Y_VUELTA = ('aritmetico', 'avanzado', 'algebra_lineal', 'auxiliar', 'calculo')
+
+
+def medir(funcion, repeticiones=REPETICIONES):
+    """Mide una función sin argumentos; devuelve segundos por llamada (mediana y mínimo)."""
+    funcion()
+    iteraciones = 1
+    while True:
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            funcion()
+        if time.perf_counter() - inicio >= DURACION_MINIMA:
+            break
+        iteraciones *= 2
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            funcion()
+        tiempos.append((time.perf_counter() - inicio) / iteraciones)
+    return {'mediana': statistics.median(tiempos), 'minimo': min(tiempos), 'iteraciones': iteraciones}
+
+
+def _vector(generador, n, minimo=0.5, maximo=100.0):
+    return array('d', (generador.uniform(minimo, maximo) for _ in range(n)))
+
+
+def casos_calculo():
+    """Casos de realizar_calculo: (nombre, servidor, solicitud)."""
+    from servidor_operacion1 import ServidorOperacionAritmetico
+    from servidor_operacion2 import ServidorOperacionAvanzado
+    from servidor_operacion3 import ServidorOperacionAlgebraLineal
+
+    generador = random.Random(SEMILLA)
+    aritmetico = ServidorOperacionAritmetico()
+    avanzado = ServidorOperacionAvanzado()
+    algebra = ServidorOperacionAlgebraLineal()
+    casos = []
+    for tamano in TAMANOS:
+        datos = _vector(generador, tamano)
+        for operacion in ('suma', 'resta', 'multiplicacion'):
+            casos.append((f"calculo/{operacion}/{tamano}", aritmetico, {'operacion': operacion, 'operandos': datos}))
+    casos.append(("calculo/division/2", aritmetico, {'operacion': 'division', 'operandos': [7.0, 3.0]}))
+    for operacion, operandos in (('potencia', [2.0, 10.0]), ('raiz', [27.0, 3.0]), ('logaritmo', [8.0, 2.0])):
+        casos.append((f"calculo/{operacion}/2", avanzado, {'operacion': operacion, 'operandos': operandos}))
+    for tamano in TAMANOS[1:]:
+        base = _vector(generador, tamano)
+        exponentes = _vector(generador, tamano, 0.1, 3.0)
+        for operacion in ('potencia_vectorial', 'raiz_vectorial', 'logaritmo_vectorial'):
+            casos.append((f"calculo/{operacion}/{tamano}", avanzado,
+                          {'operacion': operacion, 'operandos': [base, exponentes]}))
+        casos.append((f"calculo/producto_punto/{tamano}", algebra,
+                      {'operacion': 'producto_punto', 'operandos': [base, exponentes]}))
+        for tipo in algebra_lineal.REDUCCIONES:
+            casos.append((f"calculo/reduccion_{tipo}/{tamano}", algebra,
+                          {'operacion': 'reduccion', 'operandos': [base, tipo]}))
+    for n in (8, 32):
+        a = {'forma': [n, n], 'datos': _vector(generador, n * n)}
+        b = {'forma': [n, n], 'datos': _vector(generador, n * n)}
+        casos.append((f"calculo/producto_matricial/{n}x{n}", algebra,
+                      {'operacion': 'producto_matricial', 'operandos': [a, b]}))
+        # Diagonal dominante para que el sistema siempre tenga solución
+        for i in range(n):
+            a['datos'][i * n + i] += 100.0 * n
+        casos.append((f"calculo/resolver_sistema/{n}x{n}", algebra,
+                      {'operacion': 'resolver_sistema', 'operandos': [a, _vector(generador, n)]}))
+    return casos
+
+
+def casos_sumas():
+    """sum() nativo frente a la suma compensada de suma/resta, con magnitudes mezcladas."""
+    generador = random.Random(SEMILLA)
+    casos = []
+    for tamano in (100000, 1000000):
+        datos = array('d', (generador.uniform(-1e6, 1e6) * 10.0 ** generador.randint(-8, 8) for _ in range(tamano)))
+        casos.append((f"sumas/sum_nativa/{tamano}", lambda d=datos: sum(d)))
+        # En un solo proceso, como cuando no hay núcleos libres
+        casos.append((f"sumas/fsum/{tamano}", lambda d=datos: math.fsum(d)))
+        # Con los CALCULO_PROCESOS_SUMA procesos configurados (por defecto, uno por núcleo)
+        casos.append((f"sumas/compensada_x{sumas.PROCESOS}/{tamano}", lambda d=datos: sumas.suma(d)))
+        # Listas como las de un mensaje JSON: la suma compensada debería costar lo mismo que un fsum
+        # (sin una pasada previa de sum()); las de enteros, lo mismo que un sum()
+        lista = datos.tolist()
+        enteros = [int(v) for v in lista]
+        casos.append((f"sumas/lista_fsum/{tamano}", lambda d=lista: math.fsum(d)))
+        casos.append((f"sumas/lista_compensada/{tamano}", lambda d=lista: sumas.suma(d)))
+        casos.append((f"sumas/lista_enteros_sum/{tamano}", lambda d=enteros: sum(d)))
+        casos.append((f"sumas/lista_enteros/{tamano}", lambda d=enteros: sumas.suma(d)))
+    return casos
+
+
+def mensajes_tipicos():
+    """Solicitudes y respuestas típicas: (nombre, mensaje)."""
+    generador = random.Random(SEMILLA)
+    mensajes = []
+    for tamano in TAMANOS:
+        datos = _vector(generador, tamano)
+        mensajes.append((f"solicitud_suma/{tamano}", {'operacion': 'suma', 'operandos': datos,
+                                                       'timestamp': time.time()}))
+        mensajes.append((f"respuesta_suma/{tamano}", {'operacion': 'suma', 'operandos': datos, 'resultado': 1.5,
+                                                       'tiempo_procesamiento': 0.001}))
+    datos = _vector(generador, 1000)
+    respuesta_vectorial = operaciones.REGISTRO['raiz_vectorial'].ejecutar([datos, 2.0])
+    mensajes.append(("respuesta_raiz_vectorial/1000", respuesta_vectorial))
+    mensajes.append(("solicitud_lista/2", {'operacion': 'potencia', 'operandos': [2, 10], 'timestamp': time.time()}))
+    return mensajes
+
+
+def casos_serializacion():
+    """Codificación y decodificación de mensajes con el formato del protocolo."""
+    casos = []
+    for nombre, mensaje in mensajes_tipicos():
+        archivo = io.BytesIO()
+        escribir_mensaje(archivo, mensaje)
+        trama = archivo.getvalue()
+
+        def codificar(mensaje=mensaje):
+            escribir_mensaje(io.BytesIO(), mensaje)
+
+        def decodificar(trama=trama):
+            leer_mensaje(io.BytesIO(trama))
+
+        def reenviar(trama=trama):
+            # El servidor de cálculo no decodifica los operandos que reenvía
+            leer_mensaje(io.BytesIO(trama), decodificar_operandos=False)
+
+        casos.append((f"serializacion/codificar/{nombre}", codificar))
+        casos.append((f"serializacion/decodificar/{nombre}", decodificar))
+        casos.append((f"serializacion/decodificar_sin_operandos/{nombre}", reenviar))
+    return casos
+
+
+def casos_coordinacion():
+    """dividir_tarea, ensamblar_resultado, validar_operandos y el planificador del servidor de cálculo."""
+    from mensajes import Resultado, Solicitud
+    from servidor_calculo import ServidorCalculo
+
+    servidor = ServidorCalculo()
+    for tipo in ('aritmetico', 'avanzado', 'algebra_lineal', 'auxiliar'):
+        tipos = {'auxiliar': (operaciones.TIPO_ARITMETICO, operaciones.TIPO_AVANZADO,
+                              operaciones.TIPO_ALGEBRA_LINEAL)}.get(tipo, (tipo,))
+        servidor.marcar_servidor(tipo, True, operaciones.operaciones_de_tipo(*tipos))
+
+    solicitudes = {
+        'suma': Solicitud('suma', array('d', [1.0, 2.0, 3.0]), time.time()),
+        'calculo_complejo': Solicitud('calculo_complejo', [2.0, 3.0, 2.0, 2.0], time.time()),
+    }
+    parciales = {
+        'suma': [Resultado('suma', 6.0, [1.0, 2.0, 3.0])],
+        'calculo_complejo': [Resultado('suma', 5.0, [2.0, 3.0]), Resultado('potencia', 4.0, [2.0, 2.0])],
+    }
+    casos = []
+    for nombre, solicitud in solicitudes.items():
+        casos.append((f"coordinacion/dividir_tarea/{nombre}", lambda s=solicitud: servidor.dividir_tarea(s)))
+        casos.append((f"coordinacion/ensamblar_resultado/{nombre}",
+                      lambda s=solicitud, p=parciales[nombre]: servidor.ensamblar_resultado(p, s)))
+        casos.append((f"coordinacion/validar_operandos/{nombre}",
+                      lambda s=solicitud: servidor.validar_operandos(s)))
+        casos.append((f"coordinacion/planificar/{nombre}",
+                      lambda s=solicitud: servidor.planificador.planificar(s, servidor.ruteo, servidor.en_vuelo)))
+    return casos
+
+
+def _iniciar_en_hilo(servidor):
+    hilo = threading.Thread(target=servidor.iniciar)
+    hilo.daemon = True
+    hilo.start()
+
+
+def _esperar_puerto(puerto, timeout=10):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            with transporte.conectar('localhost', puerto, timeout=1) as s:
+                enviar_mensaje(s, {'operacion': 'verificar_estado', 'operandos': []})
+                recibir_mensaje(s)
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def casos_ida_y_vuelta():
+    """Un viaje completo por loopback contra cada servidor, en puertos propios del benchmark."""
+    from servidor_auxiliar import ServidorAuxiliar
+    from servidor_calculo import ServidorCalculo
+    from servidor_operacion1 import ServidorOperacionAritmetico
+    from servidor_operacion2 import ServidorOperacionAvanzado
+    from servidor_operacion3 import ServidorOperacionAlgebraLineal
+
+    servidores = {
+        'aritmetico': ServidorOperacionAritmetico(puerto=5001 + DESPLAZAMIENTO_PUERTO),
+        'avanzado': ServidorOperacionAvanzado(puerto=5002 + DESPLAZAMIENTO_PUERTO),
+        'algebra_lineal': ServidorOperacionAlgebraLineal(puerto=5004 + DESPLAZAMIENTO_PUERTO),
+        'auxiliar': ServidorAuxiliar(puerto=5003 + DESPLAZAMIENTO_PUERTO),
+    }
+    calculo = ServidorCalculo(puerto_escucha=5000 + DESPLAZAMIENTO_PUERTO, servidores_operacion=[
+        {'host': 'localhost', 'puerto': servidor.puerto, 'tipo': tipo} for tipo, servidor in servidores.items()])
+    # El auxiliar no debe monitorear ni notificar a la pila real
+    servidores['auxiliar'].monitorear_servidores = lambda: None
+    for servidor in servidores.values():
+        _iniciar_en_hilo(servidor)
+    for tipo, servidor in servidores.items():
+        _esperar_puerto(servidor.puerto)
+    _iniciar_en_hilo(calculo)
+    _esperar_puerto(calculo.puerto_escucha)
+    # Esperar a que el monitoreo del servidor de cálculo vea a los servidores de operación
+    limite = time.time() + 10
+    while not all(calculo.ruteo.activo(tipo) for tipo in servidores) and time.time() < limite:
+        time.sleep(0.05)
+
+    generador = random.Random(SEMILLA)
+    solicitudes = {
+        'aritmetico': {'operacion': 'suma', 'operandos': a_arreglo([1.0, 2.0, 3.0])},
+        'avanzado': {'operacion': 'potencia', 'operandos': [2.0, 10.0]},
+        'algebra_lineal': {'operacion': 'producto_punto',
+                           'operandos': [_vector(generador, 1000), _vector(generador, 1000)]},
+        'auxiliar': {'operacion': 'suma', 'operandos': a_arreglo([1.0, 2.0, 3.0]), 'tipo': 'aritmetico'},
+        'calculo': {'operacion': 'suma', 'operandos': a_arreglo([1.0, 2.0, 3.0])},
+    }
+    puertos = {tipo: servidor.puerto for tipo, servidor in servidores.items()}
+    puertos['calculo'] = calculo.puerto_escucha
+
+    def viaje(puerto, solicitud):
+        with transporte.conectar('localhost', puerto, timeout=5) as s:
+            enviar_mensaje(s, solicitud)
+            respuesta = recibir_mensaje(s)
+        if 'error' in respuesta:
+            raise RuntimeError(respuesta['error'])
+
+    return [(f"ida_y_vuelta/{tipo}", lambda p=puertos[tipo], s=solicitud: viaje(p, s))
+            for tipo, solicitud in solicitudes.items()]
+
+
+def ejecutar(filtro=None, repeticiones=REPETICIONES):
+    """Ejecuta todos los casos (o los que contienen ``filtro``) y devuelve la línea base."""
+    resultados = {}
+    # Los servidores imprimen cada solicitud: se silencian mientras se mide
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        casos = [(nombre, lambda s=servidor, q=solicitud: s.realizar_calculo(q))
+                 for nombre, servidor, solicitud in casos_calculo()]
+        casos += casos_sumas() + casos_serializacion() + casos_coordinacion()
+        # Los servidores del viaje de ida y vuelta solo se levantan si algún caso los usa
+        if filtro is None or any(filtro in f"ida_y_vuelta/{tipo}" for tipo in SERVIDORES_IDA_Y_VUELTA):
+            casos += casos_ida_y_vuelta()
+        for nombre, funcion in casos:
+            if filtro and filtro not in nombre:
+                continue
+            resultados[nombre] = medir(funcion, repeticiones)
+    return {
+        'metadatos': {
+            'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'numpy': algebra_lineal.np.__version__ if algebra_lineal.np is not None else None,
+            'transporte_local': transporte.HABILITADO,
+        },
+        'resultados': resultados
+    }
+
+
+def comparar(base, actual, umbral=UMBRAL_RUIDO):
+    """Compara los tiempos mínimos, que son los menos sensibles a la carga de la máquina.
+
+    Devuelve {caso: (razón, estado)} con estado regresion, mejora, igual o nuevo.
+    """
+    comparacion = {}
+    for nombre, medida in actual['resultados'].items():
+        anterior = base['resultados'].get(nombre)
+        if anterior is None:
+            comparacion[nombre] = (None, 'nuevo')
+            continue
+        razon = medida['minimo'] / anterior['minimo']
+        if razon > 1 + umbral:
+            estado = 'regresion'
+        elif razon < 1 - umbral:
+            estado = 'mejora'
+        else:
+            estado = 'igual'
+        comparacion[nombre] = (razon, estado)
+    return comparacion
+
+
+def _formatear_tiempo(segundos):
+    if segundos < 1e-3:
+        return f"{segundos * 1e6:.2f} µs"
+    if segundos < 1:
+        return f"{segundos * 1e3:.3f} ms"
+    return f"{segundos:.3f} s"
+
+
+def objetivo_sumas(resultados):
+    """Razón entre la suma compensada con los procesos configurados y ``sum()``, por tamaño.
+
+    El objetivo es que la suma compensada no tarde más que ``sum()`` en las
+    entradas grandes. No se alcanza con pocos núcleos: cada bloque necesita
+    varias pasadas de ``fsum`` (la suma y sus residuos exactos, ver sumas.py)
+    y una pasada de ``fsum`` cuesta varias de ``sum()``.
+    """
+    razones = {}
+    for nombre, medida in resultados.items():
+        partes = nombre.split('/')
+        if len(partes) == 3 and partes[0] == 'sumas' and partes[1].startswith('compensada_x'):
+            nativa = resultados.get(f"sumas/sum_nativa/{partes[2]}")
+            if nativa is not None:
+                razones[int(partes[2])] = medida['minimo'] / nativa['minimo']
+    return razones
+
+
+def mostrar_reporte(actual, comparacion=None):
+    ancho = 110
+    print("=" * ancho)
+    print(f"{'MICRO-BENCHMARKS':^{ancho}}")
+    metadatos = actual['metadatos']
+    print(f"{'Python ' + metadatos['python'] + ' | NumPy: ' + str(metadatos['numpy']):^{ancho}}")
+    print("=" * ancho)
+    print(f"{'Caso':<62}{'Mínimo':>14}{'Mediana':>14}")
+    print("-" * ancho)
+    for nombre, medida in actual['resultados'].items():
+        linea = f"{nombre:<62}{_formatear_tiempo(medida['minimo']):>14}{_formatear_tiempo(medida['mediana']):>14}"
+        if comparacion is not None:
+            razon, estado = comparacion[nombre]
+            marca = {'regresion': '❌ regresión', 'mejora': '✅ mejora', 'igual': '', 'nuevo': 'nuevo'}[estado]
+            linea += f"{razon:>8.2f}x {marca}" if razon is not None else f"{'':>9} {marca}"
+        print(linea)
+    print("=" * ancho)
+    razones = objetivo_sumas(actual['resultados'])
+    if razones:
+        detalle = ', '.join(f"{tamano}: {razon:.2f}x" for tamano, razon in sorted(razones.items()))
+        alcanzado = all(razon <= 1 for razon in razones.values())
+        print(f"Suma compensada con {sumas.PROCESOS} procesos frente a sum() ({detalle}): objetivo "
+              f"{'alcanzado' if alcanzado else 'NO alcanzado'} (como mucho 1x)")
+        if not alcanzado:
+            print("Una pasada de fsum cuesta varias de sum() y, repartida en bloques, cada bloque necesita "
+                  "varias pasadas para combinarse exactamente: hacen falta muchos núcleos "
+                  "(ver README, Sumas Compensadas)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks de cálculo y serialización')
+    parser.add_argument('--guardar', metavar='ARCHIVO', help='guarda los resultados como línea base JSON')
+    parser.add_argument('--comparar', metavar='ARCHIVO', help='compara con una línea base JSON')
+    parser.add_argument('--umbral', type=float, default=UMBRAL_RUIDO,
+                        help='variación relativa del tiempo mínimo tolerada como ruido')
+    parser.add_argument('--filtro', help='ejecuta solo los casos cuyo nombre contiene este texto')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    args = parser.parse_args()
+
+    actual = ejecutar(args.filtro, args.repeticiones)
+    comparacion = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            comparacion = comparar(json.load(archivo), actual, args.umbral)
+    mostrar_reporte(actual, comparacion)
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump(actual, archivo, indent=2)
+        print(f"Línea base guardada en {args.guardar}")
+    if comparacion is not None:
+        regresiones = [nombre for nombre, (_, estado) in comparacion.items() if estado == 'regresion']
+        if regresiones:
+            print(f"{len(regresiones)} regresiones por encima del umbral de {args.umbral:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+# benchmark_resistencia.py
+"""Prueba de resistencia (soak) de la pila completa.
+
+Levanta todos los servidores en esta máquina y los mantiene durante horas bajo
+una carga mixta: operaciones escalares, vectoriales, de álgebra lineal,
+exactas pesadas y trabajos asíncronos. Cada tanto mata o congela un servidor
+de operación y después lo restaura. Periódicamente mide, para cada componente
+y sus procesos hijos, la memoria residente (RSS), los hilos, los descriptores
+de archivo abiertos y los procesos, y la latencia y los errores que ven los
+clientes.
+
+Al final ajusta una recta a cada serie, sin contar el calentamiento de cada
+proceso, y falla si alguna crece más rápido que su umbral por hora. Un proceso
+reiniciado por una falla empieza una serie nueva. Las mediciones se leen de
+``/proc``, así que la prueba solo funciona en Linux.
+
+Uso:
+    python benchmark_resistencia.py --horas 4 --muestras resistencia.jsonl
+    python benchmark_resistencia.py --horas 0.25 --periodo-fallas 30 --max-rss 64
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import transporte
+from algebra_lineal import matriz
+from benchmark_failover import consultar
+from captura import percentiles
+from cliente import Cliente
+from protocolo import enviar_mensaje, recibir_mensaje
+
+PUERTO_CALCULO = 5000
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Componente -> (argumentos de main.py, puerto, si se le inyectan fallas)
+COMPONENTES = {
+    'aritmetico': ('servidor_op1', 5001, True),
+    'avanzado': ('servidor_op2', 5002, True),
+    'algebra_lineal': ('servidor_op3', 5004, True),
+    'auxiliar': ('servidor_auxiliar', 5003, False),
+    'calculo': ('servidor_calculo', PUERTO_CALCULO, False),
+}
+FALLAS = ('matar', 'congelar')
+SERIES = ('rss_mb', 'hilos', 'fds', 'procesos')
+
+
+def _mezcla():
+    """Operaciones de la carga, con su peso relativo."""
+    vector = [random.uniform(1, 100) for _ in range(2000)]
+    a = matriz([[random.uniform(-1, 1) for _ in range(8)] for _ in range(8)])
+    return [
+        (30, 'suma', lambda: [random.uniform(-100, 100) for _ in range(random.randint(2, 6))]),
+        (15, 'raiz', lambda: [random.uniform(1, 100), 2]),
+        (10, 'multiplicacion', lambda: [random.uniform(-10, 10) for _ in range(3)]),
+        (10, 'potencia_vectorial', lambda: [vector, 2.0]),
+        (8, 'producto_matricial', lambda: [a, a]),
+        (8, 'reduccion', lambda: [vector, 'norma']),
+        (5, 'calculo_complejo', lambda: [1.0, 2.0, 3.0, 2.0]),
+        (2, 'potencia_exacta', lambda: [3, random.randint(20000, 40000)]),
+        # Se envía como trabajo asíncrono y se espera su resultado
+        (4, 'trabajo', lambda: [random.uniform(-100, 100) for _ in range(3)]),
+    ]
+
+
+def _descendientes(pid):
+    """Procesos hijos (y nietos) de un proceso, según /proc."""
+    hijos = []
+    try:
+        for tarea in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{tarea}/children') as archivo:
+                hijos.extend(int(hijo) for hijo in archivo.read().split())
+    except OSError:
+        return []
+    return hijos + [nieto for hijo in hijos for nieto in _descendientes(hijo)]
+
+
+def medir_proceso(pid):
+    """RSS (MB), hilos, descriptores abiertos y cantidad de procesos de un proceso y sus hijos."""
+    medicion = dict.fromkeys(SERIES, 0)
+    for actual in [pid] + _descendientes(pid):
+        try:
+            with open(f'/proc/{actual}/status') as archivo:
+                for linea in archivo:
+                    if linea.startswith('VmRSS:'):
+                        medicion['rss_mb'] += int(linea.split()[1]) / 1024
+                    elif linea.startswith('Threads:'):
+                        medicion['hilos'] += int(linea.split()[1])
+            medicion['fds'] += len(os.listdir(f'/proc/{actual}/fd'))
+            medicion['procesos'] += 1
+        except OSError:
+            # El proceso terminó entre la lista y la lectura
+            continue
+    return medicion
+
+
+def pendiente(puntos):
+    """Pendiente por hora de la recta de mínimos cuadrados de [(segundos, valor)]."""
+    if len(puntos) < 2:
+        return 0.0
+    media_t = sum(t for t, _ in puntos) / len(puntos)
+    media_v = sum(v for _, v in puntos) / len(puntos)
+    varianza = sum((t - media_t) ** 2 for t, _ in puntos)
+    if not varianza:
+        return 0.0
+    return sum((t - media_t) * (v - media_v) for t, v in puntos) / varianza * 3600
+
+
+class Pila:
+    """Procesos de la pila local, lanzados con ``main.py``."""
+
+    def __init__(self):
+        self.procesos = {}
+
+    def lanzar(self, nombre):
+        registro = open(os.path.join(tempfile.gettempdir(), f"benchmark_resistencia_{nombre}.log"), 'ab')
+        # Sin retraso de baja al drenar, para que la pila se detenga enseguida con SIGTERM
+        self.procesos[nombre] = subprocess.Popen(
+            [sys.executable, '-u', 'main.py', COMPONENTES[nombre][0]], cwd=DIRECTORIO, stdout=registro,
+            stderr=subprocess.STDOUT, env=dict(os.environ, CALCULO_RETRASO_BAJA='0'))
+        registro.close()
+
+    def iniciar(self):
+        for nombre in COMPONENTES:
+            self.lanzar(nombre)
+
+    def pid(self, nombre):
+        return self.procesos[nombre].pid
+
+    def inyectar(self, nombre, falla):
+        proceso = self.procesos[nombre]
+        if falla == 'matar':
+            proceso.kill()
+            proceso.wait()
+        else:
+            proceso.send_signal(signal.SIGSTOP)
+
+    def restaurar(self, nombre, falla):
+        if falla == 'matar':
+            self.lanzar(nombre)
+        else:
+            self.procesos[nombre].send_signal(signal.SIGCONT)
+
+    def detener(self):
+        for proceso in self.procesos.values():
+            if proceso.poll() is None:
+                proceso.send_signal(signal.SIGCONT)
+                proceso.terminate()
+        for proceso in self.procesos.values():
+            try:
+                proceso.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+
+
+def precalentar():
+    """Envía una vez cada operación de la mezcla directamente a cada servidor de operación.
+
+    Así los recursos que se crean al primer uso (como el pool de procesos de
+    las operaciones exactas) ya existen al empezar a medir. Si no, el auxiliar
+    los crearía recién con la primera falla y la prueba vería un escalón.
+    """
+    for nombre, (_, puerto, _) in COMPONENTES.items():
+        if nombre == 'calculo':
+            continue
+        for _, operacion, operandos in _mezcla():
+            if operacion == 'trabajo':
+                continue
+            try:
+                with transporte.conectar('localhost', puerto, timeout=30) as s:
+                    enviar_mensaje(s, {'operacion': operacion, 'operandos': operandos()})
+                    recibir_mensaje(s)
+            except (OSError, ValueError):
+                # Cada servidor rechaza las operaciones que no son suyas; solo importa haberlas enviado
+                pass
+
+
+def esperar_pila(timeout=30):
+    """Espera a que el servidor de cálculo vea activos a todos los servidores de operación."""
+    limite = time.time() + timeout
+    while time.time() < limite:
+        respuesta = consultar(PUERTO_CALCULO, 'obtener_metricas')
+        if respuesta and respuesta.get('servidores') and all(respuesta['servidores'].values()):
+            return True
+        time.sleep(0.2)
+    return False
+
+
+class GeneradorCarga:
+    """Clientes que envían la mezcla de operaciones; acumulan latencias hasta que se las retira."""
+
+    def __init__(self, clientes, intervalo):
+        self.clientes = clientes
+        self.intervalo = intervalo
+        self._latencias = []
+        self._errores = 0
+        self._ultimo_error = None
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilos = []
+
+    def iniciar(self):
+        for _ in range(self.clientes):
+            hilo = threading.Thread(target=self._ciclo)
+            hilo.daemon = True
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def detener(self):
+        self._detener.set()
+        for hilo in self._hilos:
+            hilo.join()
+
+    def retirar(self):
+        """Latencias y errores desde la última llamada (así la memoria de la prueba no crece)."""
+        with self._lock:
+            latencias, errores, ultimo_error = self._latencias, self._errores, self._ultimo_error
+            self._latencias, self._errores, self._ultimo_error = [], 0, None
+        return latencias, errores, ultimo_error
+
+    def _ciclo(self):
+        cliente = Cliente('localhost', PUERTO_CALCULO)
+        mezcla = _mezcla()
+        pesos = [peso for peso, _, _ in mezcla]
+        while not self._detener.is_set():
+            _, operacion, operandos = random.choices(mezcla, weights=pesos)[0]
+            inicio = time.time()
+            if operacion == 'trabajo':
+                respuesta = cliente.enviar_trabajo('suma', operandos())
+                if 'trabajo' in respuesta:
+                    respuesta = cliente.esperar_trabajo(respuesta['trabajo'], intervalo=0.05, timeout=30)
+            else:
+                respuesta = cliente.enviar_solicitud(operacion, operandos())
+            duracion = time.time() - inicio
+            with self._lock:
+                self._latencias.append(duracion)
+                if 'error' in respuesta:
+                    self._errores += 1
+                    self._ultimo_error = f"{operacion}: {respuesta['error']}"
+            self._detener.wait(self.intervalo)
+
+
+class InyectorFallas:
+    """Cada ``periodo`` segundos mata o congela un servidor de operación y lo restaura ``duracion`` después."""
+
+    def __init__(self, pila, periodo, duracion):
+        self.pila = pila
+        self.periodo = periodo
+        self.duracion = duracion
+        self.eventos = []  # (hora, componente, falla)
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._ciclo)
+        self._hilo.daemon = True
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+    def _ciclo(self):
+        objetivos = [nombre for nombre, (_, _, fallas) in COMPONENTES.items() if fallas]
+        escenarios = itertools.cycle([(objetivo, falla) for falla in FALLAS for objetivo in objetivos])
+        while not self._detener.wait(self.periodo):
+            objetivo, falla = next(escenarios)
+            self.eventos.append((time.time(), objetivo, falla))
+            self.pila.inyectar(objetivo, falla)
+            # Se restaura aunque la prueba termine durante la falla
+            self._detener.wait(self.duracion)
+            self.pila.restaurar(objetivo, falla)
+
+
+class Muestreador:
+    """Cada ``periodo`` segundos mide los procesos de la pila y la latencia de la ventana."""
+
+    def __init__(self, pila, carga, periodo, archivo=None):
+        self.pila = pila
+        self.carga = carga
+        self.periodo = periodo
+        self.archivo = archivo
+        # (componente, pid) -> [(hora, medicion)]
+        self.procesos = {}
+        self.inicio_proceso = {}
+        # [(hora, {p50, p99, solicitudes, errores})]
+        self.ventanas = []
+        self.ultimo_error = None
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._ciclo)
+        self._hilo.daemon = True
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+        self.muestrear()
+
+    def _ciclo(self):
+        while not self._detener.wait(self.periodo):
+            self.muestrear()
+
+    def muestrear(self):
+        hora = time.time()
+        registro = {'hora': hora, 'procesos': {}}
+        for nombre in COMPONENTES:
+            pid = self.pila.pid(nombre)
+            medicion = medir_proceso(pid)
+            if not medicion['procesos']:
+                continue
+            self.inicio_proceso.setdefault((nombre, pid), hora)
+            self.procesos.setdefault((nombre, pid), []).append((hora, medicion))
+            registro['procesos'][nombre] = dict(medicion, pid=pid)
+        latencias, errores, ultimo_error = self.carga.retirar()
+        if ultimo_error is not None:
+            self.ultimo_error = ultimo_error
+        ventana = percentiles(latencias)
+        ventana.update({'solicitudes': len(latencias), 'errores': errores})
+        self.ventanas.append((hora, ventana))
+        registro['latencia'] = ventana
+        if self.archivo is not None:
+            self.archivo.write(json.dumps(registro) + '\n')
+            self.archivo.flush()
+
+
+def analizar(muestreador, calentamiento):
+    """Pendiente por hora de cada serie (la peor entre los procesos de cada componente) y de la latencia."""
+    componentes = {}
+    for (nombre, pid), muestras in muestreador.procesos.items():
+        desde = muestreador.inicio_proceso[(nombre, pid)] + calentamiento
+        estables = [(hora, medicion) for hora, medicion in muestras if hora >= desde]
+        # Hacen falta varias muestras para que la recta signifique algo
+        if len(estables) < 5:
+            continue
+        actual = componentes.setdefault(nombre, {'muestras': 0, 'inicial': estables[0][1], 'final': estables[-1][1]})
+        actual['muestras'] += len(estables)
+        for serie in SERIES:
+            valor = pendiente([(hora, medicion[serie]) for hora, medicion in estables])
+            actual[serie] = max(actual.get(serie, valor), valor)
+        actual['final'] = estables[-1][1]
+    inicio = muestreador.ventanas[0][0] + calentamiento if muestreador.ventanas else 0
+    ventanas = [(hora, ventana) for hora, ventana in muestreador.ventanas if hora >= inicio and ventana.get('p99')]
+    solicitudes = sum(ventana['solicitudes'] for _, ventana in muestreador.ventanas)
+    errores = sum(ventana['errores'] for _, ventana in muestreador.ventanas)
+    return {
+        'componentes': componentes,
+        'latencia': {
+            'p50_inicial': ventanas[0][1]['p50'] if ventanas else None,
+            'p99_inicial': ventanas[0][1]['p99'] if ventanas else None,
+            'p50_final': ventanas[-1][1]['p50'] if ventanas else None,
+            'p99_final': ventanas[-1][1]['p99'] if ventanas else None,
+            # En milisegundos por hora
+            'pendiente_p50': pendiente([(h, v['p50'] * 1000) for h, v in ventanas]) if len(ventanas) >= 5 else 0.0,
+            'pendiente_p99': pendiente([(h, v['p99'] * 1000) for h, v in ventanas]) if len(ventanas) >= 5 else 0.0,
+        },
+        'solicitudes': solicitudes,
+        'errores': errores,
+        'tasa_errores': errores / solicitudes if solicitudes else 0.0,
+        'ultimo_error': muestreador.ultimo_error,
+    }
+
+
+def evaluar(resultado, umbrales):
+    """Compara las pendientes con los umbrales; devuelve {criterio: (valor, umbral, aprobado)}."""
+    evaluacion = {}
+    for nombre, componente in resultado['componentes'].items():
+        for serie in SERIES:
+            umbral = umbrales.get(serie)
+            if umbral is not None:
+                evaluacion[f"{nombre}/{serie}"] = (componente[serie], umbral, componente[serie] <= umbral)
+    for criterio, valor in (('latencia/p99', resultado['latencia']['pendiente_p99']),
+                            ('tasa_errores', resultado['tasa_errores'])):
+        umbral = umbrales.get(criterio)
+        if umbral is not None:
+            evaluacion[criterio] = (valor, umbral, valor <= umbral)
+    return evaluacion
+
+
+def mostrar_reporte(resultado, evaluacion):
+    ancho = 80
+    print("=" * ancho)
+    print(f"{'PRUEBA DE RESISTENCIA':^{ancho}}")
+    print(f"{'Duración: ' + format(resultado['duracion'] / 3600, '.2f') + ' h | Fallas inyectadas: ' + str(resultado['fallas']):^{ancho}}")
+    print("=" * ancho)
+    print(f"{'Componente':<16}" + ''.join(f"{serie:>16}" for serie in SERIES))
+    for nombre, componente in resultado['componentes'].items():
+        print(f"{nombre:<16}" + ''.join(f"{componente['inicial'][s]:>7.1f}→{componente['final'][s]:<8.1f}" for s in SERIES))
+        print(f"{'  por hora':<16}" + ''.join(f"{componente[s]:>+16.2f}" for s in SERIES))
+    print("-" * ancho)
+    latencia = resultado['latencia']
+    if latencia['p99_inicial'] is not None:
+        print(f"Latencia p50: {latencia['p50_inicial'] * 1000:.2f} → {latencia['p50_final'] * 1000:.2f} ms "
+              f"({latencia['pendiente_p50']:+.2f} ms/h)")
+        print(f"Latencia p99: {latencia['p99_inicial'] * 1000:.2f} → {latencia['p99_final'] * 1000:.2f} ms "
+              f"({latencia['pendiente_p99']:+.2f} ms/h)")
+    print(f"Solicitudes: {resultado['solicitudes']} (errores: {resultado['errores']})")
+    if resultado['ultimo_error']:
+        print(f"Último error: {resultado['ultimo_error']}")
+    print("-" * ancho)
+    for criterio, (valor, umbral, aprobado) in evaluacion.items():
+        estado = "✅ APROBADO" if aprobado else "❌ FALLIDO"
+        print(f"{criterio:<28} {round(valor, 3):>10} <= {umbral:<8} {estado}")
+    print("=" * ancho)
+
+
+def ejecutar(horas, clientes=4, intervalo=0.02, periodo_fallas=120.0, duracion_falla=10.0, muestreo=10.0,
+             calentamiento=120.0, umbrales=None, ruta_muestras=None):
+    """Ejecuta la prueba completa y devuelve (resultado, evaluación)."""
+    if not os.path.isdir('/proc/self/fd'):
+        raise RuntimeError("La prueba de resistencia lee /proc: solo funciona en Linux")
+    archivo = open(ruta_muestras, 'w', encoding='utf-8') if ruta_muestras else None
+    pila = Pila()
+    pila.iniciar()
+    try:
+        if not esperar_pila():
+            raise RuntimeError("La pila no quedó lista a tiempo; revise los registros benchmark_resistencia_*.log")
+        precalentar()
+        inicio = time.time()
+        carga = GeneradorCarga(clientes, intervalo)
+        inyector = InyectorFallas(pila, periodo_fallas, duracion_falla)
+        muestreador = Muestreador(pila, carga, muestreo, archivo)
+        carga.iniciar()
+        muestreador.iniciar()
+        inyector.iniciar()
+        time.sleep(horas * 3600)
+        inyector.detener()
+        carga.detener()
+        muestreador.detener()
+    finally:
+        pila.detener()
+        if archivo is not None:
+            archivo.close()
+
+    resultado = analizar(muestreador, calentamiento)
+    resultado.update({'duracion': time.time() - inicio, 'fallas': len(inyector.eventos)})
+    return resultado, evaluar(resultado, umbrales or {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de resistencia de la pila completa con fallas periódicas')
+    parser.add_argument('--horas', type=float, default=2.0)
+    parser.add_argument('--clientes', type=int, default=4)
+    parser.add_argument('--intervalo', type=float, default=0.02, help='pausa entre solicitudes de cada cliente (s)')
+    parser.add_argument('--periodo-fallas', type=float, default=120.0, help='segundos entre fallas inyectadas')
+    parser.add_argument('--duracion-falla', type=float, default=10.0)
+    parser.add_argument('--muestreo', type=float, default=10.0, help='segundos entre mediciones')
+    parser.add_argument('--calentamiento', type=float, default=120.0,
+                        help='segundos de cada proceso que no entran en las pendientes')
+    parser.add_argument('--max-rss', type=float, default=16.0, help='MB por hora')
+    parser.add_argument('--max-hilos', type=float, default=4.0, help='hilos por hora')
+    parser.add_argument('--max-fds', type=float, default=4.0, help='descriptores por hora')
+    parser.add_argument('--max-procesos', type=float, default=1.0, help='procesos por hora')
+    parser.add_argument('--max-p99', type=float, default=10.0, help='ms por hora')
+    parser.add_argument('--max-tasa-errores', type=float, default=0.01)
+    parser.add_argument('--muestras', metavar='ARCHIVO', help='guarda cada medición en un archivo JSONL')
+    parser.add_argument('--json', metavar='ARCHIVO', help='guarda el resultado en un archivo JSON')
+    args = parser.parse_args()
+
+    umbrales = {
+        'rss_mb': args.max_rss,
+        'hilos': args.max_hilos,
+        'fds': args.max_fds,
+        'procesos': args.max_procesos,
+        'latencia/p99': args.max_p99,
+        'tasa_errores': args.max_tasa_errores,
+    }
+    resultado, evaluacion = ejecutar(args.horas, args.clientes, args.intervalo, args.periodo_fallas,
+                                     args.duracion_falla, args.muestreo, args.calentamiento, umbrales,
+                                     args.muestras)
+    mostrar_reporte(resultado, evaluacion)
+    if args.json:
+        resultado['evaluacion'] = {criterio: aprobado for criterio, (_, _, aprobado) in evaluacion.items()}
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2)
+    sys.exit(0 if all(aprobado for _, _, aprobado in evaluacion.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
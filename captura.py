@@ -0,0 +1,192 @@
+# captura.py
+"""Captura y reproducción de tráfico real del servidor de cálculo.
+
+En modo captura, el servidor de cálculo guarda cada solicitud con su hora de
+llegada, su latencia y su respuesta en un archivo comprimido con gzip. Cada
+registro es una trama del protocolo, así que los operandos viajan como bloques
+binarios. La herramienta de reproducción vuelve a enviar las solicitudes a una
+pila local a la velocidad original, escalada o máxima, y compara las latencias
+y los resultados con los de la captura.
+"""
+import gzip
+import math
+import threading
+import time
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from protocolo import BloqueOperandos, escribir_mensaje, leer_mensaje
+
+PERCENTILES = (50, 90, 99)
+
+
+class CapturaTrafico:
+    """Archivo de captura abierto por el servidor de cálculo."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.registros = 0
+        self._archivo = gzip.open(ruta, 'ab', compresslevel=1)
+        self._lock = threading.Lock()
+
+    def registrar(self, llegada, latencia, solicitud, respuesta):
+        """Guarda una ``Solicitud`` atendida, su latencia en el servidor y la respuesta enviada.
+
+        Cada registro se vacía al disco para sobrevivir a un corte del servidor.
+        Con la captura ya cerrada (reinicio en caliente) el registro se descarta.
+        """
+        registro = {
+            'llegada': llegada,
+            'latencia': latencia,
+            'operacion': solicitud.operacion,
+            'operandos': solicitud.operandos,
+            'respuesta': {clave: respuesta[clave] for clave in ('resultado', 'error') if clave in respuesta}
+        }
+        with self._lock:
+            if self._archivo.closed:
+                return
+            escribir_mensaje(self._archivo, registro)
+            self._archivo.flush()
+            self.registros += 1
+
+    def cerrar(self):
+        with self._lock:
+            if not self._archivo.closed:
+                self._archivo.close()
+
+
+def leer_captura(ruta):
+    """Produce los registros de un archivo de captura en orden de llegada."""
+    with gzip.open(ruta, 'rb') as archivo:
+        while True:
+            try:
+                registro = leer_mensaje(archivo)
+            except (EOFError, zlib.error):
+                # Captura cortada a mitad de un registro (servidor detenido)
+                return
+            if registro is None:
+                return
+            yield registro
+
+
+def percentiles(latencias):
+    """Percentiles, media y máximo de una lista de latencias en segundos."""
+    if not latencias:
+        return {}
+    ordenadas = sorted(latencias)
+    resumen = {f"p{p}": ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100))] for p in PERCENTILES}
+    resumen['media'] = math.fsum(ordenadas) / len(ordenadas)
+    resumen['maximo'] = ordenadas[-1]
+    return resumen
+
+
+def resultados_iguales(esperado, obtenido, tolerancia=1e-9):
+    """Compara dos resultados admitiendo diferencias de redondeo y NaN en la misma posición."""
+    if isinstance(esperado, (array, BloqueOperandos, list, tuple)):
+        if not isinstance(obtenido, (array, BloqueOperandos, list, tuple)) or len(esperado) != len(obtenido):
+            return False
+        return all(resultados_iguales(a, b, tolerancia) for a, b in zip(esperado, obtenido))
+    if isinstance(esperado, dict):
+        if not isinstance(obtenido, dict) or esperado.keys() != obtenido.keys():
+            return False
+        return all(resultados_iguales(esperado[k], obtenido[k], tolerancia) for k in esperado)
+    if isinstance(esperado, float) and isinstance(obtenido, (int, float)):
+        if math.isnan(esperado):
+            return math.isnan(obtenido)
+        return math.isclose(esperado, obtenido, rel_tol=tolerancia, abs_tol=tolerancia)
+    return esperado == obtenido
+
+
+def reproducir(ruta, host='localhost', puerto=5000, velocidad=1.0, concurrencia=32):
+    """Reproduce una captura contra una pila de servidores y compara con lo capturado.
+
+    ``velocidad`` escala los intervalos entre llegadas (2.0 reproduce al doble de
+    velocidad); con ``velocidad=0`` las solicitudes se envían tan rápido como lo
+    permita ``concurrencia``. Los registros se leen del archivo a medida que se
+    envían, así que en memoria solo están los que se están reproduciendo. La
+    latencia reproducida es la que mide el servidor de cálculo, en el mismo punto
+    que la capturada; la del cliente incluiría además la conexión.
+    """
+    from cliente import Cliente
+
+    cliente = Cliente(host, puerto)
+    latencias_captura = []
+    latencias_reproduccion = []
+    diferencias = []
+    distintos = [0]
+    lock = threading.Lock()
+    # Registros leídos y todavía sin respuesta como máximo
+    cupos = threading.BoundedSemaphore(concurrencia * 2)
+
+    def enviar(registro):
+        try:
+            respuesta = cliente.enviar_solicitud(registro['operacion'], registro['operandos'], medir_latencia=True)
+            esperada = registro['respuesta']
+            obtenida = {clave: respuesta[clave] for clave in ('resultado', 'error') if clave in respuesta}
+            with lock:
+                # Las respuestas de error no traen la latencia del servidor: no entran en la comparación
+                if 'latencia_servidor' in respuesta:
+                    latencias_captura.append(registro['latencia'])
+                    latencias_reproduccion.append(respuesta['latencia_servidor'])
+                if not resultados_iguales(esperada, obtenida):
+                    distintos[0] += 1
+                    if len(diferencias) < 10:
+                        diferencias.append({'operacion': registro['operacion'], 'capturado': esperada,
+                                            'reproducido': obtenida})
+        finally:
+            cupos.release()
+
+    solicitudes = 0
+    primera_llegada = ultima_llegada = None
+    inicio_reproduccion = time.time()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        for registro in leer_captura(ruta):
+            if primera_llegada is None:
+                primera_llegada = registro['llegada']
+            ultima_llegada = registro['llegada']
+            if velocidad > 0:
+                espera = inicio_reproduccion + (registro['llegada'] - primera_llegada) / velocidad - time.time()
+                if espera > 0:
+                    time.sleep(espera)
+            cupos.acquire()
+            ejecutor.submit(enviar, registro)
+            solicitudes += 1
+    duracion = time.time() - inicio_reproduccion
+    if not solicitudes:
+        return {"error": f"La captura {ruta} no tiene registros"}
+
+    return {
+        'solicitudes': solicitudes,
+        'duracion_captura': ultima_llegada - primera_llegada,
+        'duracion_reproduccion': duracion,
+        'latencia_captura': percentiles(latencias_captura),
+        'latencia_reproduccion': percentiles(latencias_reproduccion),
+        'resultados_distintos': distintos[0],
+        'diferencias': diferencias
+    }
+
+
+def mostrar_reporte(reporte):
+    """Muestra el reporte de una reproducción."""
+    ancho = 80
+    print("=" * ancho)
+    print(f"{'REPRODUCCIÓN DE TRÁFICO CAPTURADO':^{ancho}}")
+    print("=" * ancho)
+    if 'error' in reporte:
+        print(f"Error: {reporte['error']}")
+        return
+    print(f"Solicitudes: {reporte['solicitudes']}")
+    print(f"Duración capturada: {reporte['duracion_captura']:.3f} s | "
+          f"Duración reproducida: {reporte['duracion_reproduccion']:.3f} s")
+    print("-" * ancho)
+    print(f"{'Latencia (ms)':<16}" + ''.join(f"{clave:>12}" for clave in reporte['latencia_captura']))
+    for nombre, clave in (('Captura', 'latencia_captura'), ('Reproducción', 'latencia_reproduccion')):
+        print(f"{nombre:<16}" + ''.join(f"{valor * 1000:>12.3f}" for valor in reporte[clave].values()))
+    print("Latencias medidas en el servidor de cálculo, sin contar las respuestas de error")
+    print("-" * ancho)
+    print(f"Resultados distintos: {reporte['resultados_distintos']}")
+    for diferencia in reporte['diferencias']:
+        print(f"  {diferencia['operacion']}: capturado {diferencia['capturado']} | "
+              f"reproducido {diferencia['reproducido']}")
+    print("=" * ancho)
@@ -0,0 +1,176 @@
+# ciclo_vida.py
+"""Drenado ordenado y reinicio en caliente de los servidores.
+
+Con SIGTERM el servidor se drena: responde "drenando" a ``verificar_estado``
+para que el servidor de cálculo y el auxiliar lo den de baja, sigue atendiendo
+durante ``RETRASO_BAJA`` segundos (más que el período de los monitores), deja
+de aceptar conexiones y espera hasta ``PERIODO_GRACIA`` segundos a que
+terminen las solicitudes en curso.
+
+Con SIGUSR2 el servidor se reinicia en caliente: lanza un proceso nuevo con el
+mismo comando que hereda los sockets de escucha (``pass_fds``), espera a que
+avise que está listo y recién entonces deja de aceptar y se drena. Como ambos
+procesos comparten los sockets, las conexiones pendientes las atiende el nuevo
+y no hay ventana sin servicio.
+"""
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+
+import transporte
+
+# Espera máxima a que terminen las solicitudes en curso al drenar
+PERIODO_GRACIA = float(os.environ.get('CALCULO_PERIODO_GRACIA', 30))
+# Tiempo que se sigue atendiendo tras anunciar el drenado, para que los monitores den de baja al servidor
+RETRASO_BAJA = float(os.environ.get('CALCULO_RETRASO_BAJA', 6))
+# Espera máxima a que el proceso nuevo de un reinicio en caliente esté listo
+ESPERA_REINICIO = 30.0
+
+# Variables de entorno con las que el proceso anterior entrega sus sockets al nuevo
+VARIABLE_SOCKETS = 'CALCULO_SOCKETS_HEREDADOS'
+VARIABLE_AVISO = 'CALCULO_AVISO_LISTO'
+
+
+class CicloVida:
+    """Estado de arranque, drenado y reinicio de un servidor."""
+
+    def __init__(self, nombre, antes_de_reiniciar=None):
+        self.nombre = nombre
+        # Se llama antes de lanzar el proceso nuevo (por ejemplo, para cerrar archivos que este reabrirá)
+        self.antes_de_reiniciar = antes_de_reiniciar
+        self.drenando = False
+        self.reiniciando = False
+        # Indica si los sockets de escucha se heredaron de un proceso anterior
+        self.heredado = False
+        # Al activarse, el ciclo de aceptación termina
+        self.detener = threading.Event()
+        self._en_curso = 0
+        self._condicion = threading.Condition()
+        self._sockets = []
+
+    @property
+    def estado(self):
+        """Estado que el servidor anuncia en ``verificar_estado``.
+
+        En un reinicio en caliente se sigue anunciando "activo": el proceso nuevo ya atiende.
+        """
+        return "drenando" if self.drenando else "activo"
+
+    def instalar_senales(self):
+        """SIGTERM drena el servidor; SIGUSR2 (si existe) lo reinicia en caliente.
+
+        Solo el hilo principal puede instalar manejadores: un servidor iniciado en otro hilo
+        (por ejemplo, en los micro-benchmarks) conserva los manejadores del proceso.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(signal.SIGTERM, lambda *_: self.drenar())
+        if hasattr(signal, 'SIGUSR2'):
+            signal.signal(signal.SIGUSR2, lambda *_: self.reiniciar())
+
+    def sockets_escucha(self, host, puerto, avisar=True):
+        """Crea los sockets de escucha o hereda los del proceso anterior.
+
+        Con ``avisar=False`` el servidor llama a ``avisar_listo`` cuando termine de prepararse.
+        """
+        self.instalar_senales()
+        heredados = os.environ.pop(VARIABLE_SOCKETS, None)
+        if heredados:
+            self._sockets = transporte.heredar_sockets_escucha(int(fd) for fd in heredados.split(','))
+            self.heredado = True
+            print(f"{self.nombre}: sockets de escucha heredados del proceso anterior")
+        else:
+            self._sockets = transporte.crear_sockets_escucha(host, puerto)
+        if avisar:
+            self.avisar_listo()
+        return self._sockets
+
+    def avisar_listo(self):
+        """Avisa al proceso anterior que este ya puede atender (solo en un reinicio en caliente)."""
+        aviso = os.environ.pop(VARIABLE_AVISO, None)
+        if aviso:
+            os.write(int(aviso), b'1')
+            os.close(int(aviso))
+
+    def aceptar(self, sockets):
+        """Ciclo de aceptación que termina al drenar; cuenta cada conexión como solicitud en curso.
+
+        Cada conexión producida debe atenderse con ``atender``, que la descuenta al terminar.
+        """
+        for cliente_socket, direccion in transporte.aceptar_conexiones(sockets, self.detener):
+            with self._condicion:
+                self._en_curso += 1
+            yield cliente_socket, direccion
+
+    def atender(self, manejar, *args):
+        """Ejecuta el manejador de una conexión aceptada y la descuenta de las solicitudes en curso."""
+        try:
+            manejar(*args)
+        finally:
+            with self._condicion:
+                self._en_curso -= 1
+                self._condicion.notify_all()
+
+    def drenar(self):
+        """Anuncia el drenado y deja de aceptar conexiones después de ``RETRASO_BAJA`` segundos."""
+        if self.drenando:
+            return
+        self.drenando = True
+        print(f"{self.nombre}: drenando, se deja de aceptar conexiones en {RETRASO_BAJA:.0f} s")
+        temporizador = threading.Timer(RETRASO_BAJA, self.detener.set)
+        temporizador.daemon = True
+        temporizador.start()
+
+    def reiniciar(self):
+        """Lanza el reinicio en caliente en un hilo aparte (no bloquea el manejador de la señal)."""
+        if self.drenando or self.reiniciando:
+            return
+        self.reiniciando = True
+        hilo = threading.Thread(target=self._reiniciar)
+        hilo.daemon = True
+        hilo.start()
+
+    def _reiniciar(self):
+        lectura, escritura = os.pipe()
+        descriptores = [s.fileno() for s in self._sockets]
+        entorno = dict(os.environ)
+        entorno[VARIABLE_SOCKETS] = ','.join(map(str, descriptores))
+        entorno[VARIABLE_AVISO] = str(escritura)
+        if self.antes_de_reiniciar is not None:
+            self.antes_de_reiniciar()
+        try:
+            proceso = subprocess.Popen([sys.executable] + sys.argv, env=entorno,
+                                       pass_fds=descriptores + [escritura])
+        except OSError as e:
+            print(f"{self.nombre}: no se pudo lanzar el proceso nuevo: {str(e)}")
+            os.close(lectura)
+            os.close(escritura)
+            self.reiniciando = False
+            return
+        os.close(escritura)
+        try:
+            # El aviso llega cuando el proceso nuevo ya escucha; si termina antes, la lectura da EOF
+            listo = select.select([lectura], [], [], ESPERA_REINICIO)[0] and os.read(lectura, 1) == b'1'
+        finally:
+            os.close(lectura)
+        if not listo:
+            print(f"{self.nombre}: el proceso nuevo (pid {proceso.pid}) no arrancó, se sigue atendiendo")
+            proceso.kill()
+            self.reiniciando = False
+            return
+        print(f"{self.nombre}: proceso nuevo listo (pid {proceso.pid}), drenando este proceso")
+        # El proceso nuevo ya atiende en los mismos sockets: no hace falta esperar a los monitores
+        self.detener.set()
+
+    def terminar(self, sockets):
+        """Cierra los sockets de escucha y espera a las solicitudes en curso hasta ``PERIODO_GRACIA``."""
+        transporte.cerrar_sockets_escucha(sockets, eliminar_socket_unix=not self.reiniciando)
+        if not (self.drenando or self.reiniciando):
+            return
+        with self._condicion:
+            if not self._condicion.wait_for(lambda: self._en_curso == 0, PERIODO_GRACIA):
+                print(f"{self.nombre}: {self._en_curso} solicitudes sin terminar al vencer el período de gracia")
+        print(f"{self.nombre}: drenado completo")
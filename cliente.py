@@ -1,35 +1,249 @@
-import socket
-import json
+import os
 import time
+import uuid
+
+import flujo
+import plazos
+import trazas
+import transporte
+from coordinadores import AnilloConsistente, clave_solicitud, coordinadores_configurados
+from protocolo import a_arreglo, enviar_mensaje, recibir_mensaje
+
+# Espera máxima para conectar con un coordinador antes de pasar al siguiente
+TIMEOUT_CONEXION = float(os.environ.get('CALCULO_TIMEOUT_CONEXION', 0.5))
+# Segundos que un coordinador que falló queda al final del orden de failover
+PENALIZACION_CAIDA = 5.0
+# Espera de la respuesta (inicial, mínimo y máximo, en segundos): entre el mínimo y el máximo se adapta a
+# las latencias observadas de cada coordinador y operación (ver plazos.py). Si vence, el coordinador se
+# da por caído y se pasa al siguiente
+PLAZOS_RESPUESTA = (float(os.environ.get('CALCULO_TIMEOUT_RESPUESTA', 30)), 1.0,
+                    float(os.environ.get('CALCULO_TIMEOUT_RESPUESTA_MAXIMO', 120)))
 
 class Cliente:
-    def __init__(self, host='localhost', puerto=5000):
+    def __init__(self, host='localhost', puerto=5000, coordinadores=None):
+        """Cliente de uno o varios servidores de cálculo.
+
+        ``coordinadores`` es una lista de (host, puerto); si no se indica se usa
+        ``CALCULO_COORDINADORES`` y, si tampoco está definida, solo ``host:puerto``.
+        """
         self.host = host
         self.puerto = puerto
+        self.coordinadores = coordinadores or coordinadores_configurados() or [(host, puerto)]
+        self.anillo = AnilloConsistente(self.coordinadores)
+        # Coordinador -> hasta cuándo se lo intenta al final por haber fallado
+        self.caidos = {}
+        self.plazos = plazos.PlazosAdaptativos(*PLAZOS_RESPUESTA)
+
+    def orden_coordinadores(self, clave=None):
+        """Coordinadores en el orden en que se intentan: el dueño de la clave en el anillo y sus
+        sucesores (o el orden configurado sin clave), con los que fallaron hace poco al final."""
+        orden = self.anillo.nodos_para(clave) if clave is not None else list(self.coordinadores)
+        ahora = time.monotonic()
+        return sorted(orden, key=lambda nodo: self.caidos.get(nodo, 0) > ahora)
+
+    def intercambiar(self, mensaje, clave=None):
+        """Envía un mensaje al primer coordinador que responda y devuelve su respuesta.
+
+        Si un coordinador no acepta la conexión o la corta antes de responder, se
+        pasa enseguida al siguiente. Si ninguno responde se relanza el último error.
+        """
+        return self.intercambiar_con_nodo(mensaje, clave)[0]
+
+    def plazo_respuesta(self, nodo, mensaje):
+        """Clave y tiempo de espera de la respuesta de ``nodo`` a ``mensaje``, según sus latencias anteriores."""
+        operacion = mensaje.get('operacion')
+        clave = self.plazos.clave(f"{nodo[0]}:{nodo[1]}", operacion, mensaje.get('operandos'))
+        return clave, self.plazos.plazo(clave, operacion)
+
+    def intercambiar_con_nodo(self, mensaje, clave=None):
+        """Como ``intercambiar``, pero devuelve también el coordinador (host, puerto) que respondió.
+
+        Un coordinador que no responde dentro de su plazo (ver ``PLAZOS_RESPUESTA``)
+        también se da por caído, así que uno congelado no deja al cliente esperando.
+        """
+        ultimo_error = None
+        for nodo in self.orden_coordinadores(clave):
+            clave_plazo, plazo = self.plazo_respuesta(nodo, mensaje)
+            inicio = time.perf_counter()
+            try:
+                with transporte.conectar(*nodo, timeout=TIMEOUT_CONEXION) as s:
+                    s.settimeout(plazo)
+                    enviar_mensaje(s, mensaje)
+                    respuesta = recibir_mensaje(s)
+            except OSError as e:
+                if isinstance(e, TimeoutError):
+                    self.plazos.vencido(clave_plazo, plazo)
+                self.caidos[nodo] = time.monotonic() + PENALIZACION_CAIDA
+                ultimo_error = e
+                continue
+            self.plazos.observar(clave_plazo, time.perf_counter() - inicio)
+            self.caidos.pop(nodo, None)
+            return respuesta, nodo
+        raise ultimo_error
 
-    def enviar_solicitud(self, operacion, operandos):
-        """Envía una solicitud de cálculo al servidor principal."""
+    def enviar_solicitud(self, operacion, operandos, incluir_traza=False, medir_latencia=False):
+        """Envía una solicitud de cálculo al servidor principal.
+
+        Con ``incluir_traza=True`` la solicitud se traza siempre y la respuesta
+        incluye los tramos medidos en cada componente. Con ``medir_latencia=True``
+        la respuesta trae en ``latencia_servidor`` la latencia medida en el
+        servidor de cálculo, la misma que guardan sus capturas.
+        """
+        traza = trazas.Traza(trazas.nuevo_contexto(incluir_traza), "cliente")
+        inicio = time.time()
         try:
-            # Crear socket
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                # Conectar al servidor
-                s.connect((self.host, self.puerto))
-                
-                # Preparar datos
-                solicitud = {
-                    'operacion': operacion,
-                    'operandos': operandos,
-                    'timestamp': time.time()
-                }
-                
-                # Enviar datos
-                s.sendall(json.dumps(solicitud).encode('utf-8'))
-                
-                # Esperar respuesta
-                respuesta = s.recv(4096).decode('utf-8')
-                return json.loads(respuesta)
+            # Preparar datos
+            solicitud = {
+                'operacion': operacion,
+                'operandos': a_arreglo(operandos),
+                'timestamp': time.time(),
+                'traza': traza.contexto,
+                # La misma clave viaja en los reintentos a otros coordinadores
+                'clave': uuid.uuid4().hex
+            }
+            if medir_latencia:
+                solicitud['medir_latencia'] = True
+            
+            # Enviar al coordinador dueño de la solicitud (o a sus sucesores si falla) y esperar respuesta
+            respuesta = self.intercambiar(solicitud, clave_solicitud(operacion, solicitud['operandos']))
+            traza.registrar('solicitud', inicio, time.time(), operacion=operacion)
+            if 'traza' in respuesta:
+                respuesta['traza']['tramos'].extend(traza.tramos)
+            return respuesta
                 
         except ConnectionRefusedError:
             return {"error": "No se pudo conectar con el servidor de cálculo. Verifique que esté en ejecución."}
         except Exception as e:
-            return {"error": f"Error de comunicación: {str(e)}"}
\ No newline at end of file
+            return {"error": f"Error de comunicación: {str(e)}"}
+        finally:
+            traza.finalizar()
+
+    def transmitir_solicitud(self, operacion, operandos, tamano_fragmento=None):
+        """Envía una operación vectorial y recorre su resultado por fragmentos a medida que llegan.
+
+        Genera un diccionario por fragmento con ``resultado`` y ``errores``
+        (arreglos), ``inicio`` (posición de su primer elemento) y
+        ``cantidad_errores``; solo el fragmento actual está en memoria.
+        ``tamano_fragmento`` es la cantidad de elementos por fragmento (por
+        defecto, ``CALCULO_TAMANO_FRAGMENTO`` del servidor). Si el cálculo
+        falla se lanza ``flujo.ErrorTransmision``. El mensaje final con los
+        totales queda como valor de retorno del generador. Cada fragmento se
+        espera como mucho el plazo de respuesta de la operación entera; si
+        vence, el coordinador se da por caído y se lanza ``TimeoutError``.
+        """
+        solicitud = {
+            'operacion': operacion,
+            'operandos': a_arreglo(operandos),
+            'timestamp': time.time(),
+            'traza': trazas.nuevo_contexto(),
+            'transmitir': tamano_fragmento or True
+        }
+        ultimo_error = None
+        for nodo in self.orden_coordinadores(clave_solicitud(operacion, solicitud['operandos'])):
+            try:
+                s = transporte.conectar(*nodo, timeout=TIMEOUT_CONEXION)
+            except OSError as e:
+                self.caidos[nodo] = time.monotonic() + PENALIZACION_CAIDA
+                ultimo_error = e
+                continue
+            with s:
+                # Sin observar la duración: la de un flujo no es comparable con la de una respuesta entera
+                s.settimeout(self.plazo_respuesta(nodo, solicitud)[1])
+                try:
+                    enviar_mensaje(s, solicitud)
+                    mensaje = recibir_mensaje(s)
+                except OSError as e:
+                    # Se pasa al siguiente coordinador solo si este no llegó a enviar nada: los
+                    # fragmentos ya entregados no se pueden deshacer
+                    self.caidos[nodo] = time.monotonic() + PENALIZACION_CAIDA
+                    ultimo_error = e
+                    continue
+                self.caidos.pop(nodo, None)
+                try:
+                    return (yield from flujo.recibir(s, mensaje))
+                except TimeoutError:
+                    self.caidos[nodo] = time.monotonic() + PENALIZACION_CAIDA
+                    raise
+        raise ultimo_error
+
+    def obtener_metricas(self, coordinador=None):
+        """Consulta las métricas de un servidor de cálculo (el primero que responda, si no se indica)."""
+        try:
+            if coordinador is not None:
+                with transporte.conectar(*coordinador) as s:
+                    enviar_mensaje(s, {'operacion': 'obtener_metricas'})
+                    return recibir_mensaje(s)
+            return self.intercambiar({'operacion': 'obtener_metricas'})
+        except ConnectionRefusedError:
+            return {"error": "No se pudo conectar con el servidor de cálculo. Verifique que esté en ejecución."}
+        except Exception as e:
+            return {"error": f"Error de comunicación: {str(e)}"}
+
+    def enviar_trabajo(self, operacion, operandos):
+        """Envía un cálculo como trabajo asíncrono y devuelve enseguida su estado.
+
+        La respuesta trae en ``trabajo`` un identificador de la forma
+        ``host:puerto/id``: los trabajos viven en el coordinador que los aceptó,
+        así que las consultas siguientes van directo a él.
+        """
+        solicitud = {
+            'operacion': operacion,
+            'operandos': a_arreglo(operandos),
+            'timestamp': time.time(),
+            'traza': trazas.nuevo_contexto(),
+            'clave': uuid.uuid4().hex
+        }
+        try:
+            respuesta, nodo = self.intercambiar_con_nodo({'operacion': 'enviar_trabajo', 'solicitud': solicitud},
+                                                         clave_solicitud(operacion, solicitud['operandos']))
+        except ConnectionRefusedError:
+            return {"error": "No se pudo conectar con el servidor de cálculo. Verifique que esté en ejecución."}
+        except Exception as e:
+            return {"error": f"Error de comunicación: {str(e)}"}
+        if 'trabajo' in respuesta:
+            respuesta['trabajo'] = f"{nodo[0]}:{nodo[1]}/{respuesta['trabajo']}"
+        return respuesta
+
+    def consultar_trabajo(self, operacion, trabajo):
+        """Envía una operación de control de trabajos al coordinador dueño del trabajo."""
+        try:
+            direccion, trabajo_id = trabajo.split('/', 1)
+            host, puerto = direccion.rsplit(':', 1)
+            with transporte.conectar(host, int(puerto)) as s:
+                enviar_mensaje(s, {'operacion': operacion, 'trabajo': trabajo_id})
+                respuesta = recibir_mensaje(s)
+        except ValueError:
+            return {"error": f"Identificador de trabajo inválido: {trabajo}"}
+        except ConnectionRefusedError:
+            return {"error": "No se pudo conectar con el servidor de cálculo del trabajo. Verifique que esté en ejecución."}
+        except Exception as e:
+            return {"error": f"Error de comunicación: {str(e)}"}
+        if 'trabajo' in respuesta:
+            respuesta['trabajo'] = trabajo
+        return respuesta
+
+    def estado_trabajo(self, trabajo):
+        """Estado de un trabajo: pendiente, en_curso, completado, error o cancelado."""
+        return self.consultar_trabajo('estado_trabajo', trabajo)
+
+    def resultado_trabajo(self, trabajo):
+        """Estado de un trabajo y, si ya terminó, su resultado (o su error)."""
+        return self.consultar_trabajo('resultado_trabajo', trabajo)
+
+    def cancelar_trabajo(self, trabajo):
+        """Cancela un trabajo pendiente o en curso y devuelve su estado."""
+        return self.consultar_trabajo('cancelar_trabajo', trabajo)
+
+    def esperar_trabajo(self, trabajo, intervalo=0.2, timeout=None):
+        """Consulta un trabajo cada ``intervalo`` segundos hasta que termine y devuelve su resultado.
+
+        Si pasa ``timeout`` sin que termine se devuelve el último estado consultado.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            respuesta = self.resultado_trabajo(trabajo)
+            if respuesta.get('estado') not in ('pendiente', 'en_curso'):
+                return respuesta
+            if limite is not None and time.monotonic() >= limite:
+                return respuesta
+            time.sleep(intervalo)
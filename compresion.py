@@ -0,0 +1,173 @@
+# compresion.py
+"""Compresión negociada de los mensajes grandes.
+
+Cada trama anuncia en su cabecera los códecs que su emisor sabe descomprimir.
+zlib está siempre disponible y es la base común de todos los componentes; si
+``lz4`` está instalado y el otro extremo lo anunció, se usa ese códec, que es
+más rápido. Solo se comprimen los mensajes que superan ``UMBRAL_COMPRESION``,
+así que las llamadas pequeñas no pagan ningún costo adicional.
+"""
+import os
+import threading
+import time
+import weakref
+import zlib
+
+import metricas
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # lz4 es opcional
+    lz4_frame = None
+
+CODEC_NINGUNO = 0
+CODEC_ZLIB = 1
+CODEC_LZ4 = 2
+NOMBRES_CODEC = {CODEC_NINGUNO: 'ninguno', CODEC_ZLIB: 'zlib', CODEC_LZ4: 'lz4'}
+
+# Tamaño mínimo (en bytes) de un mensaje para intentar comprimirlo
+UMBRAL_COMPRESION = int(os.environ.get('CALCULO_UMBRAL_COMPRESION', 32 * 1024))
+NIVEL_ZLIB = 1
+# Si la compresión no reduce el mensaje al menos este factor, se envía sin comprimir
+RATIO_MAXIMO = 0.9
+MAX_PARES_CONOCIDOS = 256
+
+def _descomprimir_zlib(datos, maximo):
+    descompresor = zlib.decompressobj()
+    resultado = descompresor.decompress(datos, maximo)
+    if not descompresor.eof:
+        raise ValueError(f"El cuerpo comprimido descomprime a más de {maximo} bytes")
+    return resultado
+
+
+def _descomprimir_lz4(datos, maximo):
+    descompresor = lz4_frame.LZ4FrameDecompressor()
+    resultado = descompresor.decompress(datos, max_length=maximo)
+    if not descompresor.eof:
+        raise ValueError(f"El cuerpo comprimido descomprime a más de {maximo} bytes")
+    return resultado
+
+
+# Códec -> (comprimir(datos), descomprimir(datos, maximo)); la descompresión se corta en ``maximo`` bytes
+_CODECS = {CODEC_ZLIB: (lambda datos: zlib.compress(datos, NIVEL_ZLIB), _descomprimir_zlib)}
+if lz4_frame is not None:
+    _CODECS[CODEC_LZ4] = (lz4_frame.compress, _descomprimir_lz4)
+
+# Orden de preferencia al elegir un códec común
+PREFERENCIA = (CODEC_LZ4, CODEC_ZLIB)
+CODECS_ACEPTADOS = sum(1 << codec for codec in _CODECS)
+# Lo que se supone de un par del que todavía no se recibió ninguna trama
+CODECS_BASE = 1 << CODEC_ZLIB
+
+
+class EstadisticasCompresion:
+    """Acumula bytes y tiempo de CPU de compresión para ajustar el umbral.
+
+    Los contadores son por hilo (``metricas.Contadores``): registrar cada mensaje no toma locks.
+    """
+
+    def __init__(self):
+        self._contadores = metricas.Contadores(
+            'mensajes_comprimidos', 'mensajes_descartados', 'mensajes_descomprimidos',
+            'bytes_originales', 'bytes_comprimidos', 'cpu_compresion', 'cpu_descompresion')
+
+    def registrar_compresion(self, original, comprimido, cpu, aprovechada):
+        sumar = self._contadores.sumar
+        if aprovechada:
+            sumar('mensajes_comprimidos')
+            sumar('bytes_originales', original)
+            sumar('bytes_comprimidos', comprimido)
+        else:
+            sumar('mensajes_descartados')
+        sumar('cpu_compresion', cpu)
+
+    def registrar_descompresion(self, cpu):
+        self._contadores.sumar('mensajes_descomprimidos')
+        self._contadores.sumar('cpu_descompresion', cpu)
+
+    def resumen(self):
+        valores = self._contadores.valores()
+        return {
+            'umbral_bytes': UMBRAL_COMPRESION,
+            'codecs_disponibles': [NOMBRES_CODEC[c] for c in sorted(_CODECS)],
+            'mensajes_comprimidos': valores['mensajes_comprimidos'],
+            'mensajes_descartados': valores['mensajes_descartados'],
+            'mensajes_descomprimidos': valores['mensajes_descomprimidos'],
+            'bytes_originales': valores['bytes_originales'],
+            'bytes_comprimidos': valores['bytes_comprimidos'],
+            'ratio': (valores['bytes_comprimidos'] / valores['bytes_originales']) if valores['bytes_originales'] else None,
+            'cpu_compresion_s': valores['cpu_compresion'],
+            'cpu_descompresion_s': valores['cpu_descompresion'],
+        }
+
+
+estadisticas = EstadisticasCompresion()
+metricas.registrar_fuente('compresion', estadisticas.resumen)
+
+# Códecs anunciados por el otro extremo de cada conexión y, para conexiones
+# nuevas, por cada dirección con la que ya se habló
+_codecs_conexion = weakref.WeakKeyDictionary()
+_codecs_pares = {}
+_lock_pares = threading.Lock()
+
+
+def _direccion_par(sock):
+    try:
+        return sock.getpeername()
+    except OSError:
+        return None
+
+
+def registrar_codecs_par(sock, aceptados):
+    """Recuerda los códecs que anunció el otro extremo en la trama recibida."""
+    _codecs_conexion[sock] = aceptados
+    direccion = _direccion_par(sock)
+    if direccion is None:
+        return
+    with _lock_pares:
+        if direccion not in _codecs_pares and len(_codecs_pares) >= MAX_PARES_CONOCIDOS:
+            _codecs_pares.pop(next(iter(_codecs_pares)))
+        _codecs_pares[direccion] = aceptados
+
+
+def elegir_codec(sock):
+    """Elige el códec preferido que aceptan ambos extremos de la conexión."""
+    aceptados = _codecs_conexion.get(sock)
+    if aceptados is None:
+        with _lock_pares:
+            aceptados = _codecs_pares.get(_direccion_par(sock), CODECS_BASE)
+    for codec in PREFERENCIA:
+        if codec in _CODECS and aceptados & (1 << codec):
+            return codec
+    return CODEC_NINGUNO
+
+
+def comprimir(sock, fragmentos, longitud):
+    """Comprime el cuerpo del mensaje si supera el umbral y vale la pena.
+
+    Devuelve ``(codec, datos)``; con ``CODEC_NINGUNO`` los datos son None y el
+    mensaje se envía tal cual.
+    """
+    if longitud < UMBRAL_COMPRESION:
+        return CODEC_NINGUNO, None
+    codec = elegir_codec(sock)
+    if codec == CODEC_NINGUNO:
+        return CODEC_NINGUNO, None
+    inicio = time.thread_time()
+    comprimido = _CODECS[codec][0](b''.join(fragmentos))
+    aprovechada = len(comprimido) <= longitud * RATIO_MAXIMO
+    estadisticas.registrar_compresion(longitud, len(comprimido), time.thread_time() - inicio, aprovechada)
+    if not aprovechada:
+        return CODEC_NINGUNO, None
+    return codec, comprimido
+
+
+def descomprimir(codec, datos, maximo):
+    """Descomprime el cuerpo de una trama sin producir más de ``maximo`` bytes (lo que declara su cabecera)."""
+    if codec not in _CODECS:
+        raise ValueError(f"Códec de compresión no soportado: {codec}")
+    inicio = time.thread_time()
+    # Con 0, zlib no pone límite: una trama que declara cuerpo vacío igual queda acotada
+    resultado = _CODECS[codec][1](datos, max(maximo, 1))
+    estadisticas.registrar_descompresion(time.thread_time() - inicio)
+    return resultado
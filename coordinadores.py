@@ -0,0 +1,80 @@
+# coordinadores.py
+"""Varios servidores de cálculo atendiendo a la vez (activo-activo).
+
+Cada servidor de cálculo monitorea por su cuenta a los servidores de operación,
+así que todos tienen la tabla de enrutamiento completa. La lista de
+coordinadores se configura con ``CALCULO_COORDINADORES``
+(``host:puerto,host:puerto,...``). El cliente reparte las solicitudes entre
+ellos con un anillo de hash consistente: una misma solicitud va siempre al
+mismo coordinador mientras esté activo, y al agregar o quitar un coordinador
+solo se reasignan las claves que le correspondían. El servidor auxiliar
+notifica los cambios de estado a todos los coordinadores.
+"""
+import bisect
+import hashlib
+import os
+import zlib
+from array import array
+
+from protocolo import BloqueOperandos
+
+# Puntos de cada coordinador en el anillo: más puntos reparten la carga más parejo
+REPLICAS = 100
+
+
+def coordinadores_configurados():
+    """Lista de (host, puerto) de ``CALCULO_COORDINADORES``, o None si no está definida."""
+    valor = os.environ.get('CALCULO_COORDINADORES', '').strip()
+    if not valor:
+        return None
+    coordinadores = []
+    for direccion in valor.split(','):
+        host, _, puerto = direccion.strip().rpartition(':')
+        coordinadores.append((host or 'localhost', int(puerto)))
+    return coordinadores
+
+
+def _hash(texto):
+    return int.from_bytes(hashlib.blake2b(texto.encode(), digest_size=8).digest(), 'big')
+
+
+def clave_solicitud(operacion, operandos):
+    """Clave de afinidad de una solicitud: la operación y un resumen de sus operandos.
+
+    Los arreglos se resumen sobre sus bytes, sin copiarlos.
+    """
+    if isinstance(operandos, array):
+        resumen = zlib.crc32(memoryview(operandos).cast('B'))
+    elif isinstance(operandos, BloqueOperandos):
+        resumen = zlib.crc32(operandos.datos)
+    else:
+        resumen = zlib.crc32(repr(operandos).encode())
+    return f"{operacion}:{resumen:08x}"
+
+
+class AnilloConsistente:
+    """Anillo de hash consistente sobre una lista de coordinadores (host, puerto)."""
+
+    def __init__(self, nodos, replicas=REPLICAS):
+        self.nodos = list(nodos)
+        puntos = sorted((_hash(f"{host}:{puerto}#{i}"), (host, puerto))
+                        for host, puerto in self.nodos for i in range(replicas))
+        self._posiciones = [posicion for posicion, _ in puntos]
+        self._propietarios = [nodo for _, nodo in puntos]
+
+    def nodos_para(self, clave):
+        """Todos los coordinadores, sin repetir, en el orden del anillo a partir de la clave.
+
+        El primero es el dueño de la clave; los siguientes son los sucesores para el failover.
+        """
+        if len(self.nodos) == 1:
+            return list(self.nodos)
+        inicio = bisect.bisect(self._posiciones, _hash(clave))
+        orden = []
+        for i in range(len(self._propietarios)):
+            nodo = self._propietarios[(inicio + i) % len(self._propietarios)]
+            if nodo not in orden:
+                orden.append(nodo)
+                if len(orden) == len(self.nodos):
+                    break
+        return orden
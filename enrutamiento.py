@@ -0,0 +1,70 @@
+# enrutamiento.py
+"""Tabla de enrutamiento del servidor de cálculo como instantánea inmutable.
+
+La tabla reúne los servidores configurados, cuáles están activos, las
+operaciones que anuncia cada uno y, derivadas de eso, las rutas y los destinos.
+Nunca se modifica: el monitoreo, las notificaciones del auxiliar y los fallos
+detectados al enviar construyen una tabla nueva con ``con_estado`` y el
+servidor de cálculo la publica reemplazando la referencia de una sola vez. Los
+hilos de solicitud leen la referencia una vez y trabajan con esa instantánea
+sin tomar locks, así que nunca ven un estado a medio actualizar.
+"""
+from types import MappingProxyType
+
+from mensajes import Destino
+
+
+class TablaEnrutamiento:
+    """Instantánea del estado y las rutas de los servidores de operación."""
+
+    __slots__ = ('servidores', 'tipos', 'activos', 'capacidades', 'rutas', 'destinos')
+
+    def __init__(self, servidores, activos=(), capacidades=None):
+        # Servidores configurados, como destinos sin desborde, en el orden de la configuración
+        self.servidores = tuple(s if isinstance(s, Destino) else Destino(s['host'], s['puerto'], s['tipo'])
+                                for s in servidores)
+        self.tipos = tuple(s.tipo for s in self.servidores)
+        self.activos = frozenset(activos)
+        # Operaciones anunciadas por cada servidor en su respuesta a verificar_estado
+        self.capacidades = MappingProxyType({tipo: tuple((capacidades or {}).get(tipo, ())) for tipo in self.tipos})
+
+        # Operación -> tipos de servidor que la ejecutan, con el auxiliar siempre al final
+        rutas = {}
+        for tipo in self.tipos:
+            if tipo != 'auxiliar':
+                for operacion in self.capacidades[tipo]:
+                    rutas.setdefault(operacion, []).append(tipo)
+        for operacion in self.capacidades.get('auxiliar', ()):
+            rutas.setdefault(operacion, []).append('auxiliar')
+        self.rutas = MappingProxyType({operacion: tuple(tipos) for operacion, tipos in rutas.items()})
+
+        # Destinos compartidos por (tipo de servidor, desborde)
+        destinos = {}
+        for servidor in self.servidores:
+            destinos[(servidor.tipo, False)] = servidor
+            destinos[(servidor.tipo, True)] = Destino(servidor.host, servidor.puerto, servidor.tipo, True)
+        self.destinos = MappingProxyType(destinos)
+
+    def activo(self, tipo):
+        return tipo in self.activos
+
+    def candidatos(self, operacion):
+        """Tipos de servidor que ejecutan la operación, el auxiliar al final."""
+        return self.rutas.get(operacion, ())
+
+    def destino(self, tipo, desborde=False):
+        """Destino de un tipo de servidor, o None si no está configurado."""
+        return self.destinos.get((tipo, desborde))
+
+    def con_estado(self, tipo, activo, operaciones=None):
+        """Tabla con el estado de un servidor cambiado (y sus operaciones, si se indican).
+
+        Si nada cambia devuelve la misma tabla, para no reconstruir las rutas en cada verificación.
+        """
+        operaciones = tuple(operaciones) if operaciones is not None else self.capacidades.get(tipo, ())
+        if self.activo(tipo) == activo and self.capacidades.get(tipo, ()) == operaciones:
+            return self
+        activos = self.activos | {tipo} if activo else self.activos - {tipo}
+        capacidades = dict(self.capacidades)
+        capacidades[tipo] = operaciones
+        return TablaEnrutamiento(self.servidores, activos, capacidades)
@@ -0,0 +1,119 @@
+# exacto.py
+"""Aritmética exacta con enteros grandes y racionales.
+
+Los operandos de las operaciones exactas pueden ser enteros, flotantes (se toma
+su valor binario exacto) o textos con un entero o un racional (``"-7/3"``,
+``"0.1"``). Los resultados se devuelven como texto (``"123"``, ``"-7/3"``) para
+que viajen en JSON sin perder dígitos.
+
+- ``potencia``: exponenciación binaria (por cuadrados, la que implementa
+  ``pow`` de Python) con exponente entero y módulo opcional; un exponente
+  negativo da un racional.
+- ``producto``: producto en árbol balanceado. Multiplicar factores de tamaño
+  parecido aprovecha la multiplicación de Karatsuba de los enteros de Python,
+  mientras que el producto lineal multiplica un acumulador cada vez más grande
+  por factores chicos. Con racionales se multiplican numeradores y
+  denominadores por separado y se simplifica una sola vez.
+
+Las llamadas con resultados de más de ``UMBRAL_BITS_PESADO`` bits son pesadas:
+los servidores las ejecutan en el pool de procesos (``procesos.py``). Los
+resultados de más de ``MAX_BITS_RESULTADO`` bits se rechazan al validar.
+"""
+import math
+import os
+from fractions import Fraction
+
+# Tamaño estimado del resultado a partir del cual la llamada va al pool de procesos
+UMBRAL_BITS_PESADO = 8192
+# Tamaño máximo del resultado exacto
+MAX_BITS_RESULTADO = int(os.environ.get('CALCULO_MAX_BITS_EXACTO', 1 << 20))
+
+
+def a_racional(valor):
+    """Convierte un operando a entero o ``Fraction``; lanza ValueError si no es un número exacto."""
+    if isinstance(valor, bool):
+        raise ValueError(f"Operando inválido para aritmética exacta: {valor!r}")
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, float):
+        if not math.isfinite(valor):
+            raise ValueError(f"Operando no finito: {valor}")
+        racional = Fraction(valor)
+    elif isinstance(valor, str):
+        try:
+            racional = Fraction(valor.strip())
+        except (ValueError, ZeroDivisionError):
+            raise ValueError(f"Operando inválido para aritmética exacta: {valor!r}")
+    else:
+        raise ValueError(f"Operando inválido para aritmética exacta: {valor!r}")
+    return racional.numerator if racional.denominator == 1 else racional
+
+
+def a_entero(valor, nombre='operando'):
+    """Convierte un operando a entero; lanza ValueError si no es un entero exacto."""
+    numero = a_racional(valor)
+    if not isinstance(numero, int):
+        raise ValueError(f"El {nombre} debe ser entero")
+    return numero
+
+
+def a_texto(valor):
+    """Representación exacta de un entero o racional."""
+    if isinstance(valor, Fraction):
+        return str(valor.numerator) if valor.denominator == 1 else f"{valor.numerator}/{valor.denominator}"
+    return str(valor)
+
+
+def bits(valor):
+    """Bits de un entero o, en un racional, de su mayor componente."""
+    if isinstance(valor, Fraction):
+        return max(valor.numerator.bit_length(), valor.denominator.bit_length())
+    return valor.bit_length()
+
+
+def bits_estimados(valor):
+    """Bits de un operando sin convertirlo (los textos se estiman por su cantidad de dígitos)."""
+    if isinstance(valor, str):
+        return int(len(valor) * 3.33) + 1
+    if isinstance(valor, int):
+        return valor.bit_length()
+    return 64
+
+
+def potencia(base, exponente, modulo=None):
+    """``base`` elevada a ``exponente`` (módulo ``modulo`` si se indica), exacta."""
+    if modulo is not None:
+        return pow(base, exponente, modulo)
+    if exponente < 0:
+        if base == 0:
+            raise ZeroDivisionError("División por cero: base 0 con exponente negativo")
+        return Fraction(base) ** exponente
+    return base ** exponente
+
+
+def bits_potencia(base, exponente, modulo=None):
+    """Tamaño estimado en bits del trabajo de una potencia exacta."""
+    if modulo is not None:
+        # Cada paso de la exponenciación modular multiplica números del tamaño del módulo
+        return exponente.bit_length() * modulo.bit_length() // 64
+    if base in (0, 1, -1):
+        return 1
+    return abs(exponente) * bits(base)
+
+
+def producto(valores):
+    """Producto exacto en árbol balanceado."""
+    valores = list(valores)
+    if any(isinstance(v, Fraction) for v in valores):
+        numerador = producto(Fraction(v).numerator for v in valores)
+        denominador = producto(Fraction(v).denominator for v in valores)
+        resultado = Fraction(numerador, denominador)
+        return resultado.numerator if resultado.denominator == 1 else resultado
+    if not valores:
+        return 1
+    while len(valores) > 1:
+        pares = [a * b for a, b in zip(valores[::2], valores[1::2])]
+        if len(valores) % 2:
+            pares.append(valores[-1])
+        valores = pares
+    return valores[0]
@@ -0,0 +1,140 @@
+# flujo.py
+"""Respuestas por fragmentos para resultados vectoriales grandes.
+
+Una respuesta común viaja en un solo mensaje, así que cada salto (servidor de
+operación, servidor de cálculo y cliente) tiene el resultado entero en memoria
+a la vez. Con ``'transmitir'`` en la solicitud, el servidor de operación
+calcula el resultado de a ``TAMANO_FRAGMENTO`` elementos y envía cada tramo
+como un mensaje apenas lo calcula:
+
+    {'fragmento': n, 'inicio': i, 'resultado': [...], 'errores': [...], 'cantidad_errores': k}
+
+Después de los fragmentos envía un mensaje final con ``'fin': True`` y los
+totales, o un mensaje con ``'error'`` si el cálculo falla. El servidor de
+cálculo reenvía cada fragmento al cliente sin decodificar sus bloques, y el
+cliente los recorre con un iterador. En cada salto hay como mucho un
+fragmento en memoria. El envío bloqueante por el socket frena al emisor si el
+receptor va más lento. Solo las operaciones vectoriales (elemento a elemento)
+admiten respuestas por fragmentos.
+"""
+import os
+
+import metricas
+import operaciones
+from protocolo import enviar_mensaje, recibir_mensaje
+
+# Elementos por fragmento si el cliente no indica otro tamaño, y máximo que se acepta
+TAMANO_FRAGMENTO = int(os.environ.get('CALCULO_TAMANO_FRAGMENTO', 64 * 1024))
+MAX_TAMANO_FRAGMENTO = 1024 * 1024
+
+contadores = metricas.Contadores('flujos', 'fragmentos', 'elementos', 'reanudados')
+metricas.registrar_fuente('flujos', contadores.valores)
+
+
+class ErrorTransmision(Exception):
+    """El cálculo de una respuesta por fragmentos terminó con error."""
+
+
+class ClienteDesconectado(Exception):
+    """El receptor de los fragmentos cerró la conexión: no tiene sentido seguir calculando."""
+
+
+class Progreso:
+    """Fragmentos y elementos ya reenviados de una respuesta por fragmentos."""
+
+    __slots__ = ('fragmentos', 'elementos', 'cantidad_errores')
+
+    def __init__(self):
+        self.fragmentos = 0
+        self.elementos = 0
+        self.cantidad_errores = 0
+
+
+def tamano_fragmento(pedido):
+    """Elementos por fragmento: el pedido en la solicitud (``True`` usa el predeterminado), acotado."""
+    if isinstance(pedido, bool) or not isinstance(pedido, int) or pedido <= 0:
+        return TAMANO_FRAGMENTO
+    return min(pedido, MAX_TAMANO_FRAGMENTO)
+
+
+def admite(operacion):
+    """Si la operación puede responder por fragmentos (solo las vectoriales)."""
+    registrada = operaciones.obtener(operacion)
+    return registrada is not None and registrada.vectorial
+
+
+def emitir(sock, operacion, operandos, tamano):
+    """Calcula una operación vectorial por tramos y envía cada tramo por el socket apenas se calcula.
+
+    Devuelve el mensaje final (totales o error) sin enviarlo: quien llama le
+    agrega sus tramos de traza y lo envía.
+    """
+    registrada = operaciones.obtener(operacion)
+    if registrada is None or not registrada.vectorial:
+        return {"error": f"La operación {operacion} no admite respuesta por fragmentos"}
+    error = registrada.validar(operandos)
+    if error:
+        return {"error": error}
+    contadores.sumar('flujos')
+    progreso = Progreso()
+    calculo = registrada.ejecutar_por_fragmentos(operandos, tamano)
+    while True:
+        try:
+            inicio, resultado, errores = next(calculo)
+        except StopIteration:
+            break
+        except Exception as e:
+            return {"error": f"Error en el cálculo: {str(e)}"}
+        cantidad_errores = sum(errores)
+        enviar_mensaje(sock, {'fragmento': progreso.fragmentos, 'inicio': inicio, 'resultado': resultado,
+                              'errores': errores, 'cantidad_errores': cantidad_errores})
+        progreso.fragmentos += 1
+        progreso.elementos += len(resultado)
+        progreso.cantidad_errores += cantidad_errores
+    contadores.sumar('fragmentos', progreso.fragmentos)
+    contadores.sumar('elementos', progreso.elementos)
+    return {'fin': True, 'operacion': operacion, 'fragmentos': progreso.fragmentos,
+            'elementos': progreso.elementos, 'cantidad_errores': progreso.cantidad_errores}
+
+
+def reenviar(origen, destino, progreso):
+    """Reenvía a ``destino`` los fragmentos que llegan de ``origen`` hasta el mensaje final y lo devuelve.
+
+    Los bloques no se decodifican. Los fragmentos se numeran y ubican a
+    continuación de los que ya cuenta ``progreso``, que se actualiza con cada
+    uno: si ``origen`` falla a mitad de camino, el cálculo se puede reanudar
+    desde ``progreso.elementos`` en otro servidor. Los errores de ``origen``
+    se propagan; si falla ``destino`` se lanza ``ClienteDesconectado``.
+    """
+    desplazamiento = progreso.elementos
+    while True:
+        mensaje = recibir_mensaje(origen, decodificar_operandos=False)
+        if 'error' in mensaje or mensaje.get('fin'):
+            return mensaje
+        mensaje['fragmento'] = progreso.fragmentos
+        mensaje['inicio'] = desplazamiento + mensaje.get('inicio', 0)
+        try:
+            enviar_mensaje(destino, mensaje)
+        except OSError as e:
+            raise ClienteDesconectado(str(e)) from e
+        elementos = len(mensaje['resultado'])
+        progreso.fragmentos += 1
+        progreso.elementos += elementos
+        progreso.cantidad_errores += mensaje.get('cantidad_errores') or 0
+        contadores.sumar('fragmentos')
+        contadores.sumar('elementos', elementos)
+
+
+def recibir(sock, mensaje):
+    """Genera los fragmentos que llegan por el socket a partir de ``mensaje``, el primero ya recibido.
+
+    Devuelve (como valor de ``StopIteration``) el mensaje final con los
+    totales; si la respuesta termina con error lanza ``ErrorTransmision``.
+    """
+    while True:
+        if 'error' in mensaje:
+            raise ErrorTransmision(mensaje['error'])
+        if mensaje.get('fin'):
+            return mensaje
+        yield mensaje
+        mensaje = recibir_mensaje(sock)
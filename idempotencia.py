@@ -0,0 +1,115 @@
+# idempotencia.py
+"""Tabla de deduplicación de subtareas de los servidores de operación.
+
+Cada subtarea llega con una clave de idempotencia derivada de la clave de la
+solicitud del cliente. Si el servidor de cálculo la reintenta, por ejemplo
+porque venció la espera mientras el servidor todavía calculaba, el servidor de
+operación no la calcula de nuevo. Si el cálculo terminó, devuelve la respuesta
+guardada. Si sigue en curso, espera a que termine y devuelve la misma respuesta.
+
+Las respuestas se guardan ``TTL`` segundos. La tabla se acota por la cantidad
+de elementos guardados (``MAX_ELEMENTOS``) para que los resultados vectoriales
+grandes no la hagan crecer sin límite. Si se pasa, se descartan las entradas
+más antiguas. La deduplicación es por servidor: una subtarea que pasa al
+auxiliar porque su servidor se cayó sí se calcula allí.
+"""
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import metricas
+
+TTL = float(os.environ.get('CALCULO_TTL_IDEMPOTENCIA', 60))
+MAX_ELEMENTOS = int(os.environ.get('CALCULO_MAX_ELEMENTOS_IDEMPOTENCIA', 4 * 1024 * 1024))
+
+
+def _elementos(respuesta):
+    """Tamaño aproximado de una respuesta guardada: sus arreglos cuentan por su longitud."""
+    return 1 + sum(len(valor) for valor in respuesta.values() if isinstance(valor, (array, list)))
+
+
+class _Entrada:
+    __slots__ = ('respuesta', 'elementos', 'vence', 'lista')
+
+    def __init__(self):
+        self.respuesta = None
+        self.elementos = 0
+        self.vence = None
+        # Se activa cuando termina el cálculo (con respuesta o con una excepción)
+        self.lista = threading.Event()
+
+
+class TablaIdempotencia:
+    """Respuestas recientes por clave de idempotencia."""
+
+    def __init__(self, ttl=TTL, max_elementos=MAX_ELEMENTOS):
+        self.ttl = ttl
+        self.max_elementos = max_elementos
+        # Todas las entradas, también las que siguen calculándose
+        self._entradas = {}
+        # Solo las terminadas, en orden de vencimiento (el TTL es el mismo para todas)
+        self._vencimientos = OrderedDict()
+        self._elementos = 0
+        self._lock = threading.Lock()
+        self.contadores = metricas.Contadores('calculadas', 'repetidas')
+        metricas.registrar_fuente('idempotencia', self.resumen)
+
+    def _purgar(self, ahora):
+        """Descarta las respuestas vencidas y, si sobran elementos, las más antiguas (con el lock tomado).
+
+        Recorre las terminadas desde la más antigua y se detiene en la primera que
+        se conserva, así que cuesta lo que se descarta y no lo que hay guardado.
+        """
+        while self._vencimientos:
+            clave, entrada = next(iter(self._vencimientos.items()))
+            if entrada.vence > ahora and self._elementos <= self.max_elementos:
+                break
+            del self._vencimientos[clave]
+            del self._entradas[clave]
+            self._elementos -= entrada.elementos
+
+    def ejecutar(self, clave, calcular):
+        """Devuelve la respuesta de ``calcular()`` calculándola una sola vez por clave; sin clave, siempre calcula."""
+        if clave is None:
+            return calcular()
+        with self._lock:
+            self._purgar(time.time())
+            entrada = self._entradas.get(clave)
+            propia = entrada is None
+            if propia:
+                entrada = self._entradas[clave] = _Entrada()
+        if not propia:
+            entrada.lista.wait()
+            if entrada.respuesta is not None:
+                self.contadores.sumar('repetidas')
+                # Copia: quien la recibe le agrega sus tramos de traza
+                return dict(entrada.respuesta)
+            # El cálculo original lanzó una excepción: se calcula sin guardar
+            return calcular()
+        try:
+            respuesta = calcular()
+        except BaseException:
+            with self._lock:
+                self._entradas.pop(clave, None)
+            entrada.lista.set()
+            raise
+        self.contadores.sumar('calculadas')
+        with self._lock:
+            entrada.respuesta = dict(respuesta)
+            entrada.elementos = _elementos(respuesta)
+            entrada.vence = time.time() + self.ttl
+            if self._entradas.get(clave) is entrada:
+                # Recién ahora entra en el orden de vencimiento, al final
+                self._vencimientos[clave] = entrada
+                self._elementos += entrada.elementos
+        entrada.lista.set()
+        return respuesta
+
+    def resumen(self):
+        """Entradas guardadas y subtareas calculadas o respondidas desde la tabla."""
+        with self._lock:
+            resumen = {'entradas': len(self._entradas), 'elementos': self._elementos, 'ttl': self.ttl}
+        resumen.update(self.contadores.valores())
+        return resumen
@@ -0,0 +1,164 @@
+# lotes.py
+"""Ejecución no interactiva de lotes de operaciones desde un archivo o stdin.
+
+Cada línea de la entrada es una operación, en CSV (``operacion,op1,op2,...``)
+o en JSONL (``{"operacion": "suma", "operandos": [1, 2]}``). Se mantienen
+hasta ``ventana`` solicitudes en curso contra el servidor de cálculo y los
+resultados se escriben en JSONL en el mismo orden de la entrada, así que en
+memoria nunca hay más de ``ventana`` operaciones. Si el proceso se interrumpe,
+al volver a ejecutarlo con la misma salida se retoma después de la última
+línea completa escrita.
+"""
+import csv
+import json
+import os
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cliente import Cliente
+from protocolo import BloqueOperandos
+
+VENTANA = 16
+INTERVALO_PROGRESO = 2.0
+TAMANO_BLOQUE_LECTURA = 1024 * 1024
+
+
+def detectar_formato(ruta):
+    """Deduce el formato de la entrada por su extensión (CSV por defecto)."""
+    return 'jsonl' if ruta.endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+
+
+def _numero(texto):
+    """Convierte un operando de CSV a número, como lo hace el cliente interactivo."""
+    return float(texto)
+
+
+def leer_operaciones(archivo, formato):
+    """Produce (operacion, operandos, error) por cada línea no vacía de la entrada.
+
+    Las líneas inválidas no detienen el lote: llevan el error y salen en su
+    posición de la salida como cualquier otro resultado.
+    """
+    if formato == 'jsonl':
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            try:
+                datos = json.loads(linea)
+                yield datos['operacion'], datos['operandos'], None
+            except (ValueError, KeyError, TypeError) as e:
+                yield None, None, f"Línea JSONL inválida: {str(e)}"
+    else:
+        for fila in csv.reader(archivo):
+            if not fila or not fila[0].strip():
+                continue
+            try:
+                yield fila[0].strip(), [_numero(valor) for valor in fila[1:]], None
+            except ValueError:
+                yield fila[0].strip(), None, "Los operandos deben ser números"
+
+
+def _a_json(valor):
+    if isinstance(valor, (array, BloqueOperandos)):
+        return list(valor)
+    raise TypeError(f"Objeto no serializable: {type(valor).__name__}")
+
+
+def lineas_completas(ruta):
+    """Cuenta las líneas completas de una salida previa y descarta una última línea cortada.
+
+    El archivo se recorre de a ``TAMANO_BLOQUE_LECTURA`` bytes, así que una
+    salida grande no se carga entera en memoria. Si ya termina en un salto de
+    línea no se modifica.
+    """
+    if not os.path.exists(ruta):
+        return 0
+    with open(ruta, 'rb+') as archivo:
+        completas = 0
+        ultimo_salto = -1
+        posicion = 0
+        while True:
+            bloque = archivo.read(TAMANO_BLOQUE_LECTURA)
+            if not bloque:
+                break
+            saltos = bloque.count(b'\n')
+            if saltos:
+                completas += saltos
+                ultimo_salto = posicion + bloque.rfind(b'\n')
+            posicion += len(bloque)
+        fin = ultimo_salto + 1
+        if fin < posicion:
+            # El proceso se interrumpió a mitad de una línea
+            archivo.seek(fin)
+            archivo.truncate()
+    return completas
+
+
+def ejecutar_lote(entrada, salida, formato=None, ventana=VENTANA, host='localhost', puerto=5000,
+                  intervalo_progreso=INTERVALO_PROGRESO, reanudar=True):
+    """Envía todas las operaciones de ``entrada`` ('-' es stdin) y escribe los resultados en ``salida``.
+
+    Devuelve un resumen con las operaciones procesadas, omitidas por reanudación y con error.
+    """
+    formato = formato or ('csv' if entrada == '-' else detectar_formato(entrada))
+    omitir = lineas_completas(salida) if reanudar else 0
+    cliente = Cliente(host, puerto)
+
+    def ejecutar(operacion, operandos, error):
+        if error:
+            return {"error": error}
+        return cliente.enviar_solicitud(operacion, operandos)
+
+    archivo_entrada = sys.stdin if entrada == '-' else open(entrada, newline='', encoding='utf-8')
+    procesadas = errores = 0
+    inicio = ultimo_progreso = time.time()
+    try:
+        with open(salida, 'a' if reanudar else 'w', encoding='utf-8') as archivo_salida, \
+                ThreadPoolExecutor(max_workers=ventana) as ejecutor:
+            pendientes = deque()
+
+            def escribir_siguiente():
+                nonlocal procesadas, errores, ultimo_progreso
+                numero, operacion, futuro = pendientes.popleft()
+                respuesta = futuro.result()
+                registro = {'linea': numero, 'operacion': operacion}
+                if 'error' in respuesta:
+                    registro['error'] = respuesta['error']
+                    errores += 1
+                else:
+                    registro['resultado'] = respuesta['resultado']
+                    if 'cantidad_errores' in respuesta:
+                        registro['cantidad_errores'] = respuesta['cantidad_errores']
+                archivo_salida.write(json.dumps(registro, default=_a_json, ensure_ascii=False, separators=(',', ':')) + '\n')
+                procesadas += 1
+                ahora = time.time()
+                if ahora - ultimo_progreso >= intervalo_progreso:
+                    archivo_salida.flush()
+                    ultimo_progreso = ahora
+                    mostrar_progreso(procesadas, omitir, errores, ahora - inicio)
+
+            for numero, (operacion, operandos, error) in enumerate(leer_operaciones(archivo_entrada, formato), 1):
+                if numero <= omitir:
+                    continue
+                if len(pendientes) >= ventana:
+                    escribir_siguiente()
+                pendientes.append((numero, operacion, ejecutor.submit(ejecutar, operacion, operandos, error)))
+            while pendientes:
+                escribir_siguiente()
+    finally:
+        if archivo_entrada is not sys.stdin:
+            archivo_entrada.close()
+
+    duracion = time.time() - inicio
+    mostrar_progreso(procesadas, omitir, errores, duracion)
+    return {'procesadas': procesadas, 'omitidas': omitir, 'errores': errores, 'duracion': duracion}
+
+
+def mostrar_progreso(procesadas, omitidas, errores, duracion):
+    """Muestra el avance del lote por stderr para no mezclarlo con la salida."""
+    tasa = procesadas / duracion if duracion > 0 else 0.0
+    print(f"Procesadas: {procesadas} (omitidas por reanudación: {omitidas}) | Errores: {errores} | "
+          f"{tasa:.1f} operaciones/s", file=sys.stderr)
@@ -3,20 +3,51 @@ import sys
 
 def main():
     parser = argparse.ArgumentParser(description='Sistema de Cálculo Distribuido con Tolerancia a Fallos')
-    parser.add_argument('componente', choices=['cliente', 'servidor_calculo', 'servidor_op1', 'servidor_op2', 'servidor_auxiliar'],
+    parser.add_argument('componente', choices=['cliente', 'servidor_calculo', 'servidor_op1', 'servidor_op2', 'servidor_op3',
+                                                 'servidor_auxiliar', 'reproducir', 'lote'],
                        help='Componente a ejecutar')
+    parser.add_argument('--puerto', type=int, default=5000,
+                       help='servidor_calculo: puerto de escucha (para varios servidores de cálculo)')
+    parser.add_argument('--capturar', metavar='ARCHIVO',
+                       help='servidor_calculo: guarda las solicitudes atendidas en ARCHIVO')
+    parser.add_argument('--captura', metavar='ARCHIVO',
+                       help='reproducir: archivo de captura a reproducir')
+    parser.add_argument('--velocidad', type=float, default=1.0,
+                       help='reproducir: factor de velocidad (1 = original, 0 = máxima)')
+    parser.add_argument('--concurrencia', type=int, default=32,
+                       help='reproducir: solicitudes simultáneas como máximo')
+    parser.add_argument('--entrada', metavar='ARCHIVO', default='-',
+                       help='lote: operaciones a ejecutar en CSV o JSONL (- para stdin)')
+    parser.add_argument('--salida', metavar='ARCHIVO',
+                       help='lote: archivo JSONL de resultados, en el orden de la entrada')
+    parser.add_argument('--formato', choices=['csv', 'jsonl'],
+                       help='lote: formato de la entrada (por defecto según la extensión)')
+    parser.add_argument('--ventana', type=int, default=16,
+                       help='lote: solicitudes en curso como máximo')
+    parser.add_argument('--sin-reanudar', action='store_true',
+                       help='lote: sobrescribe la salida en vez de continuar donde quedó')
     args = parser.parse_args()
     
     if args.componente == 'cliente':
         ejecutar_cliente()
     elif args.componente == 'servidor_calculo':
-        ejecutar_servidor_calculo()
+        ejecutar_servidor_calculo(args.capturar, args.puerto)
     elif args.componente == 'servidor_op1':
         ejecutar_servidor_operacion1()
     elif args.componente == 'servidor_op2':
         ejecutar_servidor_operacion2()
+    elif args.componente == 'servidor_op3':
+        ejecutar_servidor_operacion3()
     elif args.componente == 'servidor_auxiliar':
         ejecutar_servidor_auxiliar()
+    elif args.componente == 'reproducir':
+        if not args.captura:
+            parser.error("reproducir requiere --captura ARCHIVO")
+        ejecutar_reproduccion(args.captura, args.velocidad, args.concurrencia)
+    elif args.componente == 'lote':
+        if not args.salida:
+            parser.error("lote requiere --salida ARCHIVO")
+        ejecutar_lote(args.entrada, args.salida, args.formato, args.ventana, not args.sin_reanudar)
     else:
         print("Componente no reconocido")
         sys.exit(1)
@@ -57,10 +88,10 @@ def ejecutar_cliente():
     
     print("Cliente finalizado")
 
-def ejecutar_servidor_calculo():
+def ejecutar_servidor_calculo(archivo_captura=None, puerto=5000):
     from servidor_calculo import ServidorCalculo
     
-    servidor = ServidorCalculo()
+    servidor = ServidorCalculo(puerto_escucha=puerto, archivo_captura=archivo_captura)
     print("Iniciando servidor de cálculo...")
     servidor.iniciar()
 
@@ -87,6 +118,25 @@ def ejecutar_servidor_operacion2():
     print("Iniciando servidor de operaciones avanzadas...")
     servidor.iniciar()
 
+def ejecutar_servidor_operacion3():
+    from servidor_operacion3 import ServidorOperacionAlgebraLineal
+    
+    servidor = ServidorOperacionAlgebraLineal()
+    print("Iniciando servidor de operaciones de álgebra lineal...")
+    servidor.iniciar()
+
+def ejecutar_reproduccion(archivo_captura, velocidad, concurrencia):
+    from captura import mostrar_reporte, reproducir
+    
+    print(f"Reproduciendo {archivo_captura} contra localhost:5000...")
+    mostrar_reporte(reproducir(archivo_captura, velocidad=velocidad, concurrencia=concurrencia))
+
+def ejecutar_lote(entrada, salida, formato, ventana, reanudar):
+    import lotes
+    
+    print(f"Ejecutando lote desde {entrada} hacia {salida} contra localhost:5000...", file=sys.stderr)
+    lotes.ejecutar_lote(entrada, salida, formato=formato, ventana=ventana, reanudar=reanudar)
+
 if __name__ == "__main__":
     main()
 
@@ -100,8 +150,23 @@ if __name__ == "__main__":
 # Para iniciar el servidor de operaciones avanzadas:
 # python main.py servidor_op2
 #
+# Para iniciar el servidor de operaciones de álgebra lineal:
+# python main.py servidor_op3
+#
 # Para iniciar el servidor auxiliar:
 # python main.py servidor_auxiliar
 #
 # Para iniciar el cliente:
-# python main.py cliente
\ No newline at end of file
+# python main.py cliente
+#
+# Para capturar el tráfico del servidor de cálculo y reproducirlo al doble de velocidad:
+# python main.py servidor_calculo --capturar trafico.cap
+# python main.py reproducir --captura trafico.cap --velocidad 2
+#
+# Para ejecutar un lote de operaciones desde un archivo (se reanuda si se interrumpe):
+# python main.py lote --entrada operaciones.csv --salida resultados.jsonl --ventana 32
+#
+# Para ejecutar dos servidores de cálculo a la vez (el cliente y el auxiliar usan ambos):
+# export CALCULO_COORDINADORES=localhost:5000,localhost:5010
+# python main.py servidor_calculo
+# python main.py servidor_calculo --puerto 5010
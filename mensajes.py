@@ -0,0 +1,104 @@
+# mensajes.py
+"""Mensajes tipados que circulan por el servidor de cálculo.
+
+Las solicitudes, subtareas y resultados son objetos con ``__slots__`` en vez
+de diccionarios: ocupan menos memoria, no se copian al pasar de una etapa a
+otra y sus campos se ven en los perfiles. Cada clase tiene un codificador y un
+decodificador precompilados (construidos una sola vez a partir de sus campos)
+para pasar al diccionario del formato de cable y volver. Los campos en None no
+viajan.
+"""
+from operator import attrgetter
+
+from protocolo import a_arreglo
+
+
+class Mensaje:
+    """Base de los mensajes tipados; las subclases solo declaran sus ``__slots__``."""
+
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        campos = cls.__slots__
+        obtener = attrgetter(*campos)
+
+        def a_mensaje(self):
+            """Diccionario listo para ``enviar_mensaje``."""
+            return {campo: valor for campo, valor in zip(campos, obtener(self)) if valor is not None}
+
+        def desde_mensaje(clase, mensaje):
+            """Construye el objeto a partir de un diccionario recibido; ignora las claves desconocidas."""
+            return clase(*map(mensaje.get, campos))
+
+        cls.a_mensaje = a_mensaje
+        cls.desde_mensaje = classmethod(desde_mensaje)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.a_mensaje()!r})"
+
+
+class Solicitud(Mensaje):
+    """Solicitud de un cliente al servidor de cálculo."""
+
+    __slots__ = ('operacion', 'operandos', 'timestamp', 'traza', 'clave', 'transmitir')
+
+    def __init__(self, operacion, operandos, timestamp=None, traza=None, clave=None, transmitir=None):
+        self.operacion = operacion
+        # Las listas de flotantes pasan a un arreglo; los bloques binarios se reenvían tal cual
+        self.operandos = a_arreglo(operandos)
+        self.timestamp = timestamp
+        self.traza = traza
+        # Clave de idempotencia del cliente; las de las subtareas se derivan de ella
+        self.clave = clave
+        # Respuesta por fragmentos: True o los elementos por fragmento (ver flujo.py)
+        self.transmitir = transmitir
+
+
+class Subtarea(Mensaje):
+    """Parte de una solicitud que ejecuta un servidor de operación."""
+
+    __slots__ = ('tipo', 'operacion', 'operandos', 'traza', 'clave')
+
+    def __init__(self, tipo, operacion, operandos, traza=None, clave=None):
+        self.tipo = tipo
+        self.operacion = operacion
+        self.operandos = operandos
+        self.traza = traza
+        # Clave de idempotencia: el servidor de operación no calcula dos veces la misma subtarea
+        self.clave = clave
+
+
+class Resultado(Mensaje):
+    """Resultado de un servidor de operación o respuesta final al cliente."""
+
+    __slots__ = ('operacion', 'resultado', 'operandos', 'errores', 'cantidad_errores',
+                 'resultados_parciales', 'servidor', 'tiempo_procesamiento', 'error', 'traza')
+
+    def __init__(self, operacion=None, resultado=None, operandos=None, errores=None, cantidad_errores=None,
+                 resultados_parciales=None, servidor=None, tiempo_procesamiento=None, error=None, traza=None):
+        self.operacion = operacion
+        self.resultado = resultado
+        self.operandos = operandos
+        self.errores = errores
+        self.cantidad_errores = cantidad_errores
+        self.resultados_parciales = resultados_parciales
+        self.servidor = servidor
+        self.tiempo_procesamiento = tiempo_procesamiento
+        self.error = error
+        self.traza = traza
+
+
+class Destino:
+    """Servidor elegido para una subtarea; es inmutable y se comparte entre hilos."""
+
+    __slots__ = ('host', 'puerto', 'tipo', 'desborde')
+
+    def __init__(self, host, puerto, tipo, desborde=False):
+        self.host = host
+        self.puerto = puerto
+        self.tipo = tipo
+        self.desborde = desborde
+
+    def __repr__(self):
+        return f"Destino({self.tipo}@{self.host}:{self.puerto}{', desborde' if self.desborde else ''})"
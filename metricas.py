@@ -0,0 +1,74 @@
+# metricas.py
+"""Registro de métricas del proceso, consultables con la operación 'obtener_metricas'."""
+import threading
+import weakref
+
+_fuentes = {}
+_lock = threading.Lock()
+
+
+def registrar_fuente(nombre, funcion):
+    """Registra una función que devuelve un diccionario con las métricas de un subsistema."""
+    with _lock:
+        _fuentes[nombre] = funcion
+
+
+def instantanea():
+    """Devuelve las métricas actuales de todas las fuentes registradas."""
+    with _lock:
+        fuentes = list(_fuentes.items())
+    return {nombre: funcion() for nombre, funcion in fuentes}
+
+
+class Contadores:
+    """Contadores por hilo que se suman al leerlos.
+
+    Cada hilo incrementa su propio diccionario sin tomar locks. El lock solo se
+    toma la primera vez que un hilo usa los contadores y al leerlos. Los valores
+    de los hilos terminados se acumulan aparte, así que los hilos de corta vida
+    (uno por conexión) no se recorren en cada lectura.
+    """
+
+    def __init__(self, *nombres):
+        self.nombres = nombres
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (referencia débil al hilo, sus valores) de los hilos que usaron los contadores
+        self._por_hilo = []
+        self._terminados = dict.fromkeys(nombres, 0)
+
+    def _propios(self):
+        try:
+            return self._local.valores
+        except AttributeError:
+            valores = self._local.valores = dict.fromkeys(self.nombres, 0)
+            with self._lock:
+                self._recoger_terminados()
+                self._por_hilo.append((weakref.ref(threading.current_thread()), valores))
+            return valores
+
+    def sumar(self, nombre, cantidad=1):
+        """Suma ``cantidad`` al contador ``nombre`` del hilo actual."""
+        self._propios()[nombre] += cantidad
+
+    def _recoger_terminados(self):
+        vivos = []
+        for hilo, valores in self._por_hilo:
+            actual = hilo()
+            if actual is not None and actual.is_alive():
+                vivos.append((hilo, valores))
+            else:
+                # El hilo ya no escribe en sus valores: se pueden acumular sin carrera
+                for nombre, valor in valores.items():
+                    self._terminados[nombre] += valor
+        self._por_hilo = vivos
+
+    def valores(self):
+        """Suma de los contadores de todos los hilos."""
+        with self._lock:
+            self._recoger_terminados()
+            total = dict(self._terminados)
+            for _, valores in self._por_hilo:
+                for nombre, valor in valores.items():
+                    total[nombre] += valor
+        return total
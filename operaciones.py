@@ -0,0 +1,397 @@
+# operaciones.py
+"""Registro declarativo de operaciones compartido por todos los servidores."""
+import math
+from array import array
+from itertools import repeat
+
+import algebra_lineal
+import exacto
+import sumas
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usan kernels en Python puro
+    np = None
+
+# Tipos de servidor de operación
+TIPO_ARITMETICO = 'aritmetico'
+TIPO_AVANZADO = 'avanzado'
+TIPO_ALGEBRA_LINEAL = 'algebra_lineal'
+TIPO_COMPUESTO = 'compuesto'
+
+
+class Operacion:
+    """Descripción de una operación: a qué tipo de servidor pertenece, cuántos
+    operandos admite, qué dominio valida y cuánto cuesta aproximadamente."""
+
+    __slots__ = ('nombre', 'tipo', 'funcion', 'aridad_min', 'aridad_max', 'dominio', 'costo', 'vectorial',
+                 'eco_operandos', 'pesada')
+
+    def __init__(self, nombre, tipo, funcion, aridad_min, aridad_max=None, dominio=None, costo=1,
+                 vectorial=False, eco_operandos=True, pesada=None):
+        self.nombre = nombre
+        self.tipo = tipo
+        self.funcion = funcion
+        self.aridad_min = aridad_min
+        self.aridad_max = aridad_max
+        self.dominio = dominio
+        # Costo relativo por operando, usado como pista para el enrutamiento
+        self.costo = costo
+        # Las operaciones vectoriales devuelven un arreglo de resultados y una máscara de errores
+        self.vectorial = vectorial
+        # Las operaciones sobre datos grandes no devuelven sus operandos en la respuesta
+        self.eco_operandos = eco_operandos and not vectorial
+        # Indica si una llamada concreta es tan costosa que se ejecuta en el pool de procesos
+        self.pesada = pesada
+
+    def validar(self, operandos):
+        """Devuelve un mensaje de error si los operandos no son válidos, o None."""
+        cantidad = len(operandos)
+        if cantidad < self.aridad_min:
+            return "Número insuficiente de operandos"
+        if self.aridad_max is not None and cantidad > self.aridad_max:
+            return f"La operación {self.nombre} admite como máximo {self.aridad_max} operandos"
+        if self.dominio is not None:
+            return self.dominio(operandos)
+        return None
+
+    def ejecutar(self, operandos, validar=True):
+        """Valida y ejecuta la operación, devolviendo la respuesta para el cliente.
+
+        Con ``validar=False`` se omite la validación, que quien llama ya hizo.
+        """
+        error = self.validar(operandos) if validar else None
+        if error:
+            return {"error": error}
+        try:
+            resultado = self.funcion(operandos)
+        except Exception as e:
+            return {"error": f"Error en el cálculo: {str(e)}"}
+        if self.vectorial:
+            resultado, errores = resultado
+            return {
+                "operacion": self.nombre,
+                "resultado": resultado,
+                "errores": errores,
+                "cantidad_errores": sum(errores)
+            }
+        if not self.eco_operandos:
+            return {"operacion": self.nombre, "resultado": resultado}
+        return {
+            "operacion": self.nombre,
+            "operandos": operandos,
+            "resultado": resultado
+        }
+
+    def ejecutar_por_fragmentos(self, operandos, tamano):
+        """Ejecuta una operación vectorial ya validada de a ``tamano`` elementos.
+
+        Genera ``(inicio, resultado, errores)`` por tramo, así que solo un tramo
+        del resultado existe a la vez (ver flujo.py).
+        """
+        longitud = max((len(o) for o in operandos if not _es_escalar(o)), default=1)
+        for inicio in range(0, longitud, tamano):
+            tramo = [o if _es_escalar(o) else o[inicio:inicio + tamano] for o in operandos]
+            resultado, errores = self.funcion(tramo)
+            yield inicio, resultado, errores
+
+
+REGISTRO = {}
+
+
+def registrar(nombre, tipo, aridad_min, aridad_max=None, dominio=None, costo=1, vectorial=False,
+              eco_operandos=True, pesada=None):
+    """Decorador que registra la función de cálculo de una operación."""
+    def decorador(funcion):
+        REGISTRO[nombre] = Operacion(nombre, tipo, funcion, aridad_min, aridad_max, dominio, costo, vectorial,
+                                     eco_operandos, pesada)
+        return funcion
+    return decorador
+
+
+def obtener(nombre):
+    """Devuelve la operación registrada con ese nombre, o None."""
+    return REGISTRO.get(nombre)
+
+
+def operaciones_de_tipo(*tipos):
+    """Lista los nombres de las operaciones que pertenecen a los tipos indicados."""
+    return sorted(nombre for nombre, op in REGISTRO.items() if op.tipo in tipos)
+
+
+# --- Validadores de dominio ---
+
+def _dominio_division(operandos):
+    if operandos[1] == 0:
+        return "División por cero"
+    return None
+
+
+def _dominio_raiz(operandos):
+    if operandos[0] < 0 and operandos[1] % 2 == 0:
+        return "No se puede calcular raíz par de número negativo"
+    return None
+
+
+def _dominio_logaritmo(operandos):
+    if operandos[0] <= 0 or operandos[1] <= 0 or operandos[1] == 1:
+        return "Argumentos inválidos para logaritmo"
+    return None
+
+
+def _es_escalar(valor):
+    return isinstance(valor, (int, float))
+
+
+def _dominio_vectorial(operandos):
+    a, b = operandos
+    if not _es_escalar(a) and not _es_escalar(b) and len(a) != len(b):
+        return "Los vectores de operandos deben tener la misma longitud"
+    return None
+
+
+# --- Operaciones aritméticas ---
+
+@registrar('suma', TIPO_ARITMETICO, 1)
+def suma(operandos):
+    return sumas.suma(operandos)
+
+
+@registrar('resta', TIPO_ARITMETICO, 1)
+def resta(operandos):
+    return sumas.resta(operandos)
+
+
+@registrar('multiplicacion', TIPO_ARITMETICO, 1)
+def multiplicacion(operandos):
+    if isinstance(operandos, list) and all(type(v) is int for v in operandos):
+        # Enteros: el producto en árbol da el mismo resultado exacto en menos tiempo
+        return exacto.producto(operandos)
+    resultado = 1
+    for operando in operandos:
+        resultado *= operando
+    return resultado
+
+
+@registrar('division', TIPO_ARITMETICO, 2, 2, dominio=_dominio_division)
+def division(operandos):
+    return operandos[0] / operandos[1]
+
+
+# --- Operaciones avanzadas ---
+
+@registrar('potencia', TIPO_AVANZADO, 2, 2, costo=4)
+def potencia(operandos):
+    return math.pow(operandos[0], operandos[1])
+
+
+@registrar('raiz', TIPO_AVANZADO, 2, 2, dominio=_dominio_raiz, costo=4)
+def raiz(operandos):
+    return math.pow(operandos[0], 1 / operandos[1])
+
+
+@registrar('logaritmo', TIPO_AVANZADO, 2, 2, dominio=_dominio_logaritmo, costo=4)
+def logaritmo(operandos):
+    return math.log(operandos[0], operandos[1])
+
+
+# --- Operaciones vectoriales ---
+# Reciben dos operandos, cada uno escalar o arreglo (un escalar se difunde
+# sobre el otro arreglo). Los errores de dominio no abortan la llamada: el
+# elemento queda en NaN y se marca con 1 en la máscara de errores.
+
+def _como_arreglo_numpy(valor):
+    if _es_escalar(valor):
+        return float(valor)
+    return np.frombuffer(valor, dtype=np.float64) if isinstance(valor, array) else np.asarray(valor, dtype=np.float64)
+
+
+def _kernel_numpy(funcion, a, b):
+    with np.errstate(all='ignore'):
+        resultado = np.atleast_1d(funcion(_como_arreglo_numpy(a), _como_arreglo_numpy(b))).astype(np.float64)
+    errores = ~np.isfinite(resultado)
+    resultado[errores] = np.nan
+    return array('d', resultado.tobytes()), array('b', errores.astype(np.int8).tobytes())
+
+
+def _kernel_python(funcion, a, b):
+    if _es_escalar(a) and _es_escalar(b):
+        a, b = [a], [b]
+    elif _es_escalar(a):
+        a = repeat(a, len(b))
+    elif _es_escalar(b):
+        b = repeat(b, len(a))
+
+    def segura(x, y):
+        try:
+            return funcion(x, y)
+        except (ValueError, ZeroDivisionError, OverflowError):
+            return math.nan
+
+    resultado = array('d', map(segura, a, b))
+    errores = array('b', [r != r for r in resultado])
+    return resultado, errores
+
+
+def _potencia_numpy(a, b):
+    return np.power(a, b)
+
+
+def _raiz_numpy(a, b):
+    resultado = np.power(a, 1.0 / b)
+    # Raíz par de número negativo o índice nulo
+    return np.where((np.asarray(a) < 0) & (np.mod(b, 2) == 0) | (np.asarray(b) == 0), np.nan, resultado)
+
+
+def _logaritmo_numpy(a, b):
+    return np.where((np.asarray(b) == 1), np.nan, np.log(a) / np.log(b))
+
+
+def _raiz_escalar(x, y):
+    if x < 0 and y % 2 == 0:
+        return math.nan
+    return math.pow(x, 1 / y)
+
+
+def _logaritmo_escalar(x, y):
+    if x <= 0 or y <= 0 or y == 1:
+        return math.nan
+    return math.log(x, y)
+
+
+def _vectorial(kernel_numpy, funcion_escalar):
+    def calcular(operandos):
+        a, b = operandos
+        if np is not None:
+            return _kernel_numpy(kernel_numpy, a, b)
+        return _kernel_python(funcion_escalar, a, b)
+    return calcular
+
+
+registrar('potencia_vectorial', TIPO_AVANZADO, 2, 2, dominio=_dominio_vectorial, costo=4,
+          vectorial=True)(_vectorial(_potencia_numpy, math.pow))
+registrar('raiz_vectorial', TIPO_AVANZADO, 2, 2, dominio=_dominio_vectorial, costo=4,
+          vectorial=True)(_vectorial(_raiz_numpy, _raiz_escalar))
+registrar('logaritmo_vectorial', TIPO_AVANZADO, 2, 2, dominio=_dominio_vectorial, costo=4,
+          vectorial=True)(_vectorial(_logaritmo_numpy, _logaritmo_escalar))
+
+
+# --- Operaciones exactas ---
+# Enteros y racionales sin redondeo; los resultados viajan como texto (ver exacto.py).
+
+def _operandos_potencia_exacta(operandos):
+    base = exacto.a_racional(operandos[0])
+    exponente = exacto.a_entero(operandos[1], 'exponente')
+    modulo = exacto.a_entero(operandos[2], 'módulo') if len(operandos) > 2 else None
+    return base, exponente, modulo
+
+
+def _dominio_potencia_exacta(operandos):
+    try:
+        base, exponente, modulo = _operandos_potencia_exacta(operandos)
+    except ValueError as e:
+        return str(e)
+    if modulo is not None:
+        if modulo == 0:
+            return "El módulo no puede ser cero"
+        if not isinstance(base, int):
+            return "Con módulo, la base debe ser entera"
+    elif base == 0 and exponente < 0:
+        return "División por cero: base 0 con exponente negativo"
+    elif exacto.bits_potencia(base, exponente) > exacto.MAX_BITS_RESULTADO:
+        return f"El resultado exacto excedería {exacto.MAX_BITS_RESULTADO} bits"
+    return None
+
+
+def _potencia_exacta_pesada(operandos):
+    return exacto.bits_potencia(*_operandos_potencia_exacta(operandos)) > exacto.UMBRAL_BITS_PESADO
+
+
+def _dominio_multiplicacion_exacta(operandos):
+    try:
+        valores = [exacto.a_racional(v) for v in operandos]
+    except ValueError as e:
+        return str(e)
+    if 0 not in valores and sum(map(exacto.bits, valores)) > exacto.MAX_BITS_RESULTADO:
+        return f"El resultado exacto excedería {exacto.MAX_BITS_RESULTADO} bits"
+    return None
+
+
+def _multiplicacion_exacta_pesada(operandos):
+    return sum(map(exacto.bits_estimados, operandos)) > exacto.UMBRAL_BITS_PESADO
+
+
+@registrar('potencia_exacta', TIPO_AVANZADO, 2, 3, dominio=_dominio_potencia_exacta, costo=8,
+           eco_operandos=False, pesada=_potencia_exacta_pesada)
+def potencia_exacta(operandos):
+    return exacto.a_texto(exacto.potencia(*_operandos_potencia_exacta(operandos)))
+
+
+@registrar('multiplicacion_exacta', TIPO_AVANZADO, 1, dominio=_dominio_multiplicacion_exacta, costo=4,
+           eco_operandos=False, pesada=_multiplicacion_exacta_pesada)
+def multiplicacion_exacta(operandos):
+    return exacto.a_texto(exacto.producto(exacto.a_racional(v) for v in operandos))
+
+
+# --- Operaciones de álgebra lineal ---
+
+def _dominio_producto_matricial(operandos):
+    a, b = operandos
+    if not algebra_lineal.es_matriz(a) or not algebra_lineal.es_matriz(b):
+        return "Los operandos deben ser matrices con formato {'forma': [filas, columnas], 'datos': [...]}"
+    if a['forma'][1] != b['forma'][0]:
+        return "Las dimensiones de las matrices no son compatibles"
+    return None
+
+
+def _dominio_resolver_sistema(operandos):
+    a, b = operandos
+    if not algebra_lineal.es_matriz(a) or a['forma'][0] != a['forma'][1]:
+        return "La matriz del sistema debe ser cuadrada"
+    if _es_escalar(b) or len(b) != a['forma'][0]:
+        return "El vector independiente no coincide con la dimensión del sistema"
+    return None
+
+
+def _dominio_producto_punto(operandos):
+    x, y = operandos
+    if _es_escalar(x) or _es_escalar(y) or len(x) != len(y):
+        return "Los vectores deben tener la misma longitud"
+    return None
+
+
+def _dominio_reduccion(operandos):
+    datos, tipo = operandos
+    if tipo not in algebra_lineal.REDUCCIONES:
+        return f"Reducción no soportada: {tipo}. Opciones: {', '.join(algebra_lineal.REDUCCIONES)}"
+    if _es_escalar(datos) or len(datos) == 0:
+        return "La reducción requiere un vector no vacío"
+    return None
+
+
+@registrar('producto_matricial', TIPO_ALGEBRA_LINEAL, 2, 2, dominio=_dominio_producto_matricial, costo=20,
+           eco_operandos=False)
+def producto_matricial(operandos):
+    return algebra_lineal.producto_matricial(operandos[0], operandos[1])
+
+
+@registrar('resolver_sistema', TIPO_ALGEBRA_LINEAL, 2, 2, dominio=_dominio_resolver_sistema, costo=20,
+           eco_operandos=False)
+def resolver_sistema(operandos):
+    return algebra_lineal.resolver_sistema(operandos[0], operandos[1])
+
+
+@registrar('producto_punto', TIPO_ALGEBRA_LINEAL, 2, 2, dominio=_dominio_producto_punto, costo=2,
+           eco_operandos=False)
+def producto_punto(operandos):
+    return algebra_lineal.producto_punto(operandos[0], operandos[1])
+
+
+@registrar('reduccion', TIPO_ALGEBRA_LINEAL, 2, 2, dominio=_dominio_reduccion, costo=2, eco_operandos=False)
+def reduccion(operandos):
+    return algebra_lineal.reduccion(operandos[0], operandos[1])
+
+
+# --- Operaciones compuestas (el servidor de cálculo las divide en subtareas) ---
+
+REGISTRO['calculo_complejo'] = Operacion('calculo_complejo', TIPO_COMPUESTO, None, 4, 4, costo=5)
@@ -0,0 +1,217 @@
+# planificador.py
+"""Planificador de costos del servidor de cálculo.
+
+Entre la validación y la división en subtareas, el planificador decide cómo
+atender cada solicitud:
+
+- ``identidad``: el resultado se conoce sin calcular (una multiplicación con un
+  cero, una potencia con exponente 0 o 1) y se responde sin despachar nada.
+- ``local``: el cálculo cuesta menos que una fracción del viaje de ida y vuelta
+  a un servidor de operación, así que lo hace el propio servidor de cálculo.
+- ``unico``: se envía a un servidor de operación, como siempre.
+- ``particionado``: una operación vectorial grande se reparte por tramos entre
+  el servidor principal y el auxiliar, que la calculan en paralelo.
+
+El costo local es la cantidad de elementos por el tiempo por elemento de la
+operación: al principio se estima con su costo relativo en el registro y el
+tiempo de una suma medido al iniciar, y luego se corrige con lo que tardan los
+cálculos locales (media móvil por operación). El costo remoto es el viaje de ida y vuelta observado (media móvil por tipo de
+servidor), escalado por las subtareas en curso en ese servidor. Las decisiones
+se cuentan en la métrica ``planificador``.
+"""
+import math
+import os
+import time
+from array import array
+
+import metricas
+import operaciones
+from mensajes import Resultado
+from protocolo import BloqueOperandos
+
+MODO_IDENTIDAD = 'identidad'
+MODO_LOCAL = 'local'
+MODO_UNICO = 'unico'
+MODO_PARTICIONADO = 'particionado'
+
+# Permite desactivar el planificador (todo va a un servidor de operación, como antes)
+HABILITADO = os.environ.get('CALCULO_PLANIFICADOR', '1') != '0'
+# Se calcula en el servidor de cálculo si cuesta menos que esta fracción del viaje al servidor de operación
+FRACCION_LOCAL = 0.25
+# Tope de elementos para calcular en el servidor de cálculo, para no retener el intérprete
+MAX_ELEMENTOS_LOCAL = 10000
+# Elementos a partir de los cuales un cálculo local corrige el costo por elemento (en los
+# más chicos domina el costo fijo de la llamada)
+MIN_ELEMENTOS_MEDICION = 256
+# Elementos a partir de los cuales una operación vectorial se reparte entre servidores
+UMBRAL_PARTICION = int(os.environ.get('CALCULO_UMBRAL_PARTICION', 256 * 1024))
+# Viaje de ida y vuelta supuesto antes de observar ninguno, y peso de cada observación nueva
+RTT_INICIAL = 0.001
+PESO_OBSERVACION = 0.1
+
+
+class Plan:
+    """Decisión del planificador para una solicitud."""
+
+    __slots__ = ('modo', 'resultado', 'particiones')
+
+    def __init__(self, modo, resultado=None, particiones=1):
+        self.modo = modo
+        # Resultado ya calculado (identidad o cálculo local)
+        self.resultado = resultado
+        # Cantidad de tramos en que se reparte una operación particionada
+        self.particiones = particiones
+
+
+def _signo(valor):
+    """1, -1 o un cero del mismo tipo (y, si es flotante, del mismo signo) que ``valor``."""
+    if valor == 0:
+        return valor
+    return math.copysign(1.0, valor) if isinstance(valor, float) else (1 if valor > 0 else -1)
+
+
+def _es_escalar(valor):
+    return isinstance(valor, (int, float))
+
+
+def cantidad_elementos(valor):
+    """Cantidad de números en un operando: escalares, vectores, bloques y matrices."""
+    if isinstance(valor, (array, BloqueOperandos)):
+        return len(valor)
+    if isinstance(valor, dict):
+        return cantidad_elementos(valor.get('datos', ()))
+    if isinstance(valor, (list, tuple)):
+        return sum(cantidad_elementos(v) for v in valor)
+    return 1
+
+
+def _decodificar(valor):
+    """Convierte los bloques sin decodificar en arreglos para calcular en este proceso."""
+    if isinstance(valor, BloqueOperandos):
+        return valor.a_arreglo()
+    if isinstance(valor, list):
+        return [_decodificar(v) for v in valor]
+    if isinstance(valor, dict):
+        return {clave: _decodificar(v) for clave, v in valor.items()}
+    return valor
+
+
+def _actualizar_media(medias, clave, valor):
+    """Media móvil exponencial sin lock: una observación perdida entre hilos no cambia la estimación."""
+    anterior = medias.get(clave)
+    medias[clave] = valor if anterior is None else anterior + PESO_OBSERVACION * (valor - anterior)
+
+
+def _medir_costo_unidad():
+    """Segundos por elemento de la operación más barata (suma), medidos en esta máquina."""
+    datos = array('d', range(10000))
+    suma = operaciones.REGISTRO['suma'].funcion
+    mejor = math.inf
+    for _ in range(5):
+        inicio = time.perf_counter()
+        suma(datos)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor / len(datos)
+
+
+class Planificador:
+    """Elige entre identidad, cálculo local, un servidor o particionado para cada solicitud."""
+
+    def __init__(self):
+        self.habilitado = HABILITADO
+        self.costo_unidad = _medir_costo_unidad()
+        # Viaje de ida y vuelta observado por tipo de servidor (media móvil exponencial)
+        self.rtt = {}
+        # Segundos por elemento observados en los cálculos locales de cada operación
+        self.costo_elemento = {}
+        self.contadores = metricas.Contadores(MODO_IDENTIDAD, MODO_LOCAL, MODO_UNICO, MODO_PARTICIONADO)
+        metricas.registrar_fuente('planificador', self.resumen)
+
+    def observar_rtt(self, tipo, segundos, operandos):
+        """Registra la duración de una subtarea enviada a un servidor de operación.
+
+        Solo cuentan las subtareas que se podrían haber calculado aquí: las grandes
+        inflarían la estimación con su propio tiempo de cálculo.
+        """
+        if cantidad_elementos(operandos) <= MAX_ELEMENTOS_LOCAL:
+            _actualizar_media(self.rtt, tipo, segundos)
+
+    def planificar(self, solicitud, ruteo, en_vuelo):
+        """Devuelve el ``Plan`` de una solicitud ya validada.
+
+        ``ruteo`` es la tabla de enrutamiento vigente y ``en_vuelo`` las subtareas en curso por servidor.
+        """
+        operacion = operaciones.obtener(solicitud.operacion)
+        if not self.habilitado or operacion is None or operacion.funcion is None:
+            return self._decidir(MODO_UNICO)
+        if operacion.pesada is not None and operacion.pesada(solicitud.operandos):
+            # Los servidores de operación la ejecutan en su pool de procesos
+            return self._decidir(MODO_UNICO)
+
+        resultado = self.identidad(solicitud)
+        if resultado is not None:
+            return self._decidir(MODO_IDENTIDAD, resultado)
+
+        elementos = cantidad_elementos(solicitud.operandos)
+        tipo = next((t for t in ruteo.candidatos(solicitud.operacion) if t != 'auxiliar'), operacion.tipo)
+        if elementos <= MAX_ELEMENTOS_LOCAL:
+            costo_elemento = self.costo_elemento.get(operacion.nombre, operacion.costo * self.costo_unidad)
+            costo_local = costo_elemento * elementos
+            costo_remoto = self.rtt.get(tipo, RTT_INICIAL) * (1 + en_vuelo.get(tipo, 0))
+            if costo_local <= FRACCION_LOCAL * costo_remoto:
+                return self._decidir(MODO_LOCAL, self.calcular_local(operacion, solicitud, elementos))
+
+        if operacion.vectorial and elementos >= UMBRAL_PARTICION:
+            activos = [t for t in ruteo.candidatos(solicitud.operacion) if ruteo.activo(t)]
+            if len(activos) > 1:
+                return self._decidir(MODO_PARTICIONADO, particiones=len(activos))
+        return self._decidir(MODO_UNICO)
+
+    def _decidir(self, modo, resultado=None, particiones=1):
+        self.contadores.sumar(modo)
+        return Plan(modo, resultado, particiones)
+
+    def identidad(self, solicitud):
+        """Resultado de una identidad algebraica, o None si no aplica ninguna."""
+        operandos = solicitud.operandos
+        if solicitud.operacion == 'multiplicacion' and 0 in operandos:
+            # Con un infinito o NaN el producto no es cero; los operandos no numéricos los rechaza el servidor
+            if all(_es_escalar(v) and math.isfinite(v) for v in operandos):
+                # Se multiplican los signos en el mismo orden que el producto, así que el cero sale del
+                # mismo tipo y con el mismo signo (un 0 entero antes de un flotante negativo da -0.0)
+                cero = 1
+                for v in operandos:
+                    cero *= _signo(v)
+                return self._resultado(solicitud, cero)
+        elif solicitud.operacion == 'potencia' and _es_escalar(operandos[0]) and operandos[1] in (0, 1):
+            # math.pow(x, 0) es 1.0 incluso para NaN; math.pow(x, 1) es x como flotante
+            return self._resultado(solicitud, 1.0 if operandos[1] == 0 else float(operandos[0]))
+        return None
+
+    def _resultado(self, solicitud, valor):
+        return Resultado(operacion=solicitud.operacion, resultado=valor, operandos=solicitud.operandos,
+                         servidor='calculo')
+
+    def calcular_local(self, operacion, solicitud, elementos):
+        """Ejecuta la operación en el servidor de cálculo con el mismo código que los servidores de operación."""
+        inicio = time.perf_counter()
+        respuesta = operacion.ejecutar(_decodificar(solicitud.operandos))
+        if elementos >= MIN_ELEMENTOS_MEDICION:
+            _actualizar_media(self.costo_elemento, operacion.nombre, (time.perf_counter() - inicio) / elementos)
+        if 'error' in respuesta:
+            # El prefijo lo agrega ensamblar_resultado, como a los errores de los servidores de operación
+            return Resultado(error=respuesta['error'])
+        resultado = Resultado.desde_mensaje(respuesta)
+        resultado.servidor = 'calculo'
+        return resultado
+
+    def resumen(self):
+        """Decisiones tomadas y estimaciones de costo usadas."""
+        return {
+            'habilitado': self.habilitado,
+            'decisiones': self.contadores.valores(),
+            'costo_suma_ns': self.costo_unidad * 1e9,
+            'costo_elemento_ns': {nombre: segundos * 1e9 for nombre, segundos in self.costo_elemento.items()},
+            'rtt_ms': {tipo: segundos * 1000 for tipo, segundos in self.rtt.items()},
+            'umbral_particion': UMBRAL_PARTICION
+        }
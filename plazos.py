@@ -0,0 +1,97 @@
+# plazos.py
+"""Tiempos de espera adaptativos del servidor de cálculo.
+
+Antes, las subtareas esperaban siempre 5 segundos y las verificaciones de
+estado 2. Con eso, un servidor lento pero vivo retenía hilos 5 segundos, y uno
+caído tardaba lo mismo en detectarse aunque la operación demorara
+milisegundos. Ahora el tiempo de espera de cada servidor y operación sale de
+las últimas ``MUESTRAS`` duraciones observadas: es su percentil 99 por
+``FACTOR``, acotado entre el mínimo y el máximo de cada uso.
+
+Las subtareas se agrupan además por orden de magnitud de su cantidad de
+elementos, para que un vector grande no herede el plazo de los chicos. Las
+operaciones que pueden ser pesadas (las exactas) tardan según el tamaño de sus
+números y no de la cantidad de operandos, así que usan siempre el máximo.
+Mientras no hay ``MIN_MUESTRAS`` observaciones se usa el plazo inicial de
+antes. Cuando una espera vence, se registra como observación el plazo
+vencido: si se quedó corto, el percentil sube y el próximo plazo es más
+largo.
+"""
+import math
+import os
+from collections import deque
+
+import metricas
+import operaciones
+from planificador import cantidad_elementos
+
+# Duraciones recientes que se conservan por servidor y operación
+MUESTRAS = 200
+# Observaciones necesarias antes de reemplazar el plazo inicial
+MIN_MUESTRAS = 20
+# Cada cuántas observaciones se recalcula el percentil
+RECALCULO = 10
+# El plazo es el percentil 99 observado por este factor
+FACTOR = float(os.environ.get('CALCULO_FACTOR_PLAZO', 4))
+
+
+class PlazosAdaptativos:
+    """Tiempos de espera por servidor y operación a partir de las duraciones observadas."""
+
+    def __init__(self, inicial, minimo, maximo):
+        self.inicial = inicial
+        self.minimo = minimo
+        self.maximo = maximo
+        # Clave -> duraciones recientes, observaciones totales y plazo calculado. Sin lock, como las
+        # medias del planificador: deque.append es atómico y una observación perdida no cambia el plazo
+        self._muestras = {}
+        self._observadas = {}
+        self._plazos = {}
+        self.contadores = metricas.Contadores('vencidos')
+
+    def clave(self, tipo, operacion, operandos=None):
+        """Servidor, operación y, para las que dependen del tamaño, su orden de magnitud en elementos."""
+        if operandos is None:
+            return f"{tipo}/{operacion}"
+        escala = int(math.log2(cantidad_elementos(operandos) + 1))
+        return f"{tipo}/{operacion}/{1 << escala}"
+
+    def plazo(self, clave, operacion=None):
+        """Tiempo de espera en segundos para la clave."""
+        registrada = operaciones.obtener(operacion) if operacion else None
+        if registrada is not None and registrada.pesada is not None:
+            return self.maximo
+        return self._plazos.get(clave, self.inicial)
+
+    def observar(self, clave, segundos):
+        """Registra la duración de un intercambio que terminó (o el plazo de uno que venció)."""
+        muestras = self._muestras.get(clave)
+        if muestras is None:
+            muestras = self._muestras.setdefault(clave, deque(maxlen=MUESTRAS))
+        muestras.append(segundos)
+        observadas = self._observadas.get(clave, 0) + 1
+        self._observadas[clave] = observadas
+        if observadas >= MIN_MUESTRAS and (observadas - MIN_MUESTRAS) % RECALCULO == 0:
+            self._plazos[clave] = min(self.maximo, max(self.minimo, self.percentil(muestras, 0.99) * FACTOR))
+
+    def vencido(self, clave, plazo):
+        """Registra un intercambio que superó su plazo."""
+        self.contadores.sumar('vencidos')
+        self.observar(clave, plazo)
+
+    @staticmethod
+    def percentil(muestras, fraccion):
+        ordenadas = sorted(muestras)
+        return ordenadas[min(len(ordenadas) - 1, math.ceil(fraccion * len(ordenadas)) - 1)]
+
+    def resumen(self):
+        """Plazo vigente y percentil 99 de cada clave, en milisegundos."""
+        claves = {}
+        for clave, muestras in list(self._muestras.items()):
+            claves[clave] = {
+                'muestras': len(muestras),
+                'p99_ms': self.percentil(muestras, 0.99) * 1000,
+                'plazo_ms': self._plazos.get(clave, self.inicial) * 1000
+            }
+        return {'claves': claves, 'vencidos': self.contadores.valores()['vencidos'], 'inicial_ms': self.inicial * 1000,
+                'minimo_ms': self.minimo * 1000, 'maximo_ms': self.maximo * 1000, 'factor': FACTOR}
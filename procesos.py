@@ -0,0 +1,91 @@
+# procesos.py
+"""Pool de procesos compartido para los cálculos pesados de los servidores.
+
+Un cálculo largo en Python retiene el GIL y frena a todos los hilos que
+atienden solicitudes en el mismo proceso. Las sumas grandes (``sumas.py``) y
+las llamadas pesadas de las operaciones exactas (``exacto.py``) se ejecutan en
+este pool, y el hilo de la solicitud solo espera el resultado. El pool se crea
+al primer uso con ``CALCULO_PROCESOS`` procesos (por defecto, uno por núcleo).
+"""
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metricas
+
+PROCESOS = int(os.environ.get('CALCULO_PROCESOS', os.cpu_count() or 1))
+
+_pool = None
+_lock_pool = threading.Lock()
+contadores = metricas.Contadores('tareas', 'operaciones', 'fallos_pool')
+metricas.registrar_fuente('procesos', contadores.valores)
+
+
+def _preparar_proceso():
+    """Inicializa cada proceso del pool.
+
+    Los resultados exactos pueden tener más dígitos que el límite de conversión
+    de enteros a texto de Python; los procesos del pool solo ejecutan cálculos
+    con tamaño ya validado, así que ahí se quita el límite.
+    """
+    if hasattr(sys, 'set_int_max_str_digits'):
+        sys.set_int_max_str_digits(0)
+
+
+def obtener_pool():
+    """Pool de procesos compartido, creado al primer uso.
+
+    Se usa ``spawn`` porque los servidores tienen hilos en curso al crearlo.
+    """
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PROCESOS, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_preparar_proceso)
+        return _pool
+
+
+def descartar_pool():
+    """Descarta un pool roto (por ejemplo, si murió un proceso); el próximo uso crea otro."""
+    global _pool
+    contadores.sumar('fallos_pool')
+    with _lock_pool:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def enviar(funcion, *args):
+    """Envía una tarea al pool y devuelve su futuro; ``funcion`` debe ser de nivel de módulo."""
+    contadores.sumar('tareas')
+    return obtener_pool().submit(funcion, *args)
+
+
+def _ejecutar_operacion(nombre, operandos):
+    import operaciones
+    return operaciones.REGISTRO[nombre].ejecutar(operandos, validar=False)
+
+
+def ejecutar_operacion(nombre, operandos):
+    """Ejecuta una operación del registro; si la llamada es pesada, en el pool de procesos.
+
+    Los operandos se validan antes de estimar si la llamada es pesada: la
+    estimación supone operandos válidos y los inválidos no llegan al pool. Si
+    el pool no está disponible la operación se ejecuta en este proceso.
+    """
+    import operaciones
+    operacion = operaciones.REGISTRO[nombre]
+    error = operacion.validar(operandos)
+    if error:
+        return {"error": error}
+    if operacion.pesada is None or not operacion.pesada(operandos):
+        return operacion.ejecutar(operandos, validar=False)
+    contadores.sumar('operaciones')
+    try:
+        return enviar(_ejecutar_operacion, nombre, operandos).result()
+    except (BrokenProcessPool, OSError):
+        descartar_pool()
+        return operacion.ejecutar(operandos, validar=False)
@@ -0,0 +1,331 @@
+# protocolo.py
+import json
+import os
+import struct
+import sys
+import threading
+from array import array
+
+import compresion
+import transporte
+
+# Cabecera de cada trama: banderas, códec usado, códecs que acepta el emisor,
+# longitud del JSON, longitud del bloque binario y longitud comprimida (0 si no se comprimió)
+CABECERA = struct.Struct('!BBBIII')
+# Banderas de la cabecera
+BANDERA_MEMORIA_COMPARTIDA = 0x01  # El mensaje referencia bloques en memoria compartida
+BANDERA_CONFIRMACION = 0x02        # El receptor ya copió los bloques de memoria compartida
+# Tiempo máximo de espera de la confirmación y retraso para liberar regiones no confirmadas
+TIEMPO_CONFIRMACION = 10
+RETRASO_LIBERACION = 30
+TAMANO_BUFFER_INICIAL = 64 * 1024
+MAX_BUFFERS_LIBRES = 32
+# Los buffers más grandes que esto no vuelven al pool: un mensaje enorme no deja memoria retenida
+MAX_BUFFER_REUTILIZADO = 8 * 1024 * 1024
+# Tamaño máximo de una trama (JSON más bloques, sin comprimir y comprimida); las mayores se rechazan
+# antes de reservar memoria para ellas
+MAX_TRAMA = int(os.environ.get('CALCULO_MAX_TRAMA_MB', 256)) * 1024 * 1024
+# Los arreglos viajan siempre en little-endian
+INVERTIR_BYTES = sys.byteorder != 'little'
+
+
+class ErrorProtocolo(ValueError):
+    """Trama mal formada o que supera los límites del protocolo."""
+
+
+class BloqueOperandos:
+    """Vista de solo lectura sobre un bloque binario de operandos sin decodificar.
+
+    Permite que el servidor de cálculo reenvíe los operandos tal como llegaron,
+    sin convertirlos a objetos de Python ni volver a codificarlos.
+    """
+
+    __slots__ = ('tipo', 'datos', '_vista')
+
+    def __init__(self, tipo, datos):
+        self.tipo = tipo
+        self.datos = datos
+        self._vista = memoryview(datos).cast('B').cast(tipo)
+
+    def __len__(self):
+        return len(self._vista)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            if indice.step not in (None, 1):
+                return self.a_arreglo()[indice]
+            return BloqueOperandos(self.tipo, self._vista[indice].cast('B'))
+        valor = self._vista[indice]
+        if INVERTIR_BYTES:
+            return self.a_arreglo()[indice]
+        return valor
+
+    def __iter__(self):
+        return iter(self.a_arreglo())
+
+    def __repr__(self):
+        if len(self) <= 8:
+            return repr(list(self.a_arreglo()))
+        return f"<{len(self)} operandos>"
+
+    def a_arreglo(self):
+        """Decodifica el bloque a un arreglo de Python."""
+        arreglo = array(self.tipo)
+        arreglo.frombytes(self._vista.cast('B'))
+        if INVERTIR_BYTES:
+            arreglo.byteswap()
+        return arreglo
+
+
+def describir(valor, limite=8):
+    """Representación corta de operandos o resultados para mostrar en consola."""
+    if isinstance(valor, (list, tuple, array, BloqueOperandos)):
+        if len(valor) > limite:
+            return f"<{len(valor)} valores>"
+        return '[' + ', '.join(describir(v, limite) for v in valor) + ']'
+    return str(valor)
+
+
+class PoolBuffers:
+    """Pool de buffers preasignados reutilizados entre conexiones."""
+
+    def __init__(self, tamano=TAMANO_BUFFER_INICIAL):
+        self.tamano = tamano
+        self._libres = []
+        self._lock = threading.Lock()
+
+    def obtener(self, tamano_minimo):
+        with self._lock:
+            for i, buffer in enumerate(self._libres):
+                if len(buffer) >= tamano_minimo:
+                    return self._libres.pop(i)
+        return bytearray(max(self.tamano, tamano_minimo))
+
+    def liberar(self, buffer):
+        if len(buffer) > MAX_BUFFER_REUTILIZADO:
+            return
+        with self._lock:
+            if len(self._libres) < MAX_BUFFERS_LIBRES:
+                self._libres.append(buffer)
+
+
+pool_buffers = PoolBuffers()
+
+
+def es_arreglo_flotante(valores):
+    """Indica si una lista de operandos puede viajar como bloque binario de dobles."""
+    return bool(valores) and all(type(v) is float for v in valores)
+
+
+def a_arreglo(valores):
+    """Convierte una lista de flotantes a un arreglo; otros valores se dejan intactos."""
+    if isinstance(valores, list) and es_arreglo_flotante(valores):
+        return array('d', valores)
+    if isinstance(valores, list) and any(isinstance(v, list) for v in valores):
+        # Operandos vectoriales: cada vector viaja como su propio bloque
+        return [a_arreglo(v) for v in valores]
+    return valores
+
+
+def _bytes_de(valor):
+    """Obtiene los bytes little-endian de un arreglo o bloque."""
+    if isinstance(valor, BloqueOperandos):
+        return valor.tipo, valor._vista.cast('B')
+    if INVERTIR_BYTES:
+        valor = array(valor.typecode, valor)
+        valor.byteswap()
+    return valor.typecode, memoryview(valor).cast('B')
+
+
+def codificar_mensaje(mensaje, banderas=0, regiones=None, sock=None):
+    """Codifica un mensaje en una lista de fragmentos listos para enviar.
+
+    Los arreglos (``array.array``) y bloques de operandos que aparezcan en
+    cualquier nivel del mensaje se sacan del JSON y se envían como bytes crudos.
+    Si se pasa la lista ``regiones``, los bloques grandes se copian al anillo de
+    memoria compartida y en el mensaje solo viaja su descriptor; las regiones
+    usadas se agregan a la lista. Si se pasa ``sock``, el cuerpo se comprime con
+    un códec negociado con ese extremo cuando supera el umbral.
+    """
+    bloques = []
+    desplazamiento = [0]
+
+    def extraer_bloque(valor):
+        if isinstance(valor, (array, BloqueOperandos)):
+            tipo, datos = _bytes_de(valor)
+            if regiones is not None and len(datos) >= transporte.UMBRAL_MEMORIA_COMPARTIDA:
+                region = transporte.anillo.escribir(datos)
+                if region is not None:
+                    regiones.append(region)
+                    return {'__bloque_mc__': [tipo, transporte.anillo.nombre, region[0], len(datos)]}
+            referencia = {'__bloque__': [tipo, desplazamiento[0], len(datos)]}
+            bloques.append(datos)
+            desplazamiento[0] += len(datos)
+            return referencia
+        raise TypeError(f"Objeto no serializable: {type(valor).__name__}")
+
+    cuerpo = json.dumps(mensaje, default=extraer_bloque, separators=(',', ':')).encode('utf-8')
+    if regiones:
+        banderas |= BANDERA_MEMORIA_COMPARTIDA
+    fragmentos = [cuerpo] + bloques
+    if sock is not None:
+        codec, comprimido = compresion.comprimir(sock, fragmentos, len(cuerpo) + desplazamiento[0])
+        if codec != compresion.CODEC_NINGUNO:
+            cabecera = CABECERA.pack(banderas, codec, compresion.CODECS_ACEPTADOS,
+                                     len(cuerpo), desplazamiento[0], len(comprimido))
+            return [cabecera, comprimido]
+    cabecera = CABECERA.pack(banderas, compresion.CODEC_NINGUNO, compresion.CODECS_ACEPTADOS,
+                             len(cuerpo), desplazamiento[0], 0)
+    return [cabecera] + fragmentos
+
+
+def enviar_mensaje(sock, mensaje, banderas=0):
+    """Envía un mensaje enmarcado por el socket.
+
+    En conexiones locales los bloques grandes viajan por memoria compartida y se
+    espera la confirmación del receptor antes de reutilizar sus regiones.
+    """
+    if not transporte.es_socket_local(sock):
+        _enviar_fragmentos(sock, codificar_mensaje(mensaje, banderas, sock=sock))
+        return
+
+    regiones = []
+    retraso = RETRASO_LIBERACION
+    try:
+        _enviar_fragmentos(sock, codificar_mensaje(mensaje, banderas, regiones))
+        if regiones:
+            _esperar_confirmacion(sock)
+        retraso = 0
+    finally:
+        for region in regiones:
+            transporte.anillo.liberar(region, retraso)
+
+
+def _esperar_confirmacion(sock):
+    """Espera la trama con la que el receptor confirma que copió los bloques compartidos."""
+    timeout_anterior = sock.gettimeout()
+    sock.settimeout(TIEMPO_CONFIRMACION)
+    try:
+        cabecera = bytearray(CABECERA.size)
+        recibir_exacto(sock, memoryview(cabecera))
+        if not CABECERA.unpack(cabecera)[0] & BANDERA_CONFIRMACION:
+            raise ConnectionError("Se esperaba la confirmación de memoria compartida")
+    finally:
+        sock.settimeout(timeout_anterior)
+
+
+def _enviar_fragmentos(sock, fragmentos):
+    if hasattr(sock, 'sendmsg'):
+        total = sum(len(f) for f in fragmentos)
+        enviados = sock.sendmsg(fragmentos)
+        if enviados == total:
+            return
+        sock.sendall(b''.join(fragmentos)[enviados:])
+    else:
+        sock.sendall(b''.join(fragmentos))
+
+
+def recibir_exacto(sock, vista):
+    """Llena por completo la vista con datos del socket usando recv_into."""
+    recibidos = 0
+    total = len(vista)
+    while recibidos < total:
+        n = sock.recv_into(vista[recibidos:], total - recibidos)
+        if n == 0:
+            raise ConnectionError("Conexión cerrada por el otro extremo")
+        recibidos += n
+
+
+def _decodificador(binario, decodificar_operandos):
+    """Construye el object_hook que reemplaza referencias por arreglos o bloques."""
+
+    def reconstruir(objeto):
+        if '__bloque__' in objeto:
+            tipo, inicio, longitud = objeto['__bloque__']
+            datos = binario[inicio:inicio + longitud]
+        elif '__bloque_mc__' in objeto:
+            tipo, nombre, inicio, longitud = objeto['__bloque_mc__']
+            datos = transporte.leer_memoria_compartida(nombre, inicio, longitud)
+        else:
+            return objeto
+        if decodificar_operandos:
+            arreglo = array(tipo)
+            arreglo.frombytes(datos)
+            if INVERTIR_BYTES:
+                arreglo.byteswap()
+            return arreglo
+        return BloqueOperandos(tipo, bytes(datos))
+
+    return reconstruir
+
+
+def _validar_longitudes(longitud_json, longitud_binario, longitud_comprimida):
+    """Rechaza las tramas cuya cabecera declara más de ``MAX_TRAMA`` bytes."""
+    if longitud_json + longitud_binario > MAX_TRAMA or longitud_comprimida > MAX_TRAMA:
+        raise ErrorProtocolo(f"Trama de {longitud_json + longitud_binario} bytes "
+                             f"({longitud_comprimida} comprimidos): supera el máximo de {MAX_TRAMA}")
+
+
+def _decodificar_cuerpo(vista, banderas, longitud_json, longitud_binario, decodificar_operandos):
+    """Decodifica el JSON de una trama y reconstruye sus bloques binarios."""
+    texto = str(vista[:longitud_json], 'utf-8')
+    if longitud_binario == 0 and not banderas & BANDERA_MEMORIA_COMPARTIDA:
+        return json.loads(texto)
+    return json.loads(texto, object_hook=_decodificador(vista[longitud_json:], decodificar_operandos))
+
+
+def escribir_mensaje(archivo, mensaje):
+    """Escribe un mensaje enmarcado en un archivo binario (sin compresión ni memoria compartida)."""
+    for fragmento in codificar_mensaje(mensaje):
+        archivo.write(fragmento)
+
+
+def leer_mensaje(archivo, decodificar_operandos=True):
+    """Lee un mensaje escrito con ``escribir_mensaje``; devuelve None al final del archivo."""
+    cabecera = archivo.read(CABECERA.size)
+    if len(cabecera) < CABECERA.size:
+        return None
+    banderas, codec, _, longitud_json, longitud_binario, longitud_comprimida = CABECERA.unpack(cabecera)
+    _validar_longitudes(longitud_json, longitud_binario, longitud_comprimida)
+    total = longitud_json + longitud_binario
+    datos = archivo.read(longitud_comprimida if codec else total)
+    if codec:
+        datos = compresion.descomprimir(codec, datos, total)
+    if len(datos) != total:
+        return None
+    return _decodificar_cuerpo(memoryview(datos), banderas, longitud_json, longitud_binario, decodificar_operandos)
+
+
+def recibir_mensaje(sock, decodificar_operandos=True):
+    """Recibe un mensaje enmarcado.
+
+    Con ``decodificar_operandos=False`` los bloques binarios se devuelven como
+    ``BloqueOperandos`` para poder reenviarlos sin decodificarlos.
+    """
+    cabecera = bytearray(CABECERA.size)
+    recibir_exacto(sock, memoryview(cabecera))
+    banderas, codec, codecs_aceptados, longitud_json, longitud_binario, longitud_comprimida = \
+        CABECERA.unpack(cabecera)
+    _validar_longitudes(longitud_json, longitud_binario, longitud_comprimida)
+    if not transporte.es_socket_local(sock):
+        compresion.registrar_codecs_par(sock, codecs_aceptados)
+
+    total = longitud_json + longitud_binario
+    buffer = pool_buffers.obtener(longitud_comprimida if codec else total)
+    try:
+        if codec:
+            recibir_exacto(sock, memoryview(buffer)[:longitud_comprimida])
+            vista = memoryview(compresion.descomprimir(codec, memoryview(buffer)[:longitud_comprimida], total))
+            if len(vista) != total:
+                raise ErrorProtocolo("Longitud descomprimida inconsistente con la cabecera")
+        else:
+            vista = memoryview(buffer)[:total]
+            recibir_exacto(sock, vista)
+        mensaje = _decodificar_cuerpo(vista, banderas, longitud_json, longitud_binario, decodificar_operandos)
+        if banderas & BANDERA_MEMORIA_COMPARTIDA:
+            # Los bloques ya se copiaron: el emisor puede reutilizar sus regiones
+            sock.sendall(CABECERA.pack(BANDERA_CONFIRMACION, compresion.CODEC_NINGUNO,
+                                       compresion.CODECS_ACEPTADOS, 0, 0, 0))
+        return mensaje
+    finally:
+        pool_buffers.liberar(buffer)
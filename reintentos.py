@@ -0,0 +1,77 @@
+# reintentos.py
+"""Política de reintentos del servidor de cálculo hacia los servidores de operación.
+
+Una subtarea que falla se reintenta hasta completar ``MAX_INTENTOS`` intentos
+en total. Va primero al servidor principal y al auxiliar que estén activos y,
+si ninguno lo está, otra vez al último, por si la falla fue pasajera. Antes de
+cada reintento se espera un tiempo al azar entre 0 y ``BASE * 2**intento``,
+como mucho ``TOPE`` (retroceso exponencial con jitter completo). Así, los
+hilos que fallaron juntos no vuelven a la vez al mismo servidor.
+
+Los reintentos tienen además un presupuesto global. Cada subtarea enviada suma
+``PROPORCION`` de un reintento al saldo, y cada reintento gasta uno. El saldo
+no pasa de ``SALDO_MAXIMO``, así que, sostenidos en el tiempo, los reintentos
+no superan esa proporción del tráfico. Cuando todo un nivel de servidores está
+degradado, las subtareas fallan en vez de multiplicar la carga sobre el
+auxiliar. Los errores que devuelve la propia operación no se reintentan.
+"""
+import os
+import random
+import threading
+import time
+
+import metricas
+
+# Intentos por subtarea, contando el primero
+MAX_INTENTOS = int(os.environ.get('CALCULO_MAX_INTENTOS', 3))
+# Espera base y máxima entre intentos, en segundos
+BASE = float(os.environ.get('CALCULO_REINTENTO_BASE_MS', 10)) / 1000
+TOPE = float(os.environ.get('CALCULO_REINTENTO_TOPE_MS', 500)) / 1000
+# Reintentos permitidos por subtarea enviada (0.1: hasta un 10 % del tráfico)
+PROPORCION = float(os.environ.get('CALCULO_PRESUPUESTO_REINTENTOS', 0.1))
+# Saldo máximo de reintentos acumulados (también el inicial, para poder reintentar desde el arranque)
+SALDO_MAXIMO = 10.0
+
+
+class PoliticaReintentos:
+    """Intentos, espera entre intentos y presupuesto global de reintentos."""
+
+    def __init__(self, max_intentos=MAX_INTENTOS, base=BASE, tope=TOPE, proporcion=PROPORCION):
+        self.max_intentos = max_intentos
+        self.base = base
+        self.tope = tope
+        self.proporcion = proporcion
+        self.saldo = SALDO_MAXIMO
+        self._lock = threading.Lock()
+        self.contadores = metricas.Contadores('reintentos', 'sin_presupuesto', 'agotados')
+        metricas.registrar_fuente('reintentos', self.resumen)
+
+    def registrar_envio(self):
+        """Cuenta una subtarea enviada por primera vez: suma su parte al presupuesto."""
+        with self._lock:
+            self.saldo = min(SALDO_MAXIMO, self.saldo + self.proporcion)
+
+    def autorizar(self, intento):
+        """Si se puede hacer el intento número ``intento`` (el primero es 1); gasta saldo si se autoriza."""
+        if intento > self.max_intentos:
+            self.contadores.sumar('agotados')
+            return False
+        with self._lock:
+            if self.saldo < 1:
+                autorizado = False
+            else:
+                self.saldo -= 1
+                autorizado = True
+        self.contadores.sumar('reintentos' if autorizado else 'sin_presupuesto')
+        return autorizado
+
+    def esperar(self, intento):
+        """Espera antes del intento número ``intento`` con retroceso exponencial y jitter completo."""
+        time.sleep(random.uniform(0, min(self.tope, self.base * 2 ** (intento - 2))))
+
+    def resumen(self):
+        """Reintentos hechos y negados, y saldo del presupuesto."""
+        resumen = self.contadores.valores()
+        resumen.update({'saldo': self.saldo, 'max_intentos': self.max_intentos, 'proporcion': self.proporcion,
+                        'base_ms': self.base * 1000, 'tope_ms': self.tope * 1000})
+        return resumen
@@ -1,24 +1,54 @@
 # servidor_auxiliar.py
+import itertools
 import socket
 import json
-import math
 import threading
 import time
+from array import array
+
+import agrupador
+import ciclo_vida
+import flujo
+import idempotencia
+import metricas
+import operaciones
+import procesos
+import trazas
+import transporte
+from coordinadores import coordinadores_configurados
+from protocolo import describir, enviar_mensaje, recibir_mensaje
 
 class ServidorAuxiliar:
     def __init__(self, host='localhost', puerto=5003):
         self.host = host
         self.puerto = puerto
-        self.contador_solicitudes = 0
+        # Identificadores de solicitud únicos entre hilos (next sobre itertools.count es atómico)
+        self.ids_solicitud = itertools.count(1)
+        # Solicitudes atendidas y con error, contadas por hilo y sumadas al consultar las métricas
+        self.contadores = metricas.Contadores('solicitudes', 'errores')
+        metricas.registrar_fuente('solicitudes', self.contadores.valores)
+        # Respuestas recientes por clave de idempotencia, para no calcular dos veces una subtarea reintentada
+        self.idempotencia = idempotencia.TablaIdempotencia()
+        # Nombre del archivo de trazas de este proceso
+        trazas.escritor.configurar("auxiliar")
+        # Drenado con SIGTERM y reinicio en caliente con SIGUSR2
+        self.ciclo = ciclo_vida.CicloVida("auxiliar")
+        # El servidor auxiliar ejecuta todas las operaciones de los servidores de operación
+        self.operaciones = operaciones.operaciones_de_tipo(operaciones.TIPO_ARITMETICO, operaciones.TIPO_AVANZADO,
+                                                          operaciones.TIPO_ALGEBRA_LINEAL)
         # Configuración para los servidores de operación
         self.servidores_operacion = {
             'aritmetico': {'host': 'localhost', 'puerto': 5001},
-            'avanzado': {'host': 'localhost', 'puerto': 5002}
+            'avanzado': {'host': 'localhost', 'puerto': 5002},
+            'algebra_lineal': {'host': 'localhost', 'puerto': 5004}
         }
+        # Servidores de cálculo a los que se notifican los cambios de estado (todos los del clúster)
+        self.coordinadores = coordinadores_configurados() or [('localhost', 5000)]
         # Estado de los servidores
         self.estado_servidores = {
             'aritmetico': {'activo': False, 'ultima_verificacion': 0},
-            'avanzado': {'activo': False, 'ultima_verificacion': 0}
+            'avanzado': {'activo': False, 'ultima_verificacion': 0},
+            'algebra_lineal': {'activo': False, 'ultima_verificacion': 0}
         }
         
     def iniciar(self):
@@ -29,26 +59,19 @@ class ServidorAuxiliar:
             hilo_monitoreo.daemon = True
             hilo_monitoreo.start()
             
-            # Crear socket del servidor
-            servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # Permitir reutilizar la dirección
-            servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            # Vincular socket a dirección y puerto
-            servidor.bind((self.host, self.puerto))
-            # Escuchar conexiones entrantes (máximo 5 en cola)
-            servidor.listen(5)
+            # Crear sockets del servidor (o heredarlos en un reinicio en caliente): TCP y socket Unix
+            servidores = self.ciclo.sockets_escucha(self.host, self.puerto)
             
             # Mostrar encabezado del servidor
             self.mostrar_encabezado_servidor()
             
             # Ciclo de aceptación de conexiones
-            while True:
-                cliente_socket, direccion = servidor.accept()
+            for cliente_socket, direccion in self.ciclo.aceptar(servidores):
                 print(f"\nConexión aceptada desde {direccion[0]}:{direccion[1]}")
                 # Crear hilo para manejar la solicitud
                 hilo_cliente = threading.Thread(
-                    target=self.manejar_solicitud,
-                    args=(cliente_socket, direccion)
+                    target=self.ciclo.atender,
+                    args=(self.manejar_solicitud, cliente_socket, direccion, time.time())
                 )
                 hilo_cliente.daemon = True
                 hilo_cliente.start()
@@ -58,14 +81,13 @@ class ServidorAuxiliar:
         except Exception as e:
             print(f"\nError en el servidor auxiliar: {str(e)}")
         finally:
-            if 'servidor' in locals() and servidor:
-                servidor.close()
+            if 'servidores' in locals():
+                self.ciclo.terminar(servidores)
     
     def monitorear_servidores(self):
         """Monitorea periódicamente el estado de los servidores de operación."""
-        # También monitorear el servidor de cálculo
-        servidor_calculo = {'host': 'localhost', 'puerto': 5000}
-        estado_servidor_calculo = False
+        # También monitorear los servidores de cálculo
+        estado_coordinadores = dict.fromkeys(self.coordinadores, False)
         
         while True:
             # Verificar servidores de operación
@@ -79,21 +101,26 @@ class ServidorAuxiliar:
                 if activo != estado_anterior:
                     if activo:
                         print(f"\n✅ Servidor {tipo} está ACTIVO nuevamente")
-                        # Notificar al servidor de cálculo que el servidor original está activo nuevamente
-                        self.notificar_cambio_estado(servidor_calculo['host'], servidor_calculo['puerto'], tipo, True)
+                        # Notificar a los servidores de cálculo que el servidor original está activo nuevamente
+                        self.notificar_coordinadores(tipo, True)
                     else:
                         print(f"\n❌ Servidor {tipo} está INACTIVO - Asumiendo sus funciones")
-                        # Notificar al servidor de cálculo que el servidor está inactivo y el auxiliar asumirá sus funciones
-                        self.notificar_cambio_estado(servidor_calculo['host'], servidor_calculo['puerto'], tipo, False)
+                        # Notificar a los servidores de cálculo que el servidor está inactivo y el auxiliar asumirá sus funciones
+                        self.notificar_coordinadores(tipo, False)
             
-            # Verificar servidor de cálculo
-            activo_calculo = self.verificar_servidor(servidor_calculo['host'], servidor_calculo['puerto'])
-            if activo_calculo != estado_servidor_calculo:
-                estado_servidor_calculo = activo_calculo
-                if activo_calculo:
-                    print(f"\n✅ Servidor de cálculo está ACTIVO")
-                else:
-                    print(f"\n❌ Servidor de cálculo está INACTIVO")
+            # Verificar servidores de cálculo (los clientes pasan solos a otro si uno cae)
+            for host, puerto in self.coordinadores:
+                activo_calculo = self.verificar_servidor(host, puerto)
+                if activo_calculo != estado_coordinadores[(host, puerto)]:
+                    estado_coordinadores[(host, puerto)] = activo_calculo
+                    if activo_calculo:
+                        print(f"\n✅ Servidor de cálculo {host}:{puerto} está ACTIVO")
+                        # Un coordinador que vuelve arranca sin saber qué servidores reemplaza el auxiliar
+                        for tipo, estado in self.estado_servidores.items():
+                            if not estado['activo']:
+                                self.notificar_cambio_estado(host, puerto, tipo, False)
+                    else:
+                        print(f"\n❌ Servidor de cálculo {host}:{puerto} está INACTIVO")
             
             # Mostrar estado actual cada 10 segundos
             if int(time.time()) % 10 == 0:
@@ -102,12 +129,15 @@ class ServidorAuxiliar:
             # Esperar antes de la próxima verificación
             time.sleep(5)
 
+    def notificar_coordinadores(self, tipo_servidor, activo):
+        """Notifica un cambio de estado a todos los servidores de cálculo."""
+        for host, puerto in self.coordinadores:
+            self.notificar_cambio_estado(host, puerto, tipo_servidor, activo)
+
     def notificar_cambio_estado(self, host, puerto, tipo_servidor, activo):
         """Notifica al servidor de cálculo sobre un cambio en el estado de un servidor de operación."""
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(2)  # Timeout de 2 segundos
-                s.connect((host, puerto))
+            with transporte.conectar(host, puerto, timeout=2) as s:  # Timeout de 2 segundos
                 
                 # Crear mensaje de notificación
                 mensaje = {
@@ -119,12 +149,12 @@ class ServidorAuxiliar:
                 }
                 
                 # Enviar notificación
-                s.sendall(json.dumps(mensaje).encode('utf-8'))
+                enviar_mensaje(s, mensaje)
                 
                 # Intentar recibir confirmación (no es crítico)
                 try:
-                    s.recv(1024)
-                except socket.timeout:
+                    recibir_mensaje(s)
+                except (socket.timeout, ConnectionError):
                     pass
                     
                 print(f"Notificación enviada al servidor de cálculo: Servidor {tipo_servidor} {'ACTIVO' if activo else 'INACTIVO'}")
@@ -137,32 +167,26 @@ class ServidorAuxiliar:
     def verificar_servidor(self, host, puerto):
         """Verifica si un servidor está activo intentando conectarse a él y enviando un mensaje de verificación."""
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(2)  # Timeout de 2 segundos
-                s.connect((host, puerto))
+            with transporte.conectar(host, puerto, timeout=2) as s:  # Timeout de 2 segundos
                 
                 # Enviar un mensaje de verificación con formato JSON válido
                 mensaje_verificacion = {
                     "operacion": "verificar_estado",
                     "operandos": []
                 }
-                s.sendall(json.dumps(mensaje_verificacion).encode('utf-8'))
+                enviar_mensaje(s, mensaje_verificacion)
                 
                 # Intentar recibir respuesta y verificar que sea válida
                 try:
-                    respuesta_data = s.recv(1024)
-                    if not respuesta_data:
-                        return False
-                    
                     # Intentar decodificar la respuesta como JSON
                     try:
-                        respuesta = json.loads(respuesta_data.decode('utf-8'))
+                        respuesta = recibir_mensaje(s)
                         # Verificar que la respuesta contenga el campo "estado"
                         if 'estado' in respuesta and respuesta['estado'] == 'activo':
                             return True
                         else:
                             return False
-                    except json.JSONDecodeError:
+                    except (json.JSONDecodeError, ConnectionError):
                         return False
                         
                 except socket.timeout:
@@ -188,10 +212,10 @@ class ServidorAuxiliar:
             ultima = time.strftime('%H:%M:%S', time.localtime(estado['ultima_verificacion']))
             print(f"Servidor {tipo.upper()}: {activo} (última verificación: {ultima})")
         
-        # También mostrar estado del servidor de cálculo
-        servidor_calculo = {'host': 'localhost', 'puerto': 5000}
-        activo_calculo = self.verificar_servidor(servidor_calculo['host'], servidor_calculo['puerto'])
-        print(f"Servidor CÁLCULO: {'✅ ACTIVO' if activo_calculo else '❌ INACTIVO'}")
+        # También mostrar estado de los servidores de cálculo
+        for host, puerto in self.coordinadores:
+            activo_calculo = self.verificar_servidor(host, puerto)
+            print(f"Servidor CÁLCULO {host}:{puerto}: {'✅ ACTIVO' if activo_calculo else '❌ INACTIVO'}")
         
         print("=" * ancho)
     
@@ -201,67 +225,120 @@ class ServidorAuxiliar:
         print("=" * ancho)
         print(f"{'SERVIDOR AUXILIAR CON TOLERANCIA A FALLOS':^{ancho}}")
         print(f"{'Escuchando en ' + self.host + ':' + str(self.puerto):^{ancho}}")
-        print(f"{'Operaciones soportadas: todas (respaldo)':^{ancho}}")
+        print(f"{'Operaciones soportadas: todas (respaldo) - ' + ', '.join(self.operaciones):^{ancho}}")
         print("-" * ancho)
         print(f"{'Iniciado: ' + time.strftime('%Y-%m-%d %H:%M:%S'):^{ancho}}")
         print("=" * ancho)
                 
-    def manejar_solicitud(self, cliente_socket, direccion):
+    def manejar_solicitud(self, cliente_socket, direccion, hora_aceptacion=None):
         """Maneja una solicitud de cálculo individual."""
         try:
             # Recibir datos
-            datos = cliente_socket.recv(4096).decode('utf-8')
-            solicitud = json.loads(datos)
+            inicio_lectura = time.time()
+            solicitud = recibir_mensaje(cliente_socket)
+            fin_lectura = time.time()
             
             # Verificar si es una solicitud de verificación de estado
             if 'operacion' in solicitud and solicitud['operacion'] == 'verificar_estado':
                 # Responder directamente sin realizar ningún cálculo
                 respuesta = {
-                    "estado": "activo",
-                    "tipo": "auxiliar"
+                    "estado": self.ciclo.estado,
+                    "tipo": "auxiliar",
+                    "operaciones": self.operaciones
                 }
-                cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+                enviar_mensaje(cliente_socket, respuesta)
+                return
+            
+            # Consultar métricas del servidor (compresión, etc.)
+            if 'operacion' in solicitud and solicitud['operacion'] == 'obtener_metricas':
+                enviar_mensaje(cliente_socket, metricas.instantanea())
+                return
+            
+            # Lote de subtareas chicas agrupadas por el servidor de cálculo: se calculan en una pasada
+            if 'operacion' in solicitud and solicitud['operacion'] == 'lote_subtareas':
+                enviar_mensaje(cliente_socket, agrupador.realizar_lote(
+                    self, solicitud, "auxiliar", "Solicitud inválida para el servidor auxiliar"))
                 return
             
             # Para solicitudes normales, continuar con el procesamiento habitual
-            self.contador_solicitudes += 1
-            id_solicitud = self.contador_solicitudes
+            id_solicitud = next(self.ids_solicitud)
+            self.contadores.sumar('solicitudes')
             hora_recepcion = time.strftime('%H:%M:%S')
             
+            # Traza de la solicitud: la espera en cola y la lectura ya están medidas
+            traza = trazas.Traza(solicitud.get('traza'), "auxiliar")
+            if hora_aceptacion is not None:
+                traza.registrar('espera_cola', hora_aceptacion, inicio_lectura)
+            traza.registrar('lectura', inicio_lectura, fin_lectura)
+            
             # Mostrar información de la solicitud recibida
             self.mostrar_solicitud_recibida(id_solicitud, hora_recepcion, direccion, solicitud)
             
             # Validar solicitud
             if not self.validar_solicitud(solicitud):
+                self.contadores.sumar('errores')
                 respuesta = {"error": "Solicitud inválida para el servidor auxiliar"}
-                cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+                enviar_mensaje(cliente_socket, respuesta)
                 self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
                 return
                     
+            # Respuesta por fragmentos: el resultado se calcula y se envía de a tramos (ver flujo.py)
+            if solicitud.get('transmitir'):
+                tiempo_inicio = time.time()
+                resultado = flujo.emitir(cliente_socket, solicitud['operacion'], solicitud['operandos'],
+                                         flujo.tamano_fragmento(solicitud['transmitir']))
+                tiempo_fin = time.time()
+                traza.registrar('calculo', tiempo_inicio, tiempo_fin, operacion=solicitud['operacion'],
+                                fragmentos=resultado.get('fragmentos'))
+                if 'error' not in resultado:
+                    resultado["servidor"] = "auxiliar"
+                tramos = traza.para_respuesta()
+                if tramos:
+                    resultado['traza'] = tramos
+                if 'error' in resultado:
+                    self.contadores.sumar('errores')
+                    print(f"\nError en la respuesta por fragmentos: {resultado['error']}")
+                else:
+                    print(f"\nRespuesta por fragmentos: {resultado['fragmentos']} fragmentos, "
+                          f"{resultado['elementos']} elementos en {tiempo_fin - tiempo_inicio:.6f} segundos")
+                enviar_mensaje(cliente_socket, resultado)
+                return
+                
             # Realizar cálculo
             tiempo_inicio = time.time()
-            resultado = self.realizar_calculo(solicitud)
+            # Una subtarea reintentada con la misma clave no se calcula dos veces
+            resultado = self.idempotencia.ejecutar(solicitud.get('clave'), lambda: self.realizar_calculo(solicitud))
             tiempo_fin = time.time()
             tiempo_calculo = tiempo_fin - tiempo_inicio
+            traza.registrar('calculo', tiempo_inicio, tiempo_fin, operacion=solicitud['operacion'])
+            # Los tramos vuelven al servidor de cálculo junto con el resultado
+            tramos = traza.para_respuesta()
+            if tramos:
+                resultado['traza'] = tramos
             
             # Mostrar resultado calculado
             self.mostrar_resultado_calculado(id_solicitud, resultado, tiempo_calculo)
             
             # Enviar resultado
-            cliente_socket.sendall(json.dumps(resultado).encode('utf-8'))
+            with traza.tramo('serializacion'):
+                enviar_mensaje(cliente_socket, resultado)
             
         except json.JSONDecodeError:
+            self.contadores.sumar('errores')
             respuesta = {"error": "Formato JSON inválido"}
-            cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+            enviar_mensaje(cliente_socket, respuesta)
             if 'id_solicitud' in locals():
                 self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
         except Exception as e:
+            self.contadores.sumar('errores')
             respuesta = {"error": f"Error en el cálculo: {str(e)}"}
-            cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+            enviar_mensaje(cliente_socket, respuesta)
             if 'id_solicitud' in locals():
                 self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
         finally:
             cliente_socket.close()
+            if 'traza' in locals():
+                traza.finalizar()
     
     def mostrar_solicitud_recibida(self, id_solicitud, hora, direccion, solicitud):
         """Muestra información detallada sobre la solicitud recibida."""
@@ -273,7 +350,7 @@ class ServidorAuxiliar:
         # Detalles de la operación
         if 'operacion' in solicitud and 'operandos' in solicitud:
             op = solicitud['operacion'].upper()
-            ops = str(solicitud['operandos'])
+            ops = describir(solicitud['operandos'])
             print(f"▶ Operación: {op}")
             print(f"▶ Operandos: {ops}")
             print(f"▶ Tipo: {solicitud.get('tipo', 'No especificado')}")
@@ -302,8 +379,11 @@ class ServidorAuxiliar:
             print(f"ERROR: {resultado['error']}")
         else:
             print(f"✓ Operación: {resultado['operacion']}")
-            print(f"✓ Operandos: {resultado['operandos']}")
-            print(f"✓ Resultado: {resultado['resultado']}")
+            if 'operandos' in resultado:
+                print(f"✓ Operandos: {describir(resultado['operandos'])}")
+            print(f"✓ Resultado: {describir(resultado['resultado'])}")
+            if 'errores' in resultado:
+                print(f"✓ Elementos con error de dominio: {resultado['cantidad_errores']}")
             
             # Mostrar información adicional según la operación
             if resultado['operacion'] == 'potencia':
@@ -338,11 +418,8 @@ class ServidorAuxiliar:
             return True
                 
         # El servidor auxiliar acepta todos los tipos de operaciones
-        operaciones_aritmeticas = ['suma', 'resta', 'multiplicacion', 'division']
-        operaciones_avanzadas = ['potencia', 'raiz', 'logaritmo']
-        
-        if solicitud['operacion'] in operaciones_aritmeticas + operaciones_avanzadas:
-            return isinstance(solicitud['operandos'], list)
+        if solicitud['operacion'] in self.operaciones:
+            return isinstance(solicitud['operandos'], (list, array))
         
         return False
         
@@ -353,70 +430,29 @@ class ServidorAuxiliar:
 
         if operacion == 'verificar_estado':
             return {
-                "estado": "activo",
-                "tipo": "auxiliar"
+                "estado": self.ciclo.estado,
+                "tipo": "auxiliar",
+                "operaciones": self.operaciones
             }
 
-        # Usar el tipo especificado en la solicitud o determinarlo automáticamente
+        # Usar el tipo especificado en la solicitud o el declarado en el registro
         tipo = solicitud.get('tipo', self.determinar_tipo_operacion(operacion))
         
         print(f"Servidor auxiliar realizando cálculo: {operacion} (tipo: {tipo})")
         
-        try:
-            # Operaciones aritméticas
-            if tipo == 'aritmetico':
-                if operacion == 'suma':
-                    resultado = sum(operandos)
-                elif operacion == 'resta':
-                    resultado = operandos[0] - sum(operandos[1:])
-                elif operacion == 'multiplicacion':
-                    resultado = 1
-                    for operando in operandos:
-                        resultado *= operando
-                elif operacion == 'division':
-                    if operandos[1] == 0:
-                        return {"error": "División por cero"}
-                    resultado = operandos[0] / operandos[1]
-                else:
-                    return {"error": f"Operación aritmética no soportada: {operacion}"}
-            
-            # Operaciones avanzadas
-            elif tipo == 'avanzado':
-                if operacion == 'potencia':
-                    resultado = math.pow(operandos[0], operandos[1])
-                elif operacion == 'raiz':
-                    if operandos[0] < 0 and operandos[1] % 2 == 0:
-                        return {"error": "No se puede calcular raíz par de número negativo"}
-                    resultado = math.pow(operandos[0], 1/operandos[1])
-                elif operacion == 'logaritmo':
-                    if operandos[0] <= 0 or operandos[1] <= 0 or operandos[1] == 1:
-                        return {"error": "Argumentos inválidos para logaritmo"}
-                    resultado = math.log(operandos[0], operandos[1])
-                else:
-                    return {"error": f"Operación avanzada no soportada: {operacion}"}
-            else:
-                return {"error": f"Tipo de operación no reconocido: {tipo}"}
-                
-            return {
-                "operacion": operacion,
-                "operandos": operandos,
-                "resultado": resultado,
-                "servidor": "auxiliar"  # Indicar que el cálculo fue realizado por el servidor auxiliar
-            }
+        if operacion not in self.operaciones:
+            return {"error": f"Operación no soportada: {operacion}"}
             
-        except IndexError:
-            return {"error": "Número insuficiente de operandos"}
-        except Exception as e:
-            return {"error": f"Error en el cálculo: {str(e)}"}
+        # Las llamadas pesadas se ejecutan en el pool de procesos para no retener el GIL
+        resultado = procesos.ejecutar_operacion(operacion, operandos)
+        if 'error' not in resultado:
+            resultado["servidor"] = "auxiliar"  # Indicar que el cálculo fue realizado por el servidor auxiliar
+        return resultado
         
     def determinar_tipo_operacion(self, operacion):
-        """Determina el tipo de operación basado en su nombre."""
-        if operacion in ['suma', 'resta', 'multiplicacion', 'division']:
-            return 'aritmetico'
-        elif operacion in ['potencia', 'raiz', 'logaritmo']:
-            return 'avanzado'
-        else:
-            return 'desconocido'
+        """Determina el tipo de operación a partir del registro de operaciones."""
+        operacion_registrada = operaciones.obtener(operacion)
+        return operacion_registrada.tipo if operacion_registrada else 'desconocido'
 
 if __name__ == "__main__":
     servidor = ServidorAuxiliar()
@@ -1,24 +1,103 @@
-import socket
 import json
+import os
 import threading
 import time
+import uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import agrupador
+import ciclo_vida
+import flujo
+import metricas
+import operaciones
+import planificador
+import plazos
+import reintentos
+import trabajos
+import trazas
+import transporte
+from captura import CapturaTrafico
+from enrutamiento import TablaEnrutamiento
+from mensajes import Resultado, Solicitud, Subtarea
+from protocolo import BloqueOperandos, describir, enviar_mensaje, recibir_mensaje
+
+# Subtareas en curso en un servidor principal a partir de las cuales el excedente va al auxiliar
+UMBRAL_DESBORDE = int(os.environ.get('CALCULO_UMBRAL_DESBORDE', 4))
+# Máximo de subtareas desbordadas en curso en el auxiliar, para reservarle capacidad de respaldo
+LIMITE_DESBORDE_AUXILIAR = int(os.environ.get('CALCULO_LIMITE_DESBORDE', 2))
+# Tiempos de espera (inicial, mínimo y máximo, en segundos) de las subtareas y de las verificaciones de
+# estado; entre el mínimo y el máximo se adaptan a las duraciones observadas (ver plazos.py)
+PLAZOS_SUBTAREA = (5.0, float(os.environ.get('CALCULO_PLAZO_MINIMO', 0.25)),
+                   float(os.environ.get('CALCULO_PLAZO_MAXIMO', 30)))
+PLAZOS_VERIFICACION = (2.0, 0.25, 5.0)
+# Operaciones de control de los trabajos asíncronos (ver trabajos.py)
+OPERACIONES_TRABAJOS = ('enviar_trabajo', 'estado_trabajo', 'resultado_trabajo', 'cancelar_trabajo')
+
+
+class ErrorOperacion(Exception):
+    """Error devuelto por la operación en un servidor que respondió: no se reintenta."""
+
+
+def _como_arreglo(valor, tipo):
+    """Arreglo de un resultado parcial, que puede llegar como bloque binario sin decodificar o como lista."""
+    if isinstance(valor, BloqueOperandos):
+        return valor.a_arreglo()
+    return valor if isinstance(valor, array) else array(tipo, valor)
+
 
 class ServidorCalculo:
-    def __init__(self, host='localhost', puerto_escucha=5000):
+    def __init__(self, host='localhost', puerto_escucha=5000, archivo_captura=None, servidores_operacion=None):
         self.host = host
         self.puerto_escucha = puerto_escucha
+        # Captura opcional del tráfico para reproducirlo después (main.py reproducir)
+        self.captura = CapturaTrafico(archivo_captura) if archivo_captura else None
         # Configuración para los servidores de operación
-        self.servidores_operacion = [
+        self.servidores_operacion = servidores_operacion or [
             {'host': 'localhost', 'puerto': 5001, 'tipo': 'aritmetico'},
             {'host': 'localhost', 'puerto': 5002, 'tipo': 'avanzado'},
+            {'host': 'localhost', 'puerto': 5004, 'tipo': 'algebra_lineal'},
             {'host': 'localhost', 'puerto': 5003, 'tipo': 'auxiliar'}  # Servidor auxiliar como respaldo
         ]
-        # Estado de los servidores
-        self.estado_servidores = {
-            'aritmetico': {'activo': False, 'ultima_verificacion': 0},
-            'avanzado': {'activo': False, 'ultima_verificacion': 0},
-            'auxiliar': {'activo': False, 'ultima_verificacion': 0}  # Añadir estado para el servidor auxiliar
-        }
+        # Estado, operaciones anunciadas, rutas y destinos: instantánea inmutable que se lee sin
+        # locks y se reemplaza entera en cada cambio (ver enrutamiento.py)
+        self.ruteo = TablaEnrutamiento(self.servidores_operacion)
+        # Solo serializa a quienes reemplazan la tabla; las lecturas no lo toman
+        self.lock_ruteo = threading.Lock()
+        # Hora de la última verificación de cada servidor (solo se muestra)
+        self.ultima_verificacion = dict.fromkeys(self.ruteo.tipos, 0)
+        # Subtareas en curso por servidor, para desbordar al auxiliar cuando un principal está saturado;
+        # la decisión de desbordar lee y reserva a la vez, por eso estos contadores sí usan un lock
+        self.en_vuelo = dict.fromkeys(self.ruteo.tipos, 0)
+        self.desbordes_en_vuelo = 0
+        self.lock_en_vuelo = threading.Lock()
+        # Estadísticas por hilo, sumadas al consultar las métricas
+        self.contadores = metricas.Contadores('solicitudes', 'errores', 'desbordes', 'respaldos')
+        # Se activa al terminar la primera ronda del monitoreo de servidores
+        self.servidores_verificados = threading.Event()
+        metricas.registrar_fuente('carga', self.resumen_carga)
+        metricas.registrar_fuente('servidores', self.resumen_estado)
+        metricas.registrar_fuente('solicitudes', self.contadores.valores)
+        # Decide si cada solicitud se resuelve aquí, en un servidor o repartida (ver planificador.py)
+        self.planificador = planificador.Planificador()
+        # Hilos para enviar en paralelo los tramos de una operación particionada
+        self.ejecutor_tramos = ThreadPoolExecutor(max_workers=4, thread_name_prefix='tramo')
+        # Tiempos de espera por servidor y operación según las duraciones observadas
+        self.plazos_subtareas = plazos.PlazosAdaptativos(*PLAZOS_SUBTAREA)
+        self.plazos_verificacion = plazos.PlazosAdaptativos(*PLAZOS_VERIFICACION)
+        metricas.registrar_fuente('plazos', self.resumen_plazos)
+        # Reintentos con espera creciente y presupuesto global (ver reintentos.py)
+        self.reintentos = reintentos.PoliticaReintentos()
+        # Agrupa en lotes las subtareas chicas hacia un mismo servidor de operación (ver agrupador.py)
+        self.agrupador = agrupador.AgrupadorSubtareas()
+        # Trabajos asíncronos: se responden con un identificador y se calculan en otros hilos
+        self.trabajos = trabajos.AlmacenTrabajos()
+        metricas.registrar_fuente('trabajos', self.trabajos.resumen)
+        # Nombre del archivo de trazas de este proceso
+        trazas.escritor.configurar("calculo")
+        # Drenado con SIGTERM y reinicio en caliente con SIGUSR2; la captura se cierra antes de
+        # lanzar el proceso nuevo para que no escriban los dos a la vez en el mismo archivo
+        self.ciclo = ciclo_vida.CicloVida("calculo", self.captura.cerrar if self.captura else None)
 
     def iniciar(self):
         """Inicia el servidor de cálculo para escuchar solicitudes."""
@@ -28,24 +107,24 @@ class ServidorCalculo:
             hilo_monitoreo.daemon = True
             hilo_monitoreo.start()
             
-            # Crear socket del servidor
-            servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # Permitir reutilizar la dirección
-            servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            # Vincular socket a dirección y puerto
-            servidor.bind((self.host, self.puerto_escucha))
-            # Escuchar conexiones entrantes (máximo 5 en cola)
-            servidor.listen(5)
+            # Crear sockets del servidor (o heredarlos en un reinicio en caliente): TCP y socket Unix
+            servidores = self.ciclo.sockets_escucha(self.host, self.puerto_escucha, avisar=False)
+            if self.ciclo.heredado:
+                # En un reinicio en caliente, el proceso anterior sigue atendiendo hasta que este
+                # conozca el estado de los servidores de operación
+                self.servidores_verificados.wait(timeout=30)
+            self.ciclo.avisar_listo()
             print(f"Servidor de cálculo iniciado en {self.host}:{self.puerto_escucha}")
+            if self.captura is not None:
+                print(f"Capturando tráfico en {self.captura.ruta}")
             
             # Ciclo de aceptación de conexiones
-            while True:
-                cliente_socket, direccion = servidor.accept()
+            for cliente_socket, direccion in self.ciclo.aceptar(servidores):
                 print(f"Conexión aceptada desde {direccion}")
                 # Crear hilo para manejar la solicitud
                 hilo_cliente = threading.Thread(
-                    target=self.manejar_solicitud,
-                    args=(cliente_socket,)
+                    target=self.ciclo.atender,
+                    args=(self.manejar_solicitud, cliente_socket, time.time())
                 )
                 hilo_cliente.daemon = True
                 hilo_cliente.start()
@@ -55,18 +134,23 @@ class ServidorCalculo:
         except Exception as e:
             print(f"Error en el servidor: {str(e)}")
         finally:
-            if 'servidor' in locals() and servidor:
-                servidor.close()
+            if 'servidores' in locals():
+                self.ciclo.terminar(servidores)
+            if self.captura is not None:
+                self.captura.cerrar()
 
     def monitorear_servidores(self):
             "Monitorea periódicamente el estado de los servidores de operación."
             while True:
-                for servidor in self.servidores_operacion:
-                    tipo = servidor['tipo']
-                    activo = self.verificar_servidor(servidor['host'], servidor['puerto'])
-                    estado_anterior = self.estado_servidores[tipo]['activo']
-                    self.estado_servidores[tipo]['activo'] = activo
-                    self.estado_servidores[tipo]['ultima_verificacion'] = time.time()
+                for servidor in self.ruteo.servidores:
+                    tipo = servidor.tipo
+                    respuesta = self.consultar_estado(servidor.host, servidor.puerto, tipo)
+                    activo = respuesta is not None
+                    self.ultima_verificacion[tipo] = time.time()
+                    
+                    # Publicar el estado y, si cambian, las operaciones anunciadas
+                    operaciones_anunciadas = respuesta.get('operaciones', []) if activo else None
+                    estado_anterior = self.marcar_servidor(tipo, activo, operaciones_anunciadas)
                     
                     # Notificar cambios de estado
                     if activo != estado_anterior:
@@ -75,6 +159,8 @@ class ServidorCalculo:
                         else:
                             print(f"Servidor {tipo} está INACTIVO")
                 
+                self.servidores_verificados.set()
+                
                 # Mostrar estado actual cada 30 segundos
                 if int(time.time()) % 30 == 0:
                     self.mostrar_estado_servidores()
@@ -82,39 +168,55 @@ class ServidorCalculo:
                 # Esperar antes de la próxima verificación
                 time.sleep(5)
 
-    def verificar_servidor(self, host, puerto):
-        """Verifica si un servidor está activo intentando conectarse a él y enviando un mensaje de verificación."""
+    def consultar_estado(self, host, puerto, tipo=None):
+        """Envía un mensaje de verificación a un servidor y devuelve su respuesta, o None si no responde."""
+        clave = self.plazos_verificacion.clave(tipo or f"{host}:{puerto}", 'verificar_estado')
+        plazo = self.plazos_verificacion.plazo(clave)
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(2)  # Timeout de 2 segundos
-                s.connect((host, puerto))
+            inicio = time.perf_counter()
+            with transporte.conectar(host, puerto, timeout=plazo) as s:
                 
                 # Enviar un mensaje de verificación con formato JSON válido
                 mensaje_verificacion = {
                     "operacion": "verificar_estado",
                     "operandos": []
                 }
-                s.sendall(json.dumps(mensaje_verificacion).encode('utf-8'))
+                enviar_mensaje(s, mensaje_verificacion)
                 
-                # Intentar recibir respuesta (no es necesario procesarla)
-                try:
-                    s.recv(1024)
-                except socket.timeout:
-                    pass  # Ignoramos timeout en la respuesta
-                    
-                return True
+                # La respuesta incluye las operaciones que el servidor soporta
+                respuesta = recibir_mensaje(s)
+                self.plazos_verificacion.observar(clave, time.perf_counter() - inicio)
+                if respuesta.get('estado') != 'activo':
+                    return None
+                return respuesta
+        except TimeoutError:
+            self.plazos_verificacion.vencido(clave, plazo)
+            return None
         except:
-            return False
+            return None
+
+    def verificar_servidor(self, host, puerto, tipo=None):
+        """Verifica si un servidor está activo intentando conectarse a él y enviando un mensaje de verificación."""
+        return self.consultar_estado(host, puerto, tipo) is not None
+
+    def marcar_servidor(self, tipo, activo, operaciones_anunciadas=None):
+        """Publica una tabla de enrutamiento con el estado de un servidor cambiado.
+
+        Devuelve si el servidor estaba activo en la tabla anterior.
+        """
+        with self.lock_ruteo:
+            anterior = self.ruteo
+            self.ruteo = anterior.con_estado(tipo, activo, operaciones_anunciadas)
+        return anterior.activo(tipo)
         
     def verificar_servidores(self):
         """Verifica periódicamente el estado de los servidores de operación."""
         while True:
-            for servidor in self.servidores_operacion:
-                tipo = servidor['tipo']
-                activo = self.verificar_servidor(servidor['host'], servidor['puerto'])
-                estado_anterior = self.estado_servidores[tipo]['activo']
-                self.estado_servidores[tipo]['activo'] = activo
-                self.estado_servidores[tipo]['ultima_verificacion'] = time.time()
+            for servidor in self.ruteo.servidores:
+                tipo = servidor.tipo
+                activo = self.verificar_servidor(servidor.host, servidor.puerto, tipo)
+                self.ultima_verificacion[tipo] = time.time()
+                estado_anterior = self.marcar_servidor(tipo, activo)
                 
                 # Notificar cambios de estado
                 if activo != estado_anterior:
@@ -124,13 +226,13 @@ class ServidorCalculo:
                         print(f"\n❌ Servidor {tipo} está INACTIVO")
                         
                         # Si un servidor principal falla, verificar que el auxiliar esté activo
-                        if tipo in ['aritmetico', 'avanzado'] and not activo:
+                        if tipo != 'auxiliar' and not activo:
                             auxiliar_activo = False
-                            for s in self.servidores_operacion:
-                                if s['tipo'] == 'auxiliar':
-                                    auxiliar_activo = self.verificar_servidor(s['host'], s['puerto'])
-                                    self.estado_servidores['auxiliar']['activo'] = auxiliar_activo
-                                    break
+                            destino_auxiliar = self.ruteo.destino('auxiliar')
+                            if destino_auxiliar is not None:
+                                auxiliar_activo = self.verificar_servidor(destino_auxiliar.host, destino_auxiliar.puerto,
+                                                                          'auxiliar')
+                                self.marcar_servidor('auxiliar', auxiliar_activo)
                                     
                             if auxiliar_activo:
                                 print(f"✅ Servidor auxiliar disponible para reemplazar a {tipo}")
@@ -146,73 +248,210 @@ class ServidorCalculo:
     def mostrar_estado_servidores(self):
         """Muestra el estado actual de los servidores monitoreados."""
         print("\n=== ESTADO DE LOS SERVIDORES ===")
-        for tipo, estado in self.estado_servidores.items():
-            activo = "ACTIVO" if estado['activo'] else "INACTIVO"
-            ultima = time.strftime('%H:%M:%S', time.localtime(estado['ultima_verificacion']))
+        ruteo = self.ruteo
+        for tipo in ruteo.tipos:
+            activo = "ACTIVO" if ruteo.activo(tipo) else "INACTIVO"
+            ultima = time.strftime('%H:%M:%S', time.localtime(self.ultima_verificacion[tipo]))
             print(f"Servidor {tipo}: {activo} (última verificación: {ultima})")
         print("================================\n")
                 
-    def manejar_solicitud(self, cliente_socket):
+    def manejar_solicitud(self, cliente_socket, hora_aceptacion=None):
         """Maneja una solicitud de cálculo individual."""
         try:
             # Recibir datos del cliente
-            datos = cliente_socket.recv(4096).decode('utf-8')
-            solicitud = json.loads(datos)
+            # Los operandos se mantienen como bloque binario para reenviarlos tal cual
+            inicio_lectura = time.time()
+            solicitud = recibir_mensaje(cliente_socket, decodificar_operandos=False)
+            fin_lectura = time.time()
             
             # Verificar si es una solicitud de verificación de estado
             if 'operacion' in solicitud and solicitud['operacion'] == 'verificar_estado':
                 respuesta = {
-                    "estado": "activo",
+                    "estado": self.ciclo.estado,
                     "tipo": "calculo"
                 }
-                cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+                enviar_mensaje(cliente_socket, respuesta)
+                return
+            
+            # Consultar métricas del servidor (compresión, etc.)
+            if 'operacion' in solicitud and solicitud['operacion'] == 'obtener_metricas':
+                enviar_mensaje(cliente_socket, metricas.instantanea())
                 return
                 
             # Verificar si es una notificación de cambio de estado
             if 'operacion' in solicitud and solicitud['operacion'] == 'notificar_estado':
                 self.procesar_notificacion_estado(solicitud)
                 respuesta = {"estado": "recibido"}
-                cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+                enviar_mensaje(cliente_socket, respuesta)
+                return
+            
+            # Trabajos asíncronos: enviar, consultar el estado, obtener el resultado y cancelar
+            if solicitud.get('operacion') in OPERACIONES_TRABAJOS:
+                enviar_mensaje(cliente_socket, self.atender_trabajo(solicitud))
                 return
             
+            # Traza de la solicitud: la espera en cola y la lectura ya están medidas
+            traza = trazas.Traza(solicitud.get('traza'), "calculo")
+            if hora_aceptacion is not None:
+                traza.registrar('espera_cola', hora_aceptacion, inicio_lectura)
+            traza.registrar('lectura', inicio_lectura, fin_lectura)
+            self.contadores.sumar('solicitudes')
+            
             print("-----------------------------------------------------------------------------")
-            print(f"Solicitud recibida: {solicitud['operacion']} {solicitud['operandos']}")
+            print(f"Solicitud recibida: {solicitud.get('operacion')} {describir(solicitud.get('operandos'))}")
             
             # Validar solicitud
             if not self.validar_solicitud(solicitud):
+                self.contadores.sumar('errores')
                 respuesta = {"error": "Solicitud inválida. Formato requerido: {'operacion': string, 'operandos': list}"}
-                cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+                enviar_mensaje(cliente_socket, respuesta)
                 print(f"Solicitud inválida: {solicitud}")
                 return
+            # La reproducción de capturas pide la latencia medida aquí (ver captura.py)
+            medir_latencia = solicitud.get('medir_latencia')
+            solicitud = Solicitud.desde_mensaje(solicitud)
                 
-            # Determinar el tipo de operación y dividir la tarea
-            subtareas = self.dividir_tarea(solicitud)
-            resultados_parciales = []
+            # Validar aridad y dominio antes de enviar nada a los servidores de operación
+            with traza.tramo('validacion'):
+                error = self.validar_operandos(solicitud)
+            if error is None and solicitud.transmitir and not flujo.admite(solicitud.operacion):
+                error = f"La operación {solicitud.operacion} no admite respuesta por fragmentos"
+            if error:
+                self.contadores.sumar('errores')
+                respuesta = {"error": error}
+                enviar_mensaje(cliente_socket, respuesta)
+                print(f"Solicitud rechazada: {error}")
+                return
             
-            # Enviar subtareas a servidores de operación
-            for subtarea in subtareas:
-                servidor_destino = self.seleccionar_servidor(subtarea['tipo'])
-                resultado = self.enviar_a_servidor_operacion(subtarea, servidor_destino)
-                resultados_parciales.append(resultado)
+            # Respuesta por fragmentos: cada fragmento se reenvía al cliente apenas llega (ver flujo.py)
+            if solicitud.transmitir:
+                respuesta = self.transmitir(solicitud, cliente_socket, traza)
+                print(f"Respuesta por fragmentos: {solicitud.operacion} {describir(solicitud.operandos)} = "
+                      f"{respuesta.get('fragmentos', 0)} fragmentos, {respuesta.get('elementos', 0)} elementos")
+                print("-----------------------------------------------------------------------------")
+                return
                 
-            # Ensamblar resultado final
-            resultado_final = self.ensamblar_resultado(resultados_parciales, solicitud)
-            print(f"Resultado final: {solicitud['operacion']} {solicitud['operandos']} = {resultado_final['resultado']}")
+            resultado_final = self.calcular(solicitud, traza)
+            # Latencia desde que se aceptó la conexión hasta tener la respuesta lista: es la que guarda
+            # la captura, así que la reproducción compara mediciones tomadas en el mismo punto
+            latencia = time.time() - (hora_aceptacion or inicio_lectura)
+            respuesta = resultado_final.a_mensaje()
+            if medir_latencia:
+                respuesta['latencia_servidor'] = latencia
+            print(f"Resultado final: {solicitud.operacion} {describir(solicitud.operandos)} = {describir(resultado_final.resultado)}")
             print("-----------------------------------------------------------------------------")
             
             # Enviar resultado al cliente
-            cliente_socket.sendall(json.dumps(resultado_final).encode('utf-8'))
+            with traza.tramo('serializacion'):
+                enviar_mensaje(cliente_socket, respuesta)
             
         except json.JSONDecodeError:
+            self.contadores.sumar('errores')
             respuesta = {"error": "Formato JSON inválido"}
-            cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+            enviar_mensaje(cliente_socket, respuesta)
             print("Error: Formato JSON inválido")
         except Exception as e:
+            self.contadores.sumar('errores')
             respuesta = {"error": f"Error en el procesamiento: {str(e)}"}
-            cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+            enviar_mensaje(cliente_socket, respuesta)
             print(f"Error en el procesamiento: {str(e)}")
         finally:
             cliente_socket.close()
+            if 'traza' in locals():
+                traza.finalizar()
+                # Guardar la solicitud atendida con su hora de llegada y su respuesta
+                if self.captura is not None and isinstance(solicitud, Solicitud):
+                    llegada = hora_aceptacion or inicio_lectura
+                    if 'latencia' not in locals():
+                        latencia = time.time() - llegada
+                    self.captura.registrar(llegada, latencia, solicitud, respuesta)
+
+    def calcular(self, solicitud, traza, cancelado=None):
+        """Planifica, despacha y ensambla una solicitud ya validada; devuelve el ``Resultado`` final.
+
+        ``cancelado`` (una función sin argumentos, para los trabajos asíncronos) se
+        consulta antes de despachar cada subtarea: si devuelve True no se despachan
+        más y el resultado es un error.
+        """
+        if solicitud.clave is None:
+            # Clientes sin clave de idempotencia: las subtareas igual se deduplican entre reintentos
+            solicitud.clave = uuid.uuid4().hex
+        # Decidir si se resuelve aquí, en un servidor o repartida entre varios
+        with traza.tramo('planificacion') as tramo:
+            plan = self.planificador.planificar(solicitud, self.ruteo, self.en_vuelo)
+            tramo.args['modo'] = plan.modo
+        
+        if plan.resultado is not None:
+            # Identidad algebraica o cálculo local: no se despacha nada
+            resultados_parciales = [plan.resultado]
+        elif plan.modo == planificador.MODO_PARTICIONADO:
+            # Los tramos se despachan a la vez: solo se puede cortar antes de empezar
+            if cancelado is not None and cancelado():
+                return Resultado(error="Trabajo cancelado")
+            resultados_parciales = self.despachar_particionado(solicitud, plan, traza)
+        else:
+            # Determinar el tipo de operación y dividir la tarea
+            subtareas = self.dividir_tarea(solicitud)
+            resultados_parciales = []
+            
+            # Enviar subtareas a servidores de operación
+            for subtarea in subtareas:
+                if cancelado is not None and cancelado():
+                    return Resultado(error="Trabajo cancelado")
+                # El contexto de traza viaja a cada servidor de operación
+                subtarea.traza = traza.contexto
+                destino = self.seleccionar_servidor(subtarea.tipo, subtarea.operacion)
+                try:
+                    with traza.tramo('despacho', operacion=subtarea.operacion,
+                                     servidor=destino.tipo, desborde=destino.desborde):
+                        resultado = self.enviar_a_servidor_operacion(subtarea, destino, traza)
+                finally:
+                    self.liberar_servidor(destino)
+                if resultado.traza:
+                    traza.agregar(resultado.traza.get('tramos'))
+                resultados_parciales.append(resultado)
+            
+        # Ensamblar resultado final
+        with traza.tramo('ensamblado'):
+            resultado_final = self.ensamblar_resultado(resultados_parciales, solicitud)
+        if traza.activa and traza.contexto.get('incluir'):
+            resultado_final.traza = traza.para_respuesta()
+        return resultado_final
+
+    def atender_trabajo(self, mensaje):
+        """Atiende una operación de control de trabajos asíncronos y devuelve la respuesta."""
+        operacion = mensaje['operacion']
+        if operacion == 'enviar_trabajo':
+            return self.enviar_trabajo(mensaje.get('solicitud'))
+        trabajo_id = mensaje.get('trabajo')
+        if operacion == 'cancelar_trabajo':
+            self.trabajos.cancelar(trabajo_id)
+        respuesta = self.trabajos.consultar(trabajo_id, con_respuesta=operacion == 'resultado_trabajo')
+        if respuesta is None:
+            return {"error": f"Trabajo desconocido o expirado: {trabajo_id}"}
+        return respuesta
+
+    def enviar_trabajo(self, solicitud):
+        """Valida una solicitud y la encola como trabajo; responde enseguida con su identificador."""
+        if not self.validar_solicitud(solicitud):
+            return {"error": "Solicitud inválida. Formato requerido: {'operacion': string, 'operandos': list}"}
+        traza = trazas.Traza(solicitud.get('traza'), "calculo")
+        solicitud = Solicitud.desde_mensaje(solicitud)
+        error = self.validar_operandos(solicitud)
+        if error:
+            return {"error": error}
+
+        def calcular(cancelado):
+            try:
+                return self.calcular(solicitud, traza, cancelado).a_mensaje()
+            finally:
+                traza.finalizar()
+
+        trabajo = self.trabajos.enviar(solicitud.operacion, calcular)
+        if trabajo is None:
+            return {"error": "Demasiados trabajos en curso, reintente más tarde"}
+        print(f"Trabajo {trabajo.id} encolado: {solicitud.operacion} {describir(solicitud.operandos)}")
+        return self.trabajos.consultar(trabajo.id)
 
     def procesar_notificacion_estado(self, notificacion):
         """Procesa una notificación de cambio de estado de un servidor."""
@@ -220,205 +459,409 @@ class ServidorCalculo:
         activo = notificacion['activo']
         
         # Actualizar estado del servidor
-        self.estado_servidores[tipo_servidor]['activo'] = activo
-        self.estado_servidores[tipo_servidor]['ultima_verificacion'] = time.time()
+        self.marcar_servidor(tipo_servidor, activo)
+        self.ultima_verificacion[tipo_servidor] = time.time()
         
         # Actualizar configuración de enrutamiento si es necesario
         if not activo and notificacion.get('auxiliar_disponible', False):
             print(f"\n⚠️ Servidor {tipo_servidor} está INACTIVO - Redirigiendo solicitudes al servidor auxiliar")
-            # Asegurarse de que el servidor auxiliar esté en la lista de servidores
-            servidor_auxiliar_encontrado = False
-            for servidor in self.servidores_operacion:
-                if servidor['tipo'] == 'auxiliar':
-                    servidor_auxiliar_encontrado = True
-                    break
-                    
-            if not servidor_auxiliar_encontrado:
-                self.servidores_operacion.append({
-                    'host': 'localhost',  # Ajustar según configuración
-                    'puerto': 5003,       # Ajustar según configuración
-                    'tipo': 'auxiliar'
-                })
-                
-            # Marcar el servidor auxiliar como activo
-            self.estado_servidores['auxiliar']['activo'] = True
+            # El auxiliar siempre está en la tabla de enrutamiento: basta con marcarlo como activo
+            self.marcar_servidor('auxiliar', True)
         elif activo:
             print(f"\n✅ Servidor {tipo_servidor} está ACTIVO nuevamente - Restaurando enrutamiento normal")
         
         # Mostrar estado actual
         self.mostrar_estado_servidores()
 
-    def seleccionar_servidor(self, tipo_operacion):
-        """Selecciona el servidor adecuado según el tipo de operación y disponibilidad."""
-        # Verificar si el servidor específico está activo
-        if self.estado_servidores[tipo_operacion]['activo']:
-            # Buscar el servidor específico
-            for servidor in self.servidores_operacion:
-                if servidor['tipo'] == tipo_operacion:
-                    return servidor
-        
-        # Si el servidor específico no está disponible, usar el servidor auxiliar
-        if self.estado_servidores['auxiliar']['activo']:
-            # Buscar el servidor auxiliar
-            for servidor in self.servidores_operacion:
-                if servidor['tipo'] == 'auxiliar':
-                    print(f"⚠️ Usando servidor auxiliar para operación de tipo {tipo_operacion}")
-                    # Crear una copia del servidor auxiliar pero con el tipo de operación correcto
-                    servidor_auxiliar = servidor.copy()
-                    servidor_auxiliar['tipo_original'] = 'auxiliar'  # Guardar tipo original
-                    servidor_auxiliar['tipo'] = tipo_operacion  # Cambiar tipo para que el auxiliar sepa qué operación realizar
-                    return servidor_auxiliar
-        
-        # Si ningún servidor está disponible, lanzar excepción
-        raise ValueError(f"No hay servidores disponibles para operaciones de tipo: {tipo_operacion}")
-            
     def validar_solicitud(self, solicitud):
         """Valida que la solicitud tenga el formato correcto."""
         return (isinstance(solicitud, dict) and
                 'operacion' in solicitud and
                 'operandos' in solicitud and
-                isinstance(solicitud['operandos'], list))
+                isinstance(solicitud['operandos'], (list, BloqueOperandos)))
+                
+    def validar_operandos(self, solicitud):
+        """Aplica los validadores de aridad y dominio del registro antes de despachar."""
+        operacion = operaciones.obtener(solicitud.operacion)
+        if operacion is None:
+            return f"Operación no soportada: {solicitud.operacion}"
+        return operacion.validar(solicitud.operandos)
                 
     def dividir_tarea(self, solicitud):
         """Divide la solicitud en subtareas para los servidores de operación."""
-        operacion = solicitud['operacion']
-        operandos = solicitud['operandos']
+        operacion = solicitud.operacion
+        operandos = solicitud.operandos
         
-        if operacion in ['suma', 'resta', 'multiplicacion', 'division']:
-            # Operaciones básicas van al servidor 1
-            return [{'tipo': 'aritmetico', 'operacion': operacion, 'operandos': operandos}]
-        elif operacion in ['potencia', 'raiz', 'logaritmo']:
-            # Operaciones avanzadas van al servidor 2
-            return [{'tipo': 'avanzado', 'operacion': operacion, 'operandos': operandos}]
-        elif operacion == 'calculo_complejo':
+        if operacion == 'calculo_complejo':
             # Dividir en múltiples subtareas según la jerarquía de operaciones
-            return [
-                {'tipo': 'aritmetico', 'operacion': 'suma', 'operandos': operandos[0:2]},
-                {'tipo': 'avanzado', 'operacion': 'potencia', 'operandos': [operandos[2], operandos[3]]},
+            subtareas = [
+                Subtarea(self.determinar_tipo_operacion('suma'), 'suma', operandos[0:2]),
+                Subtarea(self.determinar_tipo_operacion('potencia'), 'potencia', [operandos[2], operandos[3]]),
             ]
+        elif operaciones.obtener(operacion) is not None:
+            # Cada operación va al servidor que la anuncia en la tabla de enrutamiento
+            subtareas = [Subtarea(self.determinar_tipo_operacion(operacion), operacion, operandos)]
         else:
             # Operación no reconocida
             raise ValueError(f"Operación no soportada: {operacion}")
+        # Claves de idempotencia de las subtareas, derivadas de la de la solicitud
+        for indice, subtarea in enumerate(subtareas):
+            subtarea.clave = f"{solicitud.clave}/{indice}"
+        return subtareas
             
-    def seleccionar_servidor(self, tipo_operacion):
-        """Selecciona el servidor adecuado según el tipo de operación."""
-        for servidor in self.servidores_operacion:
-            if servidor['tipo'] == tipo_operacion:
-                return servidor
-        raise ValueError(f"No hay servidor disponible para operaciones de tipo: {tipo_operacion}")
+    def seleccionar_servidor(self, tipo_operacion, operacion=None):
+        """Selecciona un servidor activo que anuncie la operación, usando el auxiliar como respaldo.
+
+        Si el servidor principal tiene ``UMBRAL_DESBORDE`` subtareas en curso, el
+        excedente se desborda al auxiliar mientras este tenga menos de
+        ``LIMITE_DESBORDE_AUXILIAR`` subtareas desbordadas. El servidor devuelto
+        queda reservado hasta llamar a ``liberar_servidor``.
+        """
+        # Una sola lectura de la tabla: toda la decisión usa la misma instantánea
+        ruteo = self.ruteo
+        candidatos = ruteo.candidatos(operacion) if operacion else (tipo_operacion,)
+        auxiliar_disponible = 'auxiliar' in candidatos and ruteo.activo('auxiliar')
         
-    def enviar_a_servidor_operacion(self, subtarea, servidor_destino):
-        """Envía una subtarea a un servidor de operación y recibe el resultado."""
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(5)  # Timeout de 5 segundos
-                s.connect((servidor_destino['host'], servidor_destino['puerto']))
-                
-                # Si estamos usando el servidor auxiliar, asegurarse de que sepa qué tipo de operación realizar
-                if 'tipo_original' in servidor_destino and servidor_destino['tipo_original'] == 'auxiliar':
-                    subtarea['tipo'] = servidor_destino['tipo']  # Añadir el tipo de operación a la subtarea
-                
-                # Enviar subtarea
-                s.sendall(json.dumps(subtarea).encode('utf-8'))
-                
-                # Recibir resultado
-                resultado_data = s.recv(4096)
-                resultado = json.loads(resultado_data.decode('utf-8'))
+        # Verificar si el servidor específico está activo y ejecuta la operación
+        if tipo_operacion in candidatos and ruteo.activo(tipo_operacion):
+            destino = ruteo.destino(tipo_operacion)
+            if destino is not None:
+                with self.lock_en_vuelo:
+                    desbordar = (auxiliar_disponible and
+                                 self.en_vuelo[tipo_operacion] >= UMBRAL_DESBORDE and
+                                 self.desbordes_en_vuelo < LIMITE_DESBORDE_AUXILIAR)
+                    if not desbordar:
+                        self.en_vuelo[tipo_operacion] += 1
+                        return destino
+                # Servidor principal saturado: desbordar al auxiliar
+                destino_auxiliar = self.reservar_auxiliar(ruteo, desborde=True)
+                if destino_auxiliar is not None:
+                    print(f"↪ Desbordando operación {operacion or tipo_operacion} al servidor auxiliar "
+                          f"({self.en_vuelo[tipo_operacion]} en curso en {tipo_operacion})")
+                    return destino_auxiliar
+                with self.lock_en_vuelo:
+                    self.en_vuelo[tipo_operacion] += 1
+                return destino
+        
+        # Si el servidor específico no está disponible, usar el servidor auxiliar
+        if auxiliar_disponible:
+            destino_auxiliar = self.reservar_auxiliar(ruteo)
+            if destino_auxiliar is not None:
+                print(f"⚠️ Usando servidor auxiliar para operación de tipo {tipo_operacion}")
+                return destino_auxiliar
+        
+        # Si ningún servidor está disponible, lanzar excepción
+        raise ValueError(f"No hay servidores disponibles para la operación {operacion or tipo_operacion}")
+        
+    def destino(self, tipo, desborde=False):
+        """Devuelve el destino compartido de un tipo de servidor, o None si no está configurado."""
+        return self.ruteo.destino(tipo, desborde)
+        
+    def reservar_auxiliar(self, ruteo, desborde=False):
+        """Reserva el servidor auxiliar para una subtarea de otro tipo de servidor."""
+        # La subtarea ya indica su tipo, así que el auxiliar sabe qué operación realizar
+        destino = ruteo.destino('auxiliar', desborde)
+        if destino is not None:
+            with self.lock_en_vuelo:
+                self.en_vuelo['auxiliar'] += 1
+                if desborde:
+                    self.desbordes_en_vuelo += 1
+            if desborde:
+                self.contadores.sumar('desbordes')
+        return destino
+        
+    def liberar_servidor(self, destino):
+        """Libera la reserva hecha por seleccionar_servidor al terminar la subtarea."""
+        with self.lock_en_vuelo:
+            self.en_vuelo[destino.tipo] -= 1
+            if destino.desborde:
+                self.desbordes_en_vuelo -= 1
                 
-                # Verificar si hay error
-                if 'error' in resultado:
-                    print(f"Error en servidor {servidor_destino['tipo']}: {resultado['error']}")
-                    raise Exception(resultado['error'])
-                    
-                return resultado
-        except Exception as e:
-            print(f"Error al comunicarse con servidor {servidor_destino['tipo']}: {str(e)}")
-            # Marcar el servidor como inactivo
-            self.estado_servidores[servidor_destino['tipo']]['activo'] = False
-            # Intentar con el servidor auxiliar si no estábamos ya usándolo
-            if 'tipo_original' not in servidor_destino or servidor_destino['tipo_original'] != 'auxiliar':
-                print(f"Intentando con servidor auxiliar para operación {subtarea['operacion']}")
-                return self.reenviar_a_servidor_auxiliar(subtarea)
-            else:
-                raise Exception(f"No se pudo completar la operación: {str(e)}")
-
-    def reenviar_a_servidor_auxiliar(self, subtarea):
-        """Reenvía una subtarea al servidor auxiliar cuando el servidor original falla."""
-        # Buscar el servidor auxiliar
-        servidor_auxiliar = None
-        for servidor in self.servidores_operacion:
-            if servidor['tipo'] == 'auxiliar':
-                servidor_auxiliar = servidor
-                break
+    def resumen_estado(self):
+        """Estado de cada servidor de operación tal como lo ve el enrutamiento."""
+        ruteo = self.ruteo
+        return {tipo: ruteo.activo(tipo) for tipo in ruteo.tipos}
         
-        if not servidor_auxiliar or not self.estado_servidores['auxiliar']['activo']:
-            raise Exception("Servidor auxiliar no disponible")
+    def resumen_carga(self):
+        """Subtareas en curso por servidor y desbordes al auxiliar."""
+        with self.lock_en_vuelo:
+            return {
+                'en_vuelo': dict(self.en_vuelo),
+                'desbordes_en_vuelo': self.desbordes_en_vuelo,
+                'total_desbordes': self.contadores.valores()['desbordes'],
+                'umbral_desborde': UMBRAL_DESBORDE,
+                'limite_desborde_auxiliar': LIMITE_DESBORDE_AUXILIAR
+            }
         
-        # Añadir el tipo de operación a la subtarea
-        subtarea['tipo'] = subtarea.get('tipo', self.determinar_tipo_operacion(subtarea['operacion']))
+    def resumen_plazos(self):
+        """Tiempos de espera vigentes de las subtareas y de las verificaciones de estado."""
+        return {'subtareas': self.plazos_subtareas.resumen(), 'verificacion': self.plazos_verificacion.resumen()}
         
-        # Enviar al servidor auxiliar
+    def enviar_a_servidor_operacion(self, subtarea, destino, traza=None):
+        """Envía una subtarea a un servidor de operación y recibe el resultado.
+
+        Si el envío falla, la subtarea se reintenta según la política de reintentos
+        (ver reintentos.py) en el servidor que elige ``destino_reintento``.
+        """
+        self.reintentos.registrar_envio()
+        intento = 1
+        while True:
+            try:
+                if intento == 1 or traza is None:
+                    return self.intercambiar_subtarea(subtarea, destino)
+                with traza.tramo('reintento', operacion=subtarea.operacion, servidor=destino.tipo, intento=intento):
+                    return self.intercambiar_subtarea(subtarea, destino)
+            except ErrorOperacion:
+                raise
+            except Exception as e:
+                print(f"Error al comunicarse con servidor {destino.tipo}: {str(e)}")
+                # Marcar el servidor como inactivo
+                self.marcar_servidor(destino.tipo, False)
+                intento += 1
+                if not self.reintentos.autorizar(intento):
+                    raise Exception(f"No se pudo completar la operación: {str(e)}")
+                siguiente = self.destino_reintento(subtarea, destino)
+                if siguiente.tipo == 'auxiliar' and destino.tipo != 'auxiliar':
+                    self.contadores.sumar('respaldos')
+                print(f"Reintento {intento} de {subtarea.operacion} en servidor {siguiente.tipo}")
+                self.reintentos.esperar(intento)
+                destino = siguiente
+
+    def transmitir(self, solicitud, cliente_socket, traza):
+        """Despacha una solicitud con respuesta por fragmentos y reenvía cada fragmento al cliente apenas llega.
+
+        No pasa por el planificador: calcular aquí o repartir en tramos obligaría
+        a juntar el resultado entero. Si el servidor de operación falla a mitad
+        de camino, el cálculo se reanuda según la política de reintentos en el
+        servidor que elige ``destino_reintento``, desde el primer elemento que
+        el cliente todavía no recibió. Devuelve el mensaje final enviado al cliente.
+        """
+        tipo = self.determinar_tipo_operacion(solicitud.operacion)
+        subtarea = Subtarea(tipo, solicitud.operacion, solicitud.operandos, traza.contexto)
+        tamano = flujo.tamano_fragmento(solicitud.transmitir)
+        progreso = flujo.Progreso()
+        reservado = destino = self.seleccionar_servidor(tipo, solicitud.operacion)
+        servidores = set()
+        self.reintentos.registrar_envio()
+        intento = 1
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(5)
-                s.connect((servidor_auxiliar['host'], servidor_auxiliar['puerto']))
-                s.sendall(json.dumps(subtarea).encode('utf-8'))
-                resultado_data = s.recv(4096)
-                resultado = json.loads(resultado_data.decode('utf-8'))
-                
-                if 'error' in resultado:
-                    raise Exception(resultado['error'])
-                    
-                return resultado
-        except Exception as e:
-            self.estado_servidores['auxiliar']['activo'] = False
-            raise Exception(f"Error al comunicarse con servidor auxiliar: {str(e)}")
+            while True:
+                servidores.add(destino.tipo)
+                try:
+                    with traza.tramo('transmision', operacion=subtarea.operacion, servidor=destino.tipo,
+                                     intento=intento, desde=progreso.elementos):
+                        final = self.transmitir_desde(subtarea, destino, cliente_socket, progreso, tamano)
+                    break
+                except flujo.ClienteDesconectado as e:
+                    print(f"El cliente cerró la conexión durante la respuesta por fragmentos: {str(e)}")
+                    return {"error": "El cliente cerró la conexión"}
+                except Exception as e:
+                    print(f"Error al comunicarse con servidor {destino.tipo}: {str(e)}")
+                    self.marcar_servidor(destino.tipo, False)
+                    intento += 1
+                    if not self.reintentos.autorizar(intento):
+                        raise Exception(f"No se pudo completar la operación: {str(e)}")
+                    siguiente = self.destino_reintento(subtarea, destino)
+                    if siguiente.tipo == 'auxiliar' and destino.tipo != 'auxiliar':
+                        self.contadores.sumar('respaldos')
+                    if progreso.fragmentos:
+                        flujo.contadores.sumar('reanudados')
+                    print(f"Reintento {intento} de {subtarea.operacion} en servidor {siguiente.tipo} "
+                          f"desde el elemento {progreso.elementos}")
+                    self.reintentos.esperar(intento)
+                    destino = siguiente
+        finally:
+            self.liberar_servidor(reservado)
+        
+        if 'error' in final:
+            respuesta = {"error": f"Error en cálculo parcial: {final['error']}"}
+        else:
+            respuesta = {
+                'fin': True,
+                'operacion': solicitud.operacion,
+                'fragmentos': progreso.fragmentos,
+                'elementos': progreso.elementos,
+                'cantidad_errores': progreso.cantidad_errores,
+                'tiempo_procesamiento': time.time() - (solicitud.timestamp or time.time())
+            }
+            # Indica si todo el cálculo lo realizó el servidor auxiliar
+            if servidores == {'auxiliar'}:
+                respuesta['servidor'] = 'auxiliar'
+        if final.get('traza'):
+            traza.agregar(final['traza'].get('tramos'))
+        if traza.activa and traza.contexto.get('incluir'):
+            respuesta['traza'] = traza.para_respuesta()
+        with traza.tramo('serializacion'):
+            enviar_mensaje(cliente_socket, respuesta)
+        return respuesta
+
+    def transmitir_desde(self, subtarea, destino, cliente_socket, progreso, tamano):
+        """Un intento de transmisión: pide los elementos desde ``progreso.elementos`` y reenvía sus fragmentos."""
+        desde = progreso.elementos
+        operandos = subtarea.operandos
+        if desde:
+            # Reanudación: el servidor nuevo solo calcula lo que el cliente todavía no recibió
+            operandos = [o if isinstance(o, (int, float)) else o[desde:] for o in operandos]
+        mensaje = Subtarea(subtarea.tipo, subtarea.operacion, operandos, subtarea.traza).a_mensaje()
+        mensaje['transmitir'] = tamano
+        # El plazo corre para cada fragmento y no para la respuesta entera: se usa el máximo de las subtareas
+        with transporte.conectar(destino.host, destino.puerto, timeout=self.plazos_subtareas.maximo) as s:
+            enviar_mensaje(s, mensaje)
+            return flujo.reenviar(s, cliente_socket, progreso)
+
+    def destino_reintento(self, subtarea, fallido):
+        """Servidor para reintentar una subtarea: su principal o el auxiliar, el primero que esté activo.
+
+        Si el auxiliar falló atendiendo un desborde, la subtarea vuelve así a su
+        principal. Si ninguno está activo, la falla pudo ser pasajera y se vuelve
+        al mismo servidor.
+        """
+        ruteo = self.ruteo
+        candidatos = ruteo.candidatos(subtarea.operacion)
+        for tipo in (subtarea.tipo, 'auxiliar'):
+            if tipo in candidatos and ruteo.activo(tipo):
+                destino = ruteo.destino(tipo)
+                if destino is not None:
+                    return destino
+        return ruteo.destino(fallido.tipo) or fallido
+
+    def intercambiar_subtarea(self, subtarea, destino):
+        """Un intento de enviar una subtarea a un servidor de operación; lanza excepción si falla."""
+        clave = self.plazos_subtareas.clave(destino.tipo, subtarea.operacion, subtarea.operandos)
+        plazo = self.plazos_subtareas.plazo(clave, subtarea.operacion)
+        inicio = time.perf_counter()
+        try:
+            # Enviar subtarea (los bloques de operandos se reenvían sin decodificar); las chicas
+            # pueden viajar en un lote con otras para el mismo servidor
+            respuesta = self.agrupador.enviar(subtarea, destino, timeout=plazo)
+        except TimeoutError:
+            self.plazos_subtareas.vencido(clave, plazo)
+            raise
+        resultado = Resultado.desde_mensaje(respuesta)
+        
+        # Verificar si hay error
+        if resultado.error is not None:
+            print(f"Error en servidor {destino.tipo}: {resultado.error}")
+            raise ErrorOperacion(resultado.error)
+            
+        duracion = time.perf_counter() - inicio
+        self.plazos_subtareas.observar(clave, duracion)
+        # El planificador compara este viaje con el costo de calcular aquí
+        self.planificador.observar_rtt(destino.tipo, duracion, subtarea.operandos)
+        return resultado
+
+    def despachar_particionado(self, solicitud, plan, traza):
+        """Reparte una operación vectorial en tramos contiguos entre el servidor principal y el auxiliar.
+
+        Los tramos se envían en paralelo y cada uno cuenta como una subtarea en curso
+        en su servidor. El del auxiliar es un desborde: si falla, vuelve al principal.
+        """
+        tipo = self.determinar_tipo_operacion(solicitud.operacion)
+        ruteo = self.ruteo
+        destinos = [self.seleccionar_servidor(tipo, solicitud.operacion)]
+        # El auxiliar solo toma un tramo si le queda capacidad de desborde
+        with self.lock_en_vuelo:
+            auxiliar_libre = self.desbordes_en_vuelo < LIMITE_DESBORDE_AUXILIAR
+        if auxiliar_libre and destinos[0].tipo != 'auxiliar':
+            destino_auxiliar = self.reservar_auxiliar(ruteo, desborde=True)
+            if destino_auxiliar is not None:
+                destinos.append(destino_auxiliar)
+        try:
+            # La clave de cada tramo incluye la cantidad de tramos: con otra partición los operandos cambian
+            subtareas = [Subtarea(tipo, solicitud.operacion, operandos, traza.contexto,
+                                  f"{solicitud.clave}/{indice}de{len(destinos)}")
+                         for indice, operandos in enumerate(self.partir_operandos(solicitud.operandos,
+                                                                                  len(destinos)))]
+
+            def enviar(subtarea, destino):
+                with traza.tramo('despacho', operacion=subtarea.operacion, servidor=destino.tipo,
+                                 desborde=destino.desborde, tramos=len(destinos)):
+                    return self.enviar_a_servidor_operacion(subtarea, destino, traza)
+
+            futuros = [self.ejecutor_tramos.submit(enviar, subtarea, destino)
+                       for subtarea, destino in zip(subtareas[1:], destinos[1:])]
+            resultados = [enviar(subtareas[0], destinos[0])] + [futuro.result() for futuro in futuros]
+        finally:
+            for destino in destinos:
+                self.liberar_servidor(destino)
+        for resultado in resultados:
+            if resultado.traza:
+                traza.agregar(resultado.traza.get('tramos'))
+        return resultados
+
+    def partir_operandos(self, operandos, partes):
+        """Parte los operandos de una operación vectorial en tramos contiguos; los escalares se repiten."""
+        longitud = next(len(o) for o in operandos if not isinstance(o, (int, float)))
+        cortes = [longitud * i // partes for i in range(partes + 1)]
+        return [[o if isinstance(o, (int, float)) else o[inicio:fin] for o in operandos]
+                for inicio, fin in zip(cortes, cortes[1:])]
 
     def determinar_tipo_operacion(self, operacion):
-        """Determina el tipo de operación basado en su nombre."""
-        if operacion in ['suma', 'resta', 'multiplicacion', 'division']:
-            return 'aritmetico'
-        elif operacion in ['potencia', 'raiz', 'logaritmo']:
-            return 'avanzado'
-        else:
-            return 'desconocido'
+        """Determina el tipo de servidor principal que ejecuta una operación."""
+        for tipo in self.ruteo.candidatos(operacion):
+            if tipo != 'auxiliar':
+                return tipo
+        # Si ningún servidor principal la anuncia, usar el tipo declarado en el registro
+        operacion_registrada = operaciones.obtener(operacion)
+        return operacion_registrada.tipo if operacion_registrada else 'desconocido'
             
     def ensamblar_resultado(self, resultados_parciales, solicitud_original):
         """Ensambla el resultado final a partir de los resultados parciales."""
         # Verificar si hay errores en los resultados parciales
         for resultado in resultados_parciales:
-            if 'error' in resultado:
-                error_msg = f"Error en cálculo parcial: {resultado['error']}"
+            if resultado.error is not None:
+                error_msg = f"Error en cálculo parcial: {resultado.error}"
                 print(error_msg)
-                return {"error": error_msg}
+                return Resultado(error=error_msg)
+                
+        tiempo_procesamiento = time.time() - (solicitud_original.timestamp or time.time())
                 
         # Si solo hay un resultado, devolverlo directamente
         if len(resultados_parciales) == 1:
-            resultado_final = {
-                'operacion': solicitud_original['operacion'],
-                'operandos': solicitud_original['operandos'],
-                'resultado': resultados_parciales[0]['resultado'],
-                'tiempo_procesamiento': time.time() - solicitud_original.get('timestamp', time.time())
-            }
-            return resultado_final
+            parcial = resultados_parciales[0]
+            return Resultado(
+                operacion=solicitud_original.operacion,
+                resultado=parcial.resultado,
+                # Las operaciones sobre datos grandes no devuelven sus operandos
+                operandos=solicitud_original.operandos if parcial.operandos is not None else None,
+                # Resultados vectoriales: máscara de errores por elemento
+                errores=parcial.errores,
+                cantidad_errores=parcial.cantidad_errores,
+                # Indica si el cálculo lo realizó el servidor auxiliar
+                servidor=parcial.servidor,
+                tiempo_procesamiento=tiempo_procesamiento
+            )
             
         # Si hay múltiples resultados, combinarlos según la operación
-        if solicitud_original['operacion'] == 'calculo_complejo':
+        operacion = operaciones.obtener(solicitud_original.operacion)
+        if operacion is not None and operacion.vectorial:
+            # Tramos de una operación particionada: se concatenan en orden
+            resultado = array('d')
+            errores = array('b')
+            for parcial in resultados_parciales:
+                resultado.extend(_como_arreglo(parcial.resultado, 'd'))
+                errores.extend(_como_arreglo(parcial.errores, 'b'))
+            return Resultado(
+                operacion=solicitud_original.operacion,
+                resultado=resultado,
+                errores=errores,
+                cantidad_errores=sum(parcial.cantidad_errores or 0 for parcial in resultados_parciales),
+                servidor='auxiliar' if all(p.servidor == 'auxiliar' for p in resultados_parciales) else None,
+                tiempo_procesamiento=tiempo_procesamiento
+            )
+        elif solicitud_original.operacion == 'calculo_complejo':
             # Ejemplo: Combinar resultados de diferentes operaciones
-            resultado_final = resultados_parciales[0]['resultado'] * resultados_parciales[1]['resultado']
-            resultado_final_ensamblado = {
-                'operacion': solicitud_original['operacion'],
-                'operandos': solicitud_original['operandos'],
-                'resultado': resultado_final,
-                'resultados_parciales': [r.get('resultado') for r in resultados_parciales],
-                'tiempo_procesamiento': time.time() - solicitud_original.get('timestamp', time.time())
-            }
-            return resultado_final_ensamblado
+            return Resultado(
+                operacion=solicitud_original.operacion,
+                operandos=solicitud_original.operandos,
+                resultado=resultados_parciales[0].resultado * resultados_parciales[1].resultado,
+                resultados_parciales=[r.resultado for r in resultados_parciales],
+                tiempo_procesamiento=tiempo_procesamiento
+            )
         else:
             # Para otros casos
-            resultado_final = {
-                'operacion': solicitud_original['operacion'],
-                'resultado': resultados_parciales[0]['resultado'],
-                'tiempo_procesamiento': time.time() - solicitud_original.get('timestamp', time.time())
-            }
-            return resultado_final
\ No newline at end of file
+            return Resultado(
+                operacion=solicitud_original.operacion,
+                resultado=resultados_parciales[0].resultado,
+                tiempo_procesamiento=tiempo_procesamiento
+            )
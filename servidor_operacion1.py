@@ -1,38 +1,51 @@
 # servidor_operacion1.py
-import socket
+import itertools
 import json
 import threading
 import time
 
+import agrupador
+import ciclo_vida
+import idempotencia
+import metricas
+import operaciones
+import trazas
+from protocolo import describir, enviar_mensaje, recibir_mensaje
+
 class ServidorOperacionAritmetico:
     def __init__(self, host='localhost', puerto=5001):
         self.host = host
         self.puerto = puerto
-        self.contador_solicitudes = 0
+        # Identificadores de solicitud únicos entre hilos (next sobre itertools.count es atómico)
+        self.ids_solicitud = itertools.count(1)
+        # Solicitudes atendidas y con error, contadas por hilo y sumadas al consultar las métricas
+        self.contadores = metricas.Contadores('solicitudes', 'errores')
+        metricas.registrar_fuente('solicitudes', self.contadores.valores)
+        # Respuestas recientes por clave de idempotencia, para no calcular dos veces una subtarea reintentada
+        self.idempotencia = idempotencia.TablaIdempotencia()
+        # Nombre del archivo de trazas de este proceso
+        trazas.escritor.configurar("aritmetico")
+        # Drenado con SIGTERM y reinicio en caliente con SIGUSR2
+        self.ciclo = ciclo_vida.CicloVida("aritmetico")
+        # Operaciones que este servidor ejecuta y anuncia en verificar_estado
+        self.operaciones = operaciones.operaciones_de_tipo(operaciones.TIPO_ARITMETICO)
         
     def iniciar(self):
         """Inicia el servidor de operaciones aritméticas para escuchar solicitudes."""
         try:
-            # Crear socket del servidor
-            servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # Permitir reutilizar la dirección
-            servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            # Vincular socket a dirección y puerto
-            servidor.bind((self.host, self.puerto))
-            # Escuchar conexiones entrantes (máximo 5 en cola)
-            servidor.listen(5)
+            # Crear sockets del servidor (o heredarlos en un reinicio en caliente): TCP y socket Unix
+            servidores = self.ciclo.sockets_escucha(self.host, self.puerto)
             
             # Mostrar encabezado del servidor
             self.mostrar_encabezado_servidor()
             
             # Ciclo de aceptación de conexiones
-            while True:
-                cliente_socket, direccion = servidor.accept()
+            for cliente_socket, direccion in self.ciclo.aceptar(servidores):
                 print(f"\nConexión aceptada desde {direccion[0]}:{direccion[1]}")
                 # Crear hilo para manejar la solicitud
                 hilo_cliente = threading.Thread(
-                    target=self.manejar_solicitud,
-                    args=(cliente_socket, direccion)
+                    target=self.ciclo.atender,
+                    args=(self.manejar_solicitud, cliente_socket, direccion, time.time())
                 )
                 hilo_cliente.daemon = True
                 hilo_cliente.start()
@@ -42,8 +55,8 @@ class ServidorOperacionAritmetico:
         except Exception as e:
             print(f"\nError en el servidor de operación: {str(e)}")
         finally:
-            if 'servidor' in locals() and servidor:
-                servidor.close()
+            if 'servidores' in locals():
+                self.ciclo.terminar(servidores)
     
     def mostrar_encabezado_servidor(self):
         """Muestra un encabezado estilizado para el servidor."""
@@ -51,63 +64,96 @@ class ServidorOperacionAritmetico:
         print("=" * ancho)
         print(f"{'SERVIDOR DE OPERACIONES ARITMÉTICAS':^{ancho}}")
         print(f"{'Escuchando en ' + self.host + ':' + str(self.puerto):^{ancho}}")
-        print(f"{'Operaciones soportadas: suma, resta, multiplicacion, division':^{ancho}}")
+        print(f"{'Operaciones soportadas: ' + ', '.join(self.operaciones):^{ancho}}")
         print("-" * ancho)
         print(f"{'Iniciado: ' + time.strftime('%Y-%m-%d %H:%M:%S'):^{ancho}}")
         print("=" * ancho)
                 
-    def manejar_solicitud(self, cliente_socket, direccion):
+    def manejar_solicitud(self, cliente_socket, direccion, hora_aceptacion=None):
         """Maneja una solicitud de cálculo individual."""
-        self.contador_solicitudes += 1
-        id_solicitud = self.contador_solicitudes
+        id_solicitud = next(self.ids_solicitud)
         hora_recepcion = time.strftime('%H:%M:%S')
         
         try:
             # Recibir datos
-            datos = cliente_socket.recv(4096).decode('utf-8')
-            solicitud = json.loads(datos)
+            inicio_lectura = time.time()
+            solicitud = recibir_mensaje(cliente_socket)
+            fin_lectura = time.time()
             
             # Verificar si es una solicitud de verificación de estado
             if 'operacion' in solicitud and solicitud['operacion'] == 'verificar_estado':
                 respuesta = {
-                    "estado": "activo",
-                    "tipo": "aritmetico"
+                    "estado": self.ciclo.estado,
+                    "tipo": "aritmetico",
+                    "operaciones": self.operaciones
                 }
-                cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+                enviar_mensaje(cliente_socket, respuesta)
+                return
+            
+            # Consultar métricas del servidor (compresión, etc.)
+            if 'operacion' in solicitud and solicitud['operacion'] == 'obtener_metricas':
+                enviar_mensaje(cliente_socket, metricas.instantanea())
                 return
             
+            # Lote de subtareas chicas agrupadas por el servidor de cálculo: se calculan en una pasada
+            if 'operacion' in solicitud and solicitud['operacion'] == 'lote_subtareas':
+                enviar_mensaje(cliente_socket, agrupador.realizar_lote(
+                    self, solicitud, "aritmetico", "Solicitud inválida para el servidor de operaciones aritméticas"))
+                return
+            
+            # Traza de la solicitud: la espera en cola y la lectura ya están medidas
+            traza = trazas.Traza(solicitud.get('traza'), "aritmetico")
+            if hora_aceptacion is not None:
+                traza.registrar('espera_cola', hora_aceptacion, inicio_lectura)
+            traza.registrar('lectura', inicio_lectura, fin_lectura)
+            
+            # Contar la solicitud en el contador del hilo (sin locks)
+            self.contadores.sumar('solicitudes')
+            
             # Mostrar información de la solicitud recibida
             self.mostrar_solicitud_recibida(id_solicitud, hora_recepcion, direccion, solicitud)
             
             # Validar solicitud
             if not self.validar_solicitud(solicitud):
+                self.contadores.sumar('errores')
                 respuesta = {"error": "Solicitud inválida para el servidor de operaciones aritméticas"}
-                cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+                enviar_mensaje(cliente_socket, respuesta)
                 self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
                 return
                 
             # Realizar cálculo
             tiempo_inicio = time.time()
-            resultado = self.realizar_calculo(solicitud)
+            # Una subtarea reintentada con la misma clave no se calcula dos veces
+            resultado = self.idempotencia.ejecutar(solicitud.get('clave'), lambda: self.realizar_calculo(solicitud))
             tiempo_fin = time.time()
             tiempo_calculo = tiempo_fin - tiempo_inicio
+            traza.registrar('calculo', tiempo_inicio, tiempo_fin, operacion=solicitud['operacion'])
+            # Los tramos vuelven al servidor de cálculo junto con el resultado
+            tramos = traza.para_respuesta()
+            if tramos:
+                resultado['traza'] = tramos
             
             # Mostrar resultado calculado
             self.mostrar_resultado_calculado(id_solicitud, resultado, tiempo_calculo)
             
             # Enviar resultado
-            cliente_socket.sendall(json.dumps(resultado).encode('utf-8'))
+            with traza.tramo('serializacion'):
+                enviar_mensaje(cliente_socket, resultado)
             
         except json.JSONDecodeError:
+            self.contadores.sumar('errores')
             respuesta = {"error": "Formato JSON inválido"}
-            cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+            enviar_mensaje(cliente_socket, respuesta)
             self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
         except Exception as e:
+            self.contadores.sumar('errores')
             respuesta = {"error": f"Error en el cálculo: {str(e)}"}
-            cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+            enviar_mensaje(cliente_socket, respuesta)
             self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
         finally:
             cliente_socket.close()
+            if 'traza' in locals():
+                traza.finalizar()
     
     def mostrar_solicitud_recibida(self, id_solicitud, hora, direccion, solicitud):
         """Muestra información detallada sobre la solicitud recibida."""
@@ -119,7 +165,7 @@ class ServidorOperacionAritmetico:
         # Detalles de la operación
         if 'operacion' in solicitud and 'operandos' in solicitud:
             op = solicitud['operacion'].upper()
-            ops = str(solicitud['operandos'])
+            ops = describir(solicitud['operandos'])
             print(f"▶ Operación: {op}")
             print(f"▶ Operandos: {ops}")
         else:
@@ -139,8 +185,11 @@ class ServidorOperacionAritmetico:
             print(f" ERROR: {resultado['error']}")
         else:
             print(f"✓ Operación: {resultado['operacion']}")
-            print(f"✓ Operandos: {resultado['operandos']}")
-            print(f"✓ Resultado: {resultado['resultado']}")
+            if 'operandos' in resultado:
+                print(f"✓ Operandos: {describir(resultado['operandos'])}")
+            print(f"✓ Resultado: {describir(resultado['resultado'])}")
+            if 'errores' in resultado:
+                print(f"✓ Elementos con error de dominio: {resultado['cantidad_errores']}")
         
         print("-" * ancho)
     
@@ -166,7 +215,7 @@ class ServidorOperacionAritmetico:
             return True
             
         # Validar que el tipo de operación corresponda a este servidor (aritméticas)
-        return solicitud['operacion'] in ['suma', 'resta', 'multiplicacion', 'division']
+        return solicitud['operacion'] in self.operaciones
         
     def realizar_calculo(self, solicitud):
         """Realiza el cálculo aritmético solicitado."""
@@ -176,36 +225,16 @@ class ServidorOperacionAritmetico:
         # Responder a verificación de estado
         if operacion == 'verificar_estado':
             return {
-                "estado": "activo",
-                "tipo": "aritmetico"
+                "estado": self.ciclo.estado,
+                "tipo": "aritmetico",
+                "operaciones": self.operaciones
             }
         
-        try:
-            if operacion == 'suma':
-                resultado = sum(operandos)
-            elif operacion == 'resta':
-                resultado = operandos[0] - sum(operandos[1:])
-            elif operacion == 'multiplicacion':
-                resultado = 1
-                for operando in operandos:
-                    resultado *= operando
-            elif operacion == 'division':
-                if operandos[1] == 0:
-                    return {"error": "División por cero"}
-                resultado = operandos[0] / operandos[1]
-            else:
-                return {"error": f"Operación no soportada: {operacion}"}
-                
-            return {
-                "operacion": operacion,
-                "operandos": operandos,
-                "resultado": resultado
-            }
-            
-        except IndexError:
-            return {"error": "Número insuficiente de operandos"}
-        except Exception as e:
-            return {"error": f"Error en el cálculo: {str(e)}"}
+        if operacion not in self.operaciones:
+            return {"error": f"Operación no soportada: {operacion}"}
+
+        # Despacho directo a través del registro de operaciones
+        return operaciones.REGISTRO[operacion].ejecutar(operandos)
 
 if __name__ == "__main__":
     servidor = ServidorOperacionAritmetico()
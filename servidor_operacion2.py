@@ -1,39 +1,53 @@
 # servidor_operacion2.py
-import socket
+import itertools
 import json
-import math
 import threading
 import time
 
+import agrupador
+import ciclo_vida
+import flujo
+import idempotencia
+import metricas
+import operaciones
+import procesos
+import trazas
+from protocolo import describir, enviar_mensaje, recibir_mensaje
+
 class ServidorOperacionAvanzado:
     def __init__(self, host='localhost', puerto=5002):
         self.host = host
         self.puerto = puerto
-        self.contador_solicitudes = 0
+        # Identificadores de solicitud únicos entre hilos (next sobre itertools.count es atómico)
+        self.ids_solicitud = itertools.count(1)
+        # Solicitudes atendidas y con error, contadas por hilo y sumadas al consultar las métricas
+        self.contadores = metricas.Contadores('solicitudes', 'errores')
+        metricas.registrar_fuente('solicitudes', self.contadores.valores)
+        # Respuestas recientes por clave de idempotencia, para no calcular dos veces una subtarea reintentada
+        self.idempotencia = idempotencia.TablaIdempotencia()
+        # Nombre del archivo de trazas de este proceso
+        trazas.escritor.configurar("avanzado")
+        # Drenado con SIGTERM y reinicio en caliente con SIGUSR2
+        self.ciclo = ciclo_vida.CicloVida("avanzado")
+        # Operaciones que este servidor ejecuta y anuncia en verificar_estado
+        self.operaciones = operaciones.operaciones_de_tipo(operaciones.TIPO_AVANZADO)
         
     def iniciar(self):
         """Inicia el servidor de operaciones avanzadas para escuchar solicitudes."""
         try:
-            # Crear socket del servidor
-            servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # Permitir reutilizar la dirección
-            servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            # Vincular socket a dirección y puerto
-            servidor.bind((self.host, self.puerto))
-            # Escuchar conexiones entrantes (máximo 5 en cola)
-            servidor.listen(5)
+            # Crear sockets del servidor (o heredarlos en un reinicio en caliente): TCP y socket Unix
+            servidores = self.ciclo.sockets_escucha(self.host, self.puerto)
             
             # Mostrar encabezado del servidor
             self.mostrar_encabezado_servidor()
             
             # Ciclo de aceptación de conexiones
-            while True:
-                cliente_socket, direccion = servidor.accept()
+            for cliente_socket, direccion in self.ciclo.aceptar(servidores):
                 print(f"\nConexión aceptada desde {direccion[0]}:{direccion[1]}")
                 # Crear hilo para manejar la solicitud
                 hilo_cliente = threading.Thread(
-                    target=self.manejar_solicitud,
-                    args=(cliente_socket, direccion)
+                    target=self.ciclo.atender,
+                    args=(self.manejar_solicitud, cliente_socket, direccion, time.time())
                 )
                 hilo_cliente.daemon = True
                 hilo_cliente.start()
@@ -43,8 +57,8 @@ class ServidorOperacionAvanzado:
         except Exception as e:
             print(f"\nError en el servidor de operación: {str(e)}")
         finally:
-            if 'servidor' in locals() and servidor:
-                servidor.close()
+            if 'servidores' in locals():
+                self.ciclo.terminar(servidores)
     
     def mostrar_encabezado_servidor(self):
         """Muestra un encabezado estilizado para el servidor."""
@@ -52,63 +66,116 @@ class ServidorOperacionAvanzado:
         print("=" * ancho)
         print(f"{'SERVIDOR DE OPERACIONES AVANZADAS':^{ancho}}")
         print(f"{'Escuchando en ' + self.host + ':' + str(self.puerto):^{ancho}}")
-        print(f"{'Operaciones soportadas: potencia, raiz':^{ancho}}")
+        print(f"{'Operaciones soportadas: ' + ', '.join(self.operaciones):^{ancho}}")
         print("-" * ancho)
         print(f"{'Iniciado: ' + time.strftime('%Y-%m-%d %H:%M:%S'):^{ancho}}")
         print("=" * ancho)
                 
-    def manejar_solicitud(self, cliente_socket, direccion):
+    def manejar_solicitud(self, cliente_socket, direccion, hora_aceptacion=None):
         """Maneja una solicitud de cálculo individual."""
-        self.contador_solicitudes += 1
-        id_solicitud = self.contador_solicitudes
+        id_solicitud = next(self.ids_solicitud)
         hora_recepcion = time.strftime('%H:%M:%S')
         
         try:
             # Recibir datos
-            datos = cliente_socket.recv(4096).decode('utf-8')
-            solicitud = json.loads(datos)
+            inicio_lectura = time.time()
+            solicitud = recibir_mensaje(cliente_socket)
+            fin_lectura = time.time()
             
             # Verificar si es una solicitud de verificación de estado
             if 'operacion' in solicitud and solicitud['operacion'] == 'verificar_estado':
                 respuesta = {
-                    "estado": "activo",
-                    "tipo": "avanzado"
+                    "estado": self.ciclo.estado,
+                    "tipo": "avanzado",
+                    "operaciones": self.operaciones
                 }
-                cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+                enviar_mensaje(cliente_socket, respuesta)
+                return
+            
+            # Consultar métricas del servidor (compresión, etc.)
+            if 'operacion' in solicitud and solicitud['operacion'] == 'obtener_metricas':
+                enviar_mensaje(cliente_socket, metricas.instantanea())
+                return
+            
+            # Lote de subtareas chicas agrupadas por el servidor de cálculo: se calculan en una pasada
+            if 'operacion' in solicitud and solicitud['operacion'] == 'lote_subtareas':
+                enviar_mensaje(cliente_socket, agrupador.realizar_lote(
+                    self, solicitud, "avanzado", "Solicitud inválida para el servidor de operaciones avanzadas"))
                 return
             
+            # Traza de la solicitud: la espera en cola y la lectura ya están medidas
+            traza = trazas.Traza(solicitud.get('traza'), "avanzado")
+            if hora_aceptacion is not None:
+                traza.registrar('espera_cola', hora_aceptacion, inicio_lectura)
+            traza.registrar('lectura', inicio_lectura, fin_lectura)
+            
+            # Contar la solicitud en el contador del hilo (sin locks)
+            self.contadores.sumar('solicitudes')
+            
             # Mostrar información de la solicitud recibida
             self.mostrar_solicitud_recibida(id_solicitud, hora_recepcion, direccion, solicitud)
             
             # Validar solicitud
             if not self.validar_solicitud(solicitud):
+                self.contadores.sumar('errores')
                 respuesta = {"error": "Solicitud inválida para el servidor de operaciones avanzadas"}
-                cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+                enviar_mensaje(cliente_socket, respuesta)
                 self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
                 return
                 
+            # Respuesta por fragmentos: el resultado se calcula y se envía de a tramos (ver flujo.py)
+            if solicitud.get('transmitir'):
+                tiempo_inicio = time.time()
+                resultado = flujo.emitir(cliente_socket, solicitud['operacion'], solicitud['operandos'],
+                                         flujo.tamano_fragmento(solicitud['transmitir']))
+                tiempo_fin = time.time()
+                traza.registrar('calculo', tiempo_inicio, tiempo_fin, operacion=solicitud['operacion'],
+                                fragmentos=resultado.get('fragmentos'))
+                tramos = traza.para_respuesta()
+                if tramos:
+                    resultado['traza'] = tramos
+                if 'error' in resultado:
+                    self.contadores.sumar('errores')
+                    print(f"\nError en la respuesta por fragmentos: {resultado['error']}")
+                else:
+                    print(f"\nRespuesta por fragmentos: {resultado['fragmentos']} fragmentos, "
+                          f"{resultado['elementos']} elementos en {tiempo_fin - tiempo_inicio:.6f} segundos")
+                enviar_mensaje(cliente_socket, resultado)
+                return
+                
             # Realizar cálculo
             tiempo_inicio = time.time()
-            resultado = self.realizar_calculo(solicitud)
+            # Una subtarea reintentada con la misma clave no se calcula dos veces
+            resultado = self.idempotencia.ejecutar(solicitud.get('clave'), lambda: self.realizar_calculo(solicitud))
             tiempo_fin = time.time()
             tiempo_calculo = tiempo_fin - tiempo_inicio
+            traza.registrar('calculo', tiempo_inicio, tiempo_fin, operacion=solicitud['operacion'])
+            # Los tramos vuelven al servidor de cálculo junto con el resultado
+            tramos = traza.para_respuesta()
+            if tramos:
+                resultado['traza'] = tramos
             
             # Mostrar resultado calculado
             self.mostrar_resultado_calculado(id_solicitud, resultado, tiempo_calculo)
             
             # Enviar resultado
-            cliente_socket.sendall(json.dumps(resultado).encode('utf-8'))
+            with traza.tramo('serializacion'):
+                enviar_mensaje(cliente_socket, resultado)
             
         except json.JSONDecodeError:
+            self.contadores.sumar('errores')
             respuesta = {"error": "Formato JSON inválido"}
-            cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+            enviar_mensaje(cliente_socket, respuesta)
             self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
         except Exception as e:
+            self.contadores.sumar('errores')
             respuesta = {"error": f"Error en el cálculo: {str(e)}"}
-            cliente_socket.sendall(json.dumps(respuesta).encode('utf-8'))
+            enviar_mensaje(cliente_socket, respuesta)
             self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
         finally:
             cliente_socket.close()
+            if 'traza' in locals():
+                traza.finalizar()
     
     def mostrar_solicitud_recibida(self, id_solicitud, hora, direccion, solicitud):
         """Muestra información detallada sobre la solicitud recibida."""
@@ -120,7 +187,7 @@ class ServidorOperacionAvanzado:
         # Detalles de la operación
         if 'operacion' in solicitud and 'operandos' in solicitud:
             op = solicitud['operacion'].upper()
-            ops = str(solicitud['operandos'])
+            ops = describir(solicitud['operandos'])
             print(f"▶ Operación: {op}")
             print(f"▶ Operandos: {ops}")
             
@@ -151,8 +218,11 @@ class ServidorOperacionAvanzado:
             print(f"ERROR: {resultado['error']}")
         else:
             print(f"✓ Operación: {resultado['operacion']}")
-            print(f"✓ Operandos: {resultado['operandos']}")
-            print(f"✓ Resultado: {resultado['resultado']}")
+            if 'operandos' in resultado:
+                print(f"✓ Operandos: {describir(resultado['operandos'])}")
+            print(f"✓ Resultado: {describir(resultado['resultado'])}")
+            if 'errores' in resultado:
+                print(f"✓ Elementos con error de dominio: {resultado['cantidad_errores']}")
             
             # Mostrar información adicional según la operación
             if resultado['operacion'] == 'potencia':
@@ -187,7 +257,7 @@ class ServidorOperacionAvanzado:
             return True
             
         # Validar que el tipo de operación corresponda a este servidor (avanzadas)
-        return solicitud['operacion'] in ['potencia', 'raiz', 'logaritmo']
+        return solicitud['operacion'] in self.operaciones
         
     def realizar_calculo(self, solicitud):
         """Realiza el cálculo avanzado solicitado."""
@@ -196,30 +266,17 @@ class ServidorOperacionAvanzado:
 
         if operacion == 'verificar_estado':
             return {
-                "estado": "activo",
-                "tipo": "avanzado"
+                "estado": self.ciclo.estado,
+                "tipo": "avanzado",
+                "operaciones": self.operaciones
             }
         
-        try:
-            if operacion == 'potencia':
-                resultado = math.pow(operandos[0], operandos[1])
-            elif operacion == 'raiz':
-                if operandos[0] < 0 and operandos[1] % 2 == 0:
-                    return {"error": "No se puede calcular raíz par de número negativo"}
-                resultado = math.pow(operandos[0], 1/operandos[1])
-            else:
-                return {"error": f"Operación no soportada: {operacion}"}
-                
-            return {
-                "operacion": operacion,
-                "operandos": operandos,
-                "resultado": resultado
-            }
-            
-        except IndexError:
-            return {"error": "Número insuficiente de operandos"}
-        except Exception as e:
-            return {"error": f"Error en el cálculo: {str(e)}"}
+        if operacion not in self.operaciones:
+            return {"error": f"Operación no soportada: {operacion}"}
+
+        # Despacho a través del registro; las llamadas pesadas (potencias exactas enormes)
+        # se ejecutan en el pool de procesos para no retener el GIL de los demás hilos
+        return procesos.ejecutar_operacion(operacion, operandos)
 
 if __name__ == "__main__":
     servidor = ServidorOperacionAvanzado()
@@ -0,0 +1,244 @@
+# servidor_operacion3.py
+import itertools
+import json
+import threading
+import time
+
+import agrupador
+import algebra_lineal
+import ciclo_vida
+import idempotencia
+import metricas
+import operaciones
+import trazas
+from protocolo import describir, enviar_mensaje, recibir_mensaje
+
+class ServidorOperacionAlgebraLineal:
+    def __init__(self, host='localhost', puerto=5004):
+        self.host = host
+        self.puerto = puerto
+        # Identificadores de solicitud únicos entre hilos (next sobre itertools.count es atómico)
+        self.ids_solicitud = itertools.count(1)
+        # Solicitudes atendidas y con error, contadas por hilo y sumadas al consultar las métricas
+        self.contadores = metricas.Contadores('solicitudes', 'errores')
+        metricas.registrar_fuente('solicitudes', self.contadores.valores)
+        # Respuestas recientes por clave de idempotencia, para no calcular dos veces una subtarea reintentada
+        self.idempotencia = idempotencia.TablaIdempotencia()
+        # Nombre del archivo de trazas de este proceso
+        trazas.escritor.configurar("algebra_lineal")
+        # Drenado con SIGTERM y reinicio en caliente con SIGUSR2
+        self.ciclo = ciclo_vida.CicloVida("algebra_lineal")
+        # Operaciones que este servidor ejecuta y anuncia en verificar_estado
+        self.operaciones = operaciones.operaciones_de_tipo(operaciones.TIPO_ALGEBRA_LINEAL)
+        
+    def iniciar(self):
+        """Inicia el servidor de operaciones de álgebra lineal para escuchar solicitudes."""
+        try:
+            # Crear sockets del servidor (o heredarlos en un reinicio en caliente): TCP y socket Unix
+            servidores = self.ciclo.sockets_escucha(self.host, self.puerto)
+            
+            # Mostrar encabezado del servidor
+            self.mostrar_encabezado_servidor()
+            
+            # Ciclo de aceptación de conexiones
+            for cliente_socket, direccion in self.ciclo.aceptar(servidores):
+                print(f"\nConexión aceptada desde {direccion[0]}:{direccion[1]}")
+                # Crear hilo para manejar la solicitud
+                hilo_cliente = threading.Thread(
+                    target=self.ciclo.atender,
+                    args=(self.manejar_solicitud, cliente_socket, direccion, time.time())
+                )
+                hilo_cliente.daemon = True
+                hilo_cliente.start()
+                
+        except KeyboardInterrupt:
+            print("\nServidor detenido manualmente")
+        except Exception as e:
+            print(f"\nError en el servidor de operación: {str(e)}")
+        finally:
+            if 'servidores' in locals():
+                self.ciclo.terminar(servidores)
+    
+    def mostrar_encabezado_servidor(self):
+        """Muestra un encabezado estilizado para el servidor."""
+        ancho = 80
+        motor = 'NumPy/BLAS' if algebra_lineal.np is not None else 'Python puro (instale NumPy para usar BLAS)'
+        print("=" * ancho)
+        print(f"{'SERVIDOR DE OPERACIONES DE ÁLGEBRA LINEAL':^{ancho}}")
+        print(f"{'Escuchando en ' + self.host + ':' + str(self.puerto):^{ancho}}")
+        print(f"{'Operaciones soportadas: ' + ', '.join(self.operaciones):^{ancho}}")
+        print(f"{'Motor de cálculo: ' + motor:^{ancho}}")
+        print("-" * ancho)
+        print(f"{'Iniciado: ' + time.strftime('%Y-%m-%d %H:%M:%S'):^{ancho}}")
+        print("=" * ancho)
+                
+    def manejar_solicitud(self, cliente_socket, direccion, hora_aceptacion=None):
+        """Maneja una solicitud de cálculo individual."""
+        id_solicitud = next(self.ids_solicitud)
+        hora_recepcion = time.strftime('%H:%M:%S')
+        
+        try:
+            # Recibir datos
+            inicio_lectura = time.time()
+            solicitud = recibir_mensaje(cliente_socket)
+            fin_lectura = time.time()
+            
+            # Verificar si es una solicitud de verificación de estado
+            if 'operacion' in solicitud and solicitud['operacion'] == 'verificar_estado':
+                respuesta = {
+                    "estado": self.ciclo.estado,
+                    "tipo": "algebra_lineal",
+                    "operaciones": self.operaciones
+                }
+                enviar_mensaje(cliente_socket, respuesta)
+                return
+            
+            # Consultar métricas del servidor (compresión, etc.)
+            if 'operacion' in solicitud and solicitud['operacion'] == 'obtener_metricas':
+                enviar_mensaje(cliente_socket, metricas.instantanea())
+                return
+            
+            # Lote de subtareas chicas agrupadas por el servidor de cálculo: se calculan en una pasada
+            if 'operacion' in solicitud and solicitud['operacion'] == 'lote_subtareas':
+                enviar_mensaje(cliente_socket, agrupador.realizar_lote(
+                    self, solicitud, "algebra_lineal", "Solicitud inválida para el servidor de operaciones de álgebra lineal"))
+                return
+            
+            # Traza de la solicitud: la espera en cola y la lectura ya están medidas
+            traza = trazas.Traza(solicitud.get('traza'), "algebra_lineal")
+            if hora_aceptacion is not None:
+                traza.registrar('espera_cola', hora_aceptacion, inicio_lectura)
+            traza.registrar('lectura', inicio_lectura, fin_lectura)
+            
+            # Contar la solicitud en el contador del hilo (sin locks)
+            self.contadores.sumar('solicitudes')
+            
+            # Mostrar información de la solicitud recibida
+            self.mostrar_solicitud_recibida(id_solicitud, hora_recepcion, direccion, solicitud)
+            
+            # Validar solicitud
+            if not self.validar_solicitud(solicitud):
+                self.contadores.sumar('errores')
+                respuesta = {"error": "Solicitud inválida para el servidor de operaciones de álgebra lineal"}
+                enviar_mensaje(cliente_socket, respuesta)
+                self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
+                return
+                
+            # Realizar cálculo
+            tiempo_inicio = time.time()
+            # Una subtarea reintentada con la misma clave no se calcula dos veces
+            resultado = self.idempotencia.ejecutar(solicitud.get('clave'), lambda: self.realizar_calculo(solicitud))
+            tiempo_fin = time.time()
+            tiempo_calculo = tiempo_fin - tiempo_inicio
+            traza.registrar('calculo', tiempo_inicio, tiempo_fin, operacion=solicitud['operacion'])
+            # Los tramos vuelven al servidor de cálculo junto con el resultado
+            tramos = traza.para_respuesta()
+            if tramos:
+                resultado['traza'] = tramos
+            
+            # Mostrar resultado calculado
+            self.mostrar_resultado_calculado(id_solicitud, resultado, tiempo_calculo)
+            
+            # Enviar resultado
+            with traza.tramo('serializacion'):
+                enviar_mensaje(cliente_socket, resultado)
+            
+        except json.JSONDecodeError:
+            self.contadores.sumar('errores')
+            respuesta = {"error": "Formato JSON inválido"}
+            enviar_mensaje(cliente_socket, respuesta)
+            self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
+        except Exception as e:
+            self.contadores.sumar('errores')
+            respuesta = {"error": f"Error en el cálculo: {str(e)}"}
+            enviar_mensaje(cliente_socket, respuesta)
+            self.mostrar_respuesta_enviada(id_solicitud, respuesta, "ERROR")
+        finally:
+            cliente_socket.close()
+            if 'traza' in locals():
+                traza.finalizar()
+    
+    def mostrar_solicitud_recibida(self, id_solicitud, hora, direccion, solicitud):
+        """Muestra información detallada sobre la solicitud recibida."""
+        ancho = 80
+        print("\n" + "#" * ancho)
+        print(f"SOLICITUD #{id_solicitud} | {hora} | Cliente: {direccion[0]}:{direccion[1]}")
+        print("#" * ancho)
+        
+        # Detalles de la operación
+        if 'operacion' in solicitud and 'operandos' in solicitud:
+            op = solicitud['operacion'].upper()
+            ops = describir(solicitud['operandos'])
+            print(f"▶ Operación: {op}")
+            print(f"▶ Operandos: {ops}")
+        else:
+            print("▶ Solicitud malformada")
+            
+        print("#" * ancho)
+    
+    def mostrar_resultado_calculado(self, id_solicitud, resultado, tiempo_calculo):
+        """Muestra el resultado calculado con formato."""
+        ancho = 80
+        print("\n" + "#" * ancho)
+        print(f" CÁLCULO #{id_solicitud} | Tiempo: {tiempo_calculo:.6f} segundos")
+        print("#" * ancho)
+        
+        # Mostrar resultado o error
+        if 'error' in resultado:
+            print(f" ERROR: {resultado['error']}")
+        else:
+            print(f"✓ Operación: {resultado['operacion']}")
+            if 'operandos' in resultado:
+                print(f"✓ Operandos: {describir(resultado['operandos'])}")
+            print(f"✓ Resultado: {describir(resultado['resultado'])}")
+            if 'errores' in resultado:
+                print(f"✓ Elementos con error de dominio: {resultado['cantidad_errores']}")
+        
+        print("#" * ancho)
+    
+    def mostrar_respuesta_enviada(self, id_solicitud, respuesta, estado="OK"):
+        """Muestra información sobre la respuesta enviada."""
+        ancho = 80
+        print("\n" + "#" * ancho)
+        if estado == "OK":
+            print(f"RESPUESTA #{id_solicitud} | ESTADO: ✅ Éxito")
+        else:
+            print(f"RESPUESTA #{id_solicitud} | ESTADO: ❌ Error")
+        print("#" * ancho)
+        print(f"Datos enviados: {json.dumps(respuesta, indent=2)}")
+        print("#" * ancho)
+            
+    def validar_solicitud(self, solicitud):
+        """Valida que la solicitud sea adecuada para este servidor."""
+        if not isinstance(solicitud, dict) or 'operacion' not in solicitud or 'operandos' not in solicitud:
+            return False
+            
+        # Permitir mensajes de verificación de estado
+        if solicitud['operacion'] == 'verificar_estado':
+            return True
+            
+        # Validar que el tipo de operación corresponda a este servidor (álgebra lineal)
+        return solicitud['operacion'] in self.operaciones
+        
+    def realizar_calculo(self, solicitud):
+        """Realiza el cálculo de álgebra lineal solicitado."""
+        operacion = solicitud['operacion']
+        operandos = solicitud['operandos']
+
+        # Responder a verificación de estado
+        if operacion == 'verificar_estado':
+            return {
+                "estado": self.ciclo.estado,
+                "tipo": "algebra_lineal",
+                "operaciones": self.operaciones
+            }
+        
+        if operacion not in self.operaciones:
+            return {"error": f"Operación no soportada: {operacion}"}
+
+        # Despacho directo a través del registro de operaciones
+        return operaciones.REGISTRO[operacion].ejecutar(operandos)
+
+if __name__ == "__main__":
+    servidor = ServidorOperacionAlgebraLineal()
+    servidor.iniciar()
\ No newline at end of file
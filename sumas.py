@@ -0,0 +1,132 @@
+# sumas.py
+"""Sumas con redondeo correcto para las operaciones suma y resta.
+
+``sum()`` acumula en un solo double y en listas largas con magnitudes mezcladas
+pierde muchos dígitos. Estas sumas usan ``math.fsum`` (algoritmo de Shewchuk:
+el resultado es la suma exacta redondeada una sola vez). Los enteros se siguen
+sumando con ``sum()``, que ya es exacto, y si la suma exacta desborda o hay
+infinitos opuestos se conserva el resultado de ``sum()`` (infinito o NaN).
+
+Las entradas de ``UMBRAL_PARALELO`` elementos o más se parten en un bloque por
+proceso: los datos se copian una vez a un segmento de memoria compartida y cada
+proceso del pool compartido (``procesos.py``) calcula el valor exacto de su
+bloque leyendo el segmento. El valor exacto de un bloque no siempre cabe en un
+double, así que se devuelve como una lista de doubles cuya suma exacta es la
+del bloque: el ``fsum`` del bloque y los ``fsum`` sucesivos de lo que falta
+(ver ``_sumar_bloque``). Las listas de todos los bloques se combinan con un
+único ``fsum``, así que el resultado es el mismo que el de un ``fsum`` sobre
+toda la entrada: la suma exacta redondeada una sola vez. Cada residuo cuesta
+otra pasada sobre el bloque, casi siempre una o dos. Con un solo núcleo (o
+``CALCULO_PROCESOS_SUMA=1``) todo se suma en el mismo proceso.
+"""
+import math
+import os
+from array import array
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, islice
+from operator import neg
+
+import procesos
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Plataformas sin memoria compartida
+    shared_memory = None
+
+# Bloques en que se reparte una suma grande, uno por proceso del pool; 1 suma en el mismo proceso
+PROCESOS = int(os.environ.get('CALCULO_PROCESOS_SUMA', procesos.PROCESOS))
+# Elementos a partir de los cuales conviene repartir la suma entre procesos
+UMBRAL_PARALELO = int(os.environ.get('CALCULO_UMBRAL_SUMA_PARALELA', 256 * 1024))
+
+
+def componentes_exactos(valores):
+    """Doubles cuya suma exacta es la de ``valores``, del más grande al más chico.
+
+    El primero es ``fsum(valores)``; cada uno de los siguientes es el ``fsum``
+    de lo que todavía falta (los valores menos los componentes anteriores),
+    hasta que no falta nada. Con infinitos o NaN se devuelve solo el ``fsum``.
+    """
+    componentes = []
+    while True:
+        resto = math.fsum(chain(valores, map(neg, componentes)))
+        if resto == 0:
+            return componentes
+        componentes.append(resto)
+        if not math.isfinite(resto):
+            return componentes
+
+
+def _sumar_bloque(nombre, inicio, fin):
+    """Valor exacto de un bloque del segmento compartido, como ``componentes_exactos`` (se ejecuta en el pool)."""
+    # Los procesos del pool comparten el rastreador de recursos del servidor, que elimina el segmento
+    segmento = shared_memory.SharedMemory(name=nombre)
+    try:
+        with segmento.buf.cast('d') as dobles, dobles[inicio:fin] as vista:
+            return componentes_exactos(vista)
+    finally:
+        segmento.close()
+
+
+def _sumas_por_bloque(valores, inicio=0):
+    """Componentes exactos de todos los bloques de ``valores[inicio:]``, calculados en paralelo en el pool.
+
+    Su ``fsum`` es el de ``valores[inicio:]``. Devuelve None si no se puede
+    usar el pool; el llamador suma en este proceso.
+    """
+    if not isinstance(valores, array) or valores.typecode != 'd':
+        valores = array('d', valores)
+    datos = memoryview(valores)[inicio:]
+    segmento = shared_memory.SharedMemory(create=True, size=datos.nbytes)
+    try:
+        segmento.buf[:datos.nbytes] = datos.cast('B')
+        cortes = [len(datos) * i // PROCESOS for i in range(PROCESOS + 1)]
+        try:
+            futuros = [procesos.enviar(_sumar_bloque, segmento.name, desde, hasta)
+                       for desde, hasta in zip(cortes, cortes[1:])]
+            return [componente for futuro in futuros for componente in futuro.result()]
+        except (BrokenProcessPool, OSError):
+            procesos.descartar_pool()
+            return None
+    finally:
+        datos.release()
+        segmento.close()
+        segmento.unlink()
+
+
+def _en_paralelo(valores):
+    return PROCESOS > 1 and shared_memory is not None and len(valores) >= UMBRAL_PARALELO
+
+
+def _flotante_seguro(valores):
+    """Si ``sum()`` de los operandos es seguro un flotante, sin recorrerlos: arreglos o primer operando flotante."""
+    return isinstance(valores, array) or (len(valores) > 0 and isinstance(valores[0], float))
+
+
+def suma(valores):
+    """Suma compensada de los operandos; los enteros se suman exactamente."""
+    if not _flotante_seguro(valores):
+        # Con algún flotante sum() devuelve un flotante: solo entonces hace falta la suma exacta. Las
+        # listas que empiezan con un flotante van directo a fsum, sin esta pasada previa
+        total = sum(valores)
+        if not isinstance(total, float):
+            return total
+    try:
+        parciales = _sumas_por_bloque(valores) if _en_paralelo(valores) else None
+        return math.fsum(valores if parciales is None else parciales)
+    except (OverflowError, ValueError):
+        # Desborde de la suma exacta o infinitos de distinto signo: mismo resultado que sum()
+        return sum(valores)
+
+
+def resta(valores):
+    """El primer operando menos la suma de los demás, compensada como en ``suma``."""
+    if not _flotante_seguro(valores):
+        total = valores[0] - sum(islice(valores, 1, None))
+        if not isinstance(total, float):
+            return total
+    try:
+        parciales = _sumas_por_bloque(valores, 1) if _en_paralelo(valores) else None
+        restados = islice(valores, 1, None) if parciales is None else parciales
+        return math.fsum(chain((valores[0],), map(neg, restados)))
+    except (OverflowError, ValueError):
+        return valores[0] - sum(valores[1:])
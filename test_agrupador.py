@@ -0,0 +1,102 @@
+# test_agrupador.py
+"""Pruebas de la agrupación de subtareas con operandos tal como los envía el cliente.
+
+Se ejecutan con ``python -m unittest test_agrupador``. Levantan un servidor de
+operaciones aritméticas en un hilo, en un puerto propio.
+"""
+import socket
+import threading
+import time
+import unittest
+
+import agrupador
+import transporte
+from cliente import Cliente
+from mensajes import Solicitud, Subtarea
+from protocolo import BloqueOperandos, enviar_mensaje, recibir_mensaje
+from servidor_operacion1 import ServidorOperacionAritmetico
+
+PUERTO_OPERACION = 5091
+
+
+class _Destino:
+    def __init__(self, puerto):
+        self.host = 'localhost'
+        self.puerto = puerto
+
+
+def solicitudes_del_cliente(pedidos):
+    """Envía cada (operacion, operandos) con ``Cliente`` y devuelve las solicitudes como las lee el servidor de cálculo."""
+    escucha = socket.create_server(('localhost', 0))
+    recibidas = []
+
+    def coordinador():
+        for _ in pedidos:
+            conexion, _ = escucha.accept()
+            with conexion:
+                recibidas.append(Solicitud.desde_mensaje(recibir_mensaje(conexion, decodificar_operandos=False)))
+                enviar_mensaje(conexion, {'resultado': 0})
+
+    hilo = threading.Thread(target=coordinador, daemon=True)
+    hilo.start()
+    try:
+        cliente = Cliente(coordinadores=[('localhost', escucha.getsockname()[1])])
+        for operacion, operandos in pedidos:
+            cliente.enviar_solicitud(operacion, operandos)
+        hilo.join(5)
+    finally:
+        escucha.close()
+    return recibidas
+
+
+class PruebasAgrupador(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.servidor = ServidorOperacionAritmetico(puerto=PUERTO_OPERACION)
+        threading.Thread(target=cls.servidor.iniciar, daemon=True).start()
+        limite = time.time() + 10
+        while time.time() < limite:
+            try:
+                with transporte.conectar('localhost', PUERTO_OPERACION, timeout=1) as s:
+                    enviar_mensaje(s, {'operacion': 'verificar_estado', 'operandos': []})
+                    recibir_mensaje(s)
+                break
+            except OSError:
+                time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.ciclo.detener.set()
+
+    def test_agrupable_con_flotantes_del_cliente(self):
+        chica, grande = solicitudes_del_cliente([
+            ('suma', [1.5, 2.5]),
+            ('suma', [0.5] * (agrupador.MAX_OPERANDOS + 1)),
+        ])
+        self.assertIsInstance(chica.operandos, BloqueOperandos)
+        grupo = agrupador.AgrupadorSubtareas(ventana=0.002, max_lote=32)
+        self.assertTrue(grupo.agrupable(Subtarea('aritmetico', chica.operacion, chica.operandos)))
+        self.assertFalse(grupo.agrupable(Subtarea('aritmetico', grande.operacion, grande.operandos)))
+
+    def test_lote_con_flotantes_del_cliente(self):
+        solicitudes = solicitudes_del_cliente([
+            ('suma', [1.5, 2.5]),
+            ('resta', [10.0, 2.5]),
+            ('division', [1.0, 0.0]),
+        ])
+        grupo = agrupador.AgrupadorSubtareas(ventana=0.002, max_lote=32)
+        subtareas = [Subtarea('aritmetico', s.operacion, s.operandos) for s in solicitudes]
+        lote = agrupador._Lote(subtareas[0], 5.0)
+        lote.subtareas.extend(subtareas[1:])
+        grupo.enviar_lote(lote, _Destino(PUERTO_OPERACION))
+
+        self.assertIsNone(lote.error)
+        self.assertEqual([r.get('resultado') for r in lote.respuestas[:2]], [4.0, 7.5])
+        self.assertIn('error', lote.respuestas[2])
+        self.assertEqual(grupo.resumen()['lotes'], 1)
+        self.assertEqual(grupo.resumen()['agrupadas'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
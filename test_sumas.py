@@ -0,0 +1,60 @@
+# test_sumas.py
+"""Pruebas de la suma paralela por bloques de ``sumas.py``.
+
+Se ejecutan con ``python -m unittest test_sumas``. Usan el pool de procesos
+compartido aunque la máquina tenga un solo núcleo.
+"""
+import math
+import random
+import unittest
+from array import array
+
+import procesos
+import sumas
+
+
+def _entrada(semilla=0, cantidad=300000):
+    """Valores de magnitudes mezcladas, más que ``UMBRAL_PARALELO``."""
+    generador = random.Random(semilla)
+    return array('d', (generador.uniform(-1e6, 1e6) * 10.0 ** generador.randint(-8, 8) for _ in range(cantidad)))
+
+
+class PruebasSumaParalela(unittest.TestCase):
+
+    def setUp(self):
+        self.procesos_anterior = sumas.PROCESOS
+        sumas.PROCESOS = 4
+
+    def tearDown(self):
+        sumas.PROCESOS = self.procesos_anterior
+        procesos.descartar_pool()
+
+    def test_bloques_combinados_exactamente(self):
+        datos = _entrada()
+        self.assertGreaterEqual(len(datos), sumas.UMBRAL_PARALELO)
+        # La entrada distingue: combinar los fsum ya redondeados de cada bloque da otro resultado
+        cortes = [len(datos) * i // sumas.PROCESOS for i in range(sumas.PROCESOS + 1)]
+        redondeados = math.fsum(math.fsum(datos[desde:hasta]) for desde, hasta in zip(cortes, cortes[1:]))
+        self.assertNotEqual(redondeados, math.fsum(datos))
+
+        tareas = procesos.contadores.valores()['tareas']
+        self.assertEqual(sumas.suma(datos), math.fsum(datos))
+        self.assertEqual(sumas.resta(datos), math.fsum(_restados(datos)))
+        # Los bloques se sumaron en el pool, no en este proceso
+        self.assertEqual(procesos.contadores.valores()['tareas'] - tareas, 2 * sumas.PROCESOS)
+
+    def test_componentes_exactos(self):
+        self.assertEqual(sumas.componentes_exactos([1e30, 1.0, 1e-30]), [1e30, 1.0, 1e-30])
+        self.assertEqual(sumas.componentes_exactos([0.5, -0.5]), [])
+        self.assertEqual(sumas.componentes_exactos([math.inf, 1.0]), [math.inf])
+
+
+def _restados(datos):
+    """El primer valor y los demás con el signo cambiado, como los combina ``resta``."""
+    yield datos[0]
+    for valor in datos[1:]:
+        yield -valor
+
+
+if __name__ == '__main__':
+    unittest.main()
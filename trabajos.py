@@ -0,0 +1,161 @@
+# trabajos.py
+"""Trabajos asíncronos del servidor de cálculo.
+
+Un cálculo largo enviado con ``enviar_trabajo`` no retiene la conexión del
+cliente ni un hilo de conexión del servidor: se valida, se encola y se
+responde enseguida con el identificador del trabajo. Un grupo acotado de
+hilos ejecuta los trabajos y el cliente consulta el estado, pide el resultado
+(tantas veces como quiera, por si se corta la red) o cancela.
+
+Estados: ``pendiente`` → ``en_curso`` → ``completado`` | ``error``, o
+``cancelado``. Un trabajo pendiente cancelado no llega a ejecutarse; uno en
+curso termina la subtarea que está calculando pero no despacha las
+siguientes, y su resultado se descarta. Los trabajos
+terminados se conservan ``TTL`` segundos y el almacén guarda como máximo
+``CAPACIDAD`` trabajos: si está lleno se descartan primero los terminados más
+antiguos y, si todos siguen activos, se rechazan los trabajos nuevos. Los
+trabajos viven en la memoria del proceso: no sobreviven a un reinicio.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metricas
+
+CAPACIDAD = int(os.environ.get('CALCULO_MAX_TRABAJOS', 1000))
+TTL = float(os.environ.get('CALCULO_TTL_TRABAJOS', 600))
+HILOS = int(os.environ.get('CALCULO_HILOS_TRABAJOS', 4))
+
+PENDIENTE = 'pendiente'
+EN_CURSO = 'en_curso'
+COMPLETADO = 'completado'
+ERROR = 'error'
+CANCELADO = 'cancelado'
+TERMINADOS = (COMPLETADO, ERROR, CANCELADO)
+
+
+class Trabajo:
+    """Estado de un trabajo y, al terminar, su respuesta."""
+
+    __slots__ = ('id', 'operacion', 'estado', 'creado', 'iniciado', 'terminado', 'respuesta', 'futuro')
+
+    def __init__(self, id, operacion):
+        self.id = id
+        self.operacion = operacion
+        self.estado = PENDIENTE
+        self.creado = time.time()
+        self.iniciado = None
+        self.terminado = None
+        # Mensaje de respuesta (resultado o error) cuando el trabajo termina
+        self.respuesta = None
+        self.futuro = None
+
+    def resumen(self, con_respuesta=False):
+        """Estado del trabajo y, si se pide y ya terminó, su respuesta."""
+        resumen = dict(self.respuesta) if con_respuesta and self.respuesta is not None else {}
+        resumen.update({'trabajo': self.id, 'operacion': self.operacion, 'estado': self.estado, 'creado': self.creado})
+        if self.iniciado is not None:
+            resumen['iniciado'] = self.iniciado
+        if self.terminado is not None:
+            resumen['terminado'] = self.terminado
+        return resumen
+
+
+class AlmacenTrabajos:
+    """Trabajos en curso y terminados, acotado en cantidad y con expiración."""
+
+    def __init__(self, capacidad=CAPACIDAD, ttl=TTL, hilos=HILOS):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._trabajos = OrderedDict()
+        self._lock = threading.Lock()
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='trabajo')
+        self.contadores = metricas.Contadores('enviados', 'rechazados', 'completados', 'errores', 'cancelados',
+                                              'expirados')
+
+    def _purgar(self, ahora):
+        """Elimina los trabajos terminados vencidos (con el lock tomado)."""
+        vencidos = [id for id, trabajo in self._trabajos.items()
+                    if trabajo.estado in TERMINADOS and ahora - trabajo.terminado > self.ttl]
+        for id in vencidos:
+            del self._trabajos[id]
+        if vencidos:
+            self.contadores.sumar('expirados', len(vencidos))
+
+    def _hacer_lugar(self):
+        """Descarta el trabajo terminado más antiguo; devuelve False si todos siguen activos."""
+        for id, trabajo in self._trabajos.items():
+            if trabajo.estado in TERMINADOS:
+                del self._trabajos[id]
+                self.contadores.sumar('expirados')
+                return True
+        return False
+
+    def enviar(self, operacion, calcular):
+        """Encola ``calcular(cancelado)``, que devuelve el mensaje de respuesta; devuelve el trabajo o None si no hay lugar.
+
+        ``cancelado()`` dice si el trabajo se canceló: el cálculo lo consulta entre subtareas para cortar antes.
+        """
+        with self._lock:
+            self._purgar(time.time())
+            if len(self._trabajos) >= self.capacidad and not self._hacer_lugar():
+                self.contadores.sumar('rechazados')
+                return None
+            trabajo = Trabajo(uuid.uuid4().hex, operacion)
+            self._trabajos[trabajo.id] = trabajo
+            # Dentro del lock, para que cancelar siempre encuentre el futuro
+            trabajo.futuro = self._ejecutor.submit(self._ejecutar, trabajo, calcular)
+        self.contadores.sumar('enviados')
+        return trabajo
+
+    def _ejecutar(self, trabajo, calcular):
+        with self._lock:
+            if trabajo.estado != PENDIENTE:
+                return
+            trabajo.estado = EN_CURSO
+            trabajo.iniciado = time.time()
+        try:
+            respuesta = calcular(lambda: trabajo.estado == CANCELADO)
+        except Exception as e:
+            respuesta = {"error": f"Error en el procesamiento: {str(e)}"}
+        with self._lock:
+            if trabajo.estado == CANCELADO:
+                # Se canceló mientras corría: el resultado se descarta
+                return
+            trabajo.respuesta = respuesta
+            trabajo.estado = ERROR if 'error' in respuesta else COMPLETADO
+            trabajo.terminado = time.time()
+        self.contadores.sumar('errores' if trabajo.estado == ERROR else 'completados')
+
+    def consultar(self, id, con_respuesta=False):
+        """Resumen del trabajo (con su respuesta si se pide), o None si no existe o ya expiró."""
+        with self._lock:
+            self._purgar(time.time())
+            trabajo = self._trabajos.get(id)
+            return None if trabajo is None else trabajo.resumen(con_respuesta)
+
+    def cancelar(self, id):
+        """Cancela un trabajo pendiente o en curso; devuelve el trabajo, o None si no existe."""
+        with self._lock:
+            trabajo = self._trabajos.get(id)
+            if trabajo is None or trabajo.estado in TERMINADOS:
+                return trabajo
+            trabajo.estado = CANCELADO
+            trabajo.terminado = time.time()
+            trabajo.respuesta = {"error": "Trabajo cancelado"}
+        # Si todavía no empezó, no llega a ejecutarse
+        trabajo.futuro.cancel()
+        self.contadores.sumar('cancelados')
+        return trabajo
+
+    def resumen(self):
+        """Trabajos por estado y totales, para ``obtener_metricas``."""
+        with self._lock:
+            por_estado = dict.fromkeys((PENDIENTE, EN_CURSO) + TERMINADOS, 0)
+            for trabajo in self._trabajos.values():
+                por_estado[trabajo.estado] += 1
+        return {'por_estado': por_estado, 'totales': self.contadores.valores(),
+                'capacidad': self.capacidad, 'ttl': self.ttl}
@@ -0,0 +1,246 @@
+# transporte.py
+"""Transporte entre componentes: TCP o, cuando ambos extremos están en la misma
+máquina, sockets de dominio Unix más un anillo de memoria compartida para los
+bloques grandes de operandos y resultados."""
+import atexit
+import os
+import selectors
+import socket
+import tempfile
+import threading
+import time
+from collections import deque
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Plataformas sin memoria compartida
+    shared_memory = None
+
+# Permite desactivar el transporte local (por ejemplo, para medir contra TCP)
+HABILITADO = os.environ.get('CALCULO_TRANSPORTE_LOCAL', '1') != '0' and hasattr(socket, 'AF_UNIX')
+HOSTS_LOCALES = {'localhost', '127.0.0.1', '::1', socket.gethostname()}
+DIRECCION_LOCAL = ('local', 0)
+
+# Bloques a partir de este tamaño viajan por memoria compartida en vez de por el socket
+UMBRAL_MEMORIA_COMPARTIDA = 64 * 1024
+TAMANO_ANILLO = 64 * 1024 * 1024
+# Segmentos de otros procesos que se mantienen abiertos (un proceso reiniciado crea uno nuevo)
+MAX_SEGMENTOS_ADJUNTOS = 8
+
+
+def ruta_socket_unix(puerto):
+    """Ruta del socket Unix asociado a un puerto TCP."""
+    return os.path.join(tempfile.gettempdir(), f"calculo_distribuido_{puerto}.sock")
+
+
+def es_local(host):
+    """Indica si el host corresponde a esta misma máquina."""
+    return host in HOSTS_LOCALES
+
+
+def es_socket_local(sock):
+    """Indica si la conexión usa el transporte local (socket Unix)."""
+    return HABILITADO and sock.family == socket.AF_UNIX
+
+
+def conectar(host, puerto, timeout=None):
+    """Abre una conexión con un componente, usando el socket Unix si está en esta máquina.
+
+    Si el socket Unix no existe o no acepta la conexión, se usa TCP.
+    """
+    if HABILITADO and es_local(host):
+        ruta = ruta_socket_unix(puerto)
+        if os.path.exists(ruta):
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.settimeout(timeout)
+            try:
+                s.connect(ruta)
+                return s
+            except OSError:
+                s.close()
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.settimeout(timeout)
+    try:
+        s.connect((host, puerto))
+    except BaseException:
+        s.close()
+        raise
+    return s
+
+
+def crear_sockets_escucha(host, puerto, backlog=5):
+    """Crea el socket TCP del servidor y, si es posible, su socket Unix para procesos locales."""
+    servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Permitir reutilizar la dirección
+    servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    servidor.bind((host, puerto))
+    servidor.listen(backlog)
+    sockets = [servidor]
+
+    if HABILITADO:
+        ruta = ruta_socket_unix(puerto)
+        try:
+            if os.path.exists(ruta):
+                # El puerto TCP ya es nuestro, así que el socket Unix existente es de un proceso anterior
+                os.unlink(ruta)
+            servidor_local = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            servidor_local.bind(ruta)
+            servidor_local.listen(backlog)
+            sockets.append(servidor_local)
+        except OSError as e:
+            print(f"Transporte local no disponible en {ruta}: {str(e)}")
+    return sockets
+
+
+def heredar_sockets_escucha(descriptores):
+    """Reconstruye los sockets de escucha recibidos de un proceso anterior (reinicio en caliente)."""
+    return [socket.socket(fileno=descriptor) for descriptor in descriptores]
+
+
+def aceptar_conexiones(sockets, detener=None):
+    """Acepta conexiones de todos los sockets de escucha; produce (socket, dirección).
+
+    Si se indica ``detener`` (un ``threading.Event``), deja de aceptar poco después de activarse.
+    Los sockets de escucha quedan en modo no bloqueante: en un reinicio en
+    caliente el otro proceso puede aceptar primero la conexión que avisó
+    ``select``, y entonces ``accept`` no debe quedarse esperando la siguiente.
+    """
+    selector = selectors.DefaultSelector()
+    for s in sockets:
+        s.setblocking(False)
+        selector.register(s, selectors.EVENT_READ)
+    try:
+        while detener is None or not detener.is_set():
+            for clave, _ in selector.select(None if detener is None else 0.5):
+                try:
+                    cliente_socket, direccion = clave.fileobj.accept()
+                except (BlockingIOError, InterruptedError):
+                    # Otro proceso tomó la conexión, o una señal interrumpió la llamada
+                    continue
+                cliente_socket.setblocking(True)
+                if clave.fileobj.family == socket.AF_UNIX:
+                    direccion = DIRECCION_LOCAL
+                yield cliente_socket, direccion
+    finally:
+        selector.close()
+
+
+def cerrar_sockets_escucha(sockets, eliminar_socket_unix=True):
+    """Cierra los sockets de escucha y elimina el archivo del socket Unix.
+
+    En un reinicio en caliente el archivo se conserva: el proceso nuevo sigue escuchando en él.
+    """
+    for s in sockets:
+        if s.family == socket.AF_UNIX and eliminar_socket_unix:
+            try:
+                os.unlink(s.getsockname())
+            except OSError:
+                pass
+        s.close()
+
+
+class AnilloMemoriaCompartida:
+    """Anillo de memoria compartida para enviar bloques grandes a procesos locales.
+
+    Cada bloque ocupa una región contigua del segmento. Por el socket solo viaja
+    su descriptor (nombre del segmento, inicio y longitud); la región se libera
+    cuando el receptor confirma que copió los datos. Las regiones se liberan en
+    cualquier orden, pero el espacio se recupera en el orden en que se reservó.
+    """
+
+    def __init__(self, tamano=TAMANO_ANILLO):
+        self.tamano = tamano
+        self._segmento = None
+        self._lock = threading.Lock()
+        # Regiones reservadas en orden: [inicio, fin, liberar_en]; liberar_en es None mientras está en uso
+        self._regiones = deque()
+        self._cola = 0
+
+    @property
+    def nombre(self):
+        return self._segmento.name
+
+    def _avanzar_cabeza(self):
+        ahora = time.monotonic()
+        while self._regiones and self._regiones[0][2] is not None and self._regiones[0][2] <= ahora:
+            self._regiones.popleft()
+        if not self._regiones:
+            self._cola = 0
+
+    def _reservar(self, longitud):
+        self._avanzar_cabeza()
+        if not self._regiones:
+            inicio = 0 if longitud <= self.tamano else None
+        else:
+            cabeza = self._regiones[0][0]
+            if self._cola >= cabeza:
+                if self.tamano - self._cola >= longitud:
+                    inicio = self._cola
+                elif cabeza > longitud:
+                    inicio = 0
+                else:
+                    inicio = None
+            else:
+                inicio = self._cola if cabeza - self._cola > longitud else None
+        if inicio is None:
+            return None
+        region = [inicio, inicio + longitud, None]
+        self._regiones.append(region)
+        self._cola = inicio + longitud
+        return region
+
+    def escribir(self, datos):
+        """Copia los datos a una región libre; devuelve la región o None si no hay espacio."""
+        if shared_memory is None:
+            return None
+        with self._lock:
+            if self._segmento is None:
+                self._segmento = shared_memory.SharedMemory(create=True, size=self.tamano)
+            region = self._reservar(len(datos))
+        if region is not None:
+            self._segmento.buf[region[0]:region[1]] = datos
+        return region
+
+    def liberar(self, region, retraso=0):
+        """Marca una región como libre, opcionalmente después de un retraso en segundos."""
+        with self._lock:
+            region[2] = time.monotonic() + retraso
+
+    def cerrar(self):
+        """Libera el segmento al terminar el proceso."""
+        if self._segmento is not None:
+            try:
+                self._segmento.close()
+            except BufferError:
+                pass
+            self._segmento.unlink()
+            self._segmento = None
+
+
+anillo = AnilloMemoriaCompartida()
+atexit.register(anillo.cerrar)
+
+_segmentos_adjuntos = {}
+_lock_segmentos = threading.Lock()
+
+
+def leer_memoria_compartida(nombre, inicio, longitud):
+    """Devuelve una vista sobre una región del segmento de memoria compartida de otro proceso."""
+    with _lock_segmentos:
+        segmento = _segmentos_adjuntos.get(nombre)
+        if segmento is None:
+            segmento = shared_memory.SharedMemory(name=nombre)
+            # El segmento pertenece al proceso que lo creó: no debe eliminarse al salir este proceso
+            try:
+                resource_tracker.unregister(segmento._name, 'shared_memory')
+            except Exception:
+                pass
+            _segmentos_adjuntos[nombre] = segmento
+            if len(_segmentos_adjuntos) > MAX_SEGMENTOS_ADJUNTOS:
+                # Cerrar el segmento más antiguo (normalmente de un proceso que ya terminó)
+                antiguo = _segmentos_adjuntos.pop(next(iter(_segmentos_adjuntos)))
+                try:
+                    antiguo.close()
+                except BufferError:
+                    pass
+    return segmento.buf[inicio:inicio + longitud]
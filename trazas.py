@@ -0,0 +1,147 @@
+# trazas.py
+"""Trazas de solicitudes de extremo a extremo.
+
+El cliente genera un contexto ``{'id', 'muestreada', 'incluir'}`` que viaja en
+la solicitud y que el servidor de cálculo reenvía a cada servidor de
+operación. Cada componente mide sus tramos (espera en cola, lectura, cálculo,
+despacho, respaldo, serialización) y, si la traza fue muestreada, los escribe
+en un archivo local en formato Chrome Trace Event (se abre con
+``chrome://tracing`` o Perfetto). Los tramos de los servidores de operación
+vuelven al servidor de cálculo en la respuesta y, si el cliente lo pidió, se
+incluyen en la respuesta final.
+"""
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+# Fracción de solicitudes que se trazan (las que piden la traza se trazan siempre)
+MUESTREO = float(os.environ.get('CALCULO_MUESTREO_TRAZAS', 0.01))
+DIRECTORIO_TRAZAS = os.environ.get('CALCULO_DIRECTORIO_TRAZAS', tempfile.gettempdir())
+
+
+def nuevo_contexto(incluir=False):
+    """Crea el contexto de traza que el cliente agrega a la solicitud."""
+    return {
+        'id': uuid.uuid4().hex,
+        'muestreada': incluir or random.random() < MUESTREO,
+        'incluir': incluir
+    }
+
+
+class Traza:
+    """Tramos medidos por un componente para una solicitud."""
+
+    __slots__ = ('contexto', 'componente', 'activa', 'tramos', '_propios')
+
+    def __init__(self, contexto, componente):
+        self.contexto = contexto if isinstance(contexto, dict) else None
+        self.componente = componente
+        self.activa = bool(self.contexto and self.contexto.get('muestreada'))
+        # Todos los tramos conocidos (incluye los de otros componentes) y los medidos aquí,
+        # que son los que este proceso escribe en su archivo
+        self.tramos = []
+        self._propios = []
+
+    @property
+    def id(self):
+        return self.contexto['id'] if self.contexto else None
+
+    def registrar(self, nombre, inicio, fin, **args):
+        """Registra un tramo ya medido; ``inicio`` y ``fin`` vienen de ``time.time()``."""
+        if not self.activa:
+            return
+        args['traza_id'] = self.contexto['id']
+        evento = {
+            'name': nombre,
+            'cat': self.componente,
+            'ph': 'X',
+            'ts': int(inicio * 1e6),
+            'dur': max(int((fin - inicio) * 1e6), 0),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args
+        }
+        self.tramos.append(evento)
+        self._propios.append(evento)
+
+    def tramo(self, nombre, **args):
+        """Mide un bloque de código como tramo: ``with traza.tramo('calculo'): ...``."""
+        return _Tramo(self, nombre, args)
+
+    def agregar(self, tramos):
+        """Agrega los tramos devueltos por otro componente."""
+        if self.activa and tramos:
+            self.tramos.extend(tramos)
+
+    def para_respuesta(self):
+        """Tramos que se devuelven al componente anterior, o None si no se traza."""
+        if not self.activa:
+            return None
+        return {'id': self.contexto['id'], 'tramos': self.tramos}
+
+    def finalizar(self):
+        """Escribe los tramos propios en el archivo de trazas del proceso."""
+        if self._propios:
+            escritor.escribir(self._propios)
+            self._propios = []
+
+
+class _Tramo:
+    __slots__ = ('traza', 'nombre', 'args', 'inicio')
+
+    def __init__(self, traza, nombre, args):
+        self.traza = traza
+        self.nombre = nombre
+        self.args = args
+
+    def __enter__(self):
+        self.inicio = time.time()
+        return self
+
+    def __exit__(self, tipo, valor, rastreo):
+        if tipo is not None:
+            self.args['error'] = str(valor)
+        self.traza.registrar(self.nombre, self.inicio, time.time(), **self.args)
+        return False
+
+
+class EscritorTrazas:
+    """Archivo de trazas del proceso en formato de arreglo JSON de Chrome Trace Event.
+
+    El formato admite que el arreglo quede sin cerrar, así que cada evento se
+    agrega al final sin reescribir el archivo.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_TRAZAS):
+        self.directorio = directorio
+        self.componente = 'proceso'
+        self._archivo = None
+        self._lock = threading.Lock()
+
+    @property
+    def ruta(self):
+        return os.path.join(self.directorio, f"trazas_{self.componente}_{os.getpid()}.json")
+
+    def configurar(self, componente):
+        """Define el nombre del componente usado en el nombre del archivo."""
+        self.componente = componente
+
+    def escribir(self, eventos):
+        with self._lock:
+            try:
+                if self._archivo is None:
+                    self._archivo = open(self.ruta, 'a', encoding='utf-8')
+                    if self._archivo.tell() == 0:
+                        self._archivo.write('[\n')
+                for evento in eventos:
+                    self._archivo.write(json.dumps(evento, separators=(',', ':')) + ',\n')
+                self._archivo.flush()
+            except OSError as e:
+                print(f"No se pudieron escribir las trazas en {self.ruta}: {str(e)}")
+
+
+escritor = EscritorTrazas()